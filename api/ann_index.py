@@ -0,0 +1,166 @@
+# api/ann_index.py
+
+import os
+import json
+import math
+import faiss
+import numpy as np
+
+# Index backends selectable at build time
+INDEX_TYPES = ['flat', 'hnsw', 'ivf_flat', 'ivf_pq']
+# 'l2' keeps raw vectors; 'cosine' L2-normalizes and searches by inner product
+METRICS = ['l2', 'cosine']
+
+DEFAULT_PARAMS = {
+    'hnsw': {'M': 32, 'ef_construction': 200, 'ef_search': 128},
+    'ivf_flat': {'nlist': None, 'nprobe': 16},
+    'ivf_pq': {'nlist': None, 'nprobe': 16, 'pq_m': None, 'pq_nbits': 8},
+    'flat': {}
+}
+
+
+def index_info_path(index_path):
+    """Sidecar JSON describing how an index file was built"""
+    return os.path.splitext(index_path)[0] + '.json'
+
+
+def prepare_vectors(vectors, metric):
+    """float32, C-contiguous, normalized for cosine - used for both build and query"""
+    vectors = np.array(vectors, dtype='float32', order='C', ndmin=2)
+    if metric == 'cosine':
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _default_nlist(n):
+    # ~4*sqrt(n) lists, but keep >= 39 training points per centroid
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def _default_pq_m(dimension):
+    # Largest common sub-quantizer count that divides the dimension, >= 4 dims each
+    for m in (64, 48, 32, 16, 8, 4, 2, 1):
+        if m <= dimension // 4 and dimension % m == 0:
+            return m
+    return 1
+
+
+def base_index(index):
+    """The index doing the search - unwraps an IndexIDMap"""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def supports_remove(index_type):
+    # HNSW graphs cannot drop vectors; those indexes are rebuilt instead
+    return index_type != 'hnsw'
+
+
+def build_index(vectors, index_type='flat', metric='l2', ids=None, **overrides):
+    """
+    Builds (and trains, for IVF) an index over already prepared vectors.
+    With `ids` (int64, one per vector) the index is wrapped in an
+    IndexIDMap2 and searches return those ids instead of row numbers.
+    Returns (index, params) where params are the effective build/search
+    settings to record next to the index.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS}")
+
+    n, dimension = vectors.shape
+    faiss_metric = faiss.METRIC_INNER_PRODUCT if metric == 'cosine' else faiss.METRIC_L2
+    params = dict(DEFAULT_PARAMS[index_type])
+    params.update({k: v for k, v in overrides.items() if v is not None})
+
+    if index_type == 'flat':
+        index = faiss.IndexFlat(dimension, faiss_metric)
+
+    elif index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, params['M'], faiss_metric)
+        index.hnsw.efConstruction = params['ef_construction']
+
+    else:
+        params['nlist'] = params['nlist'] or _default_nlist(n)
+        quantizer = faiss.IndexFlat(dimension, faiss_metric)
+        if index_type == 'ivf_flat':
+            index = faiss.IndexIVFFlat(quantizer, dimension, params['nlist'], faiss_metric)
+        else:
+            params['pq_m'] = params['pq_m'] or _default_pq_m(dimension)
+            if dimension % params['pq_m'] != 0:
+                raise ValueError(f"pq_m={params['pq_m']} must divide dimension {dimension}")
+            # PQ training wants >= 39 points per codebook centroid (2^nbits)
+            params['pq_nbits'] = max(1, min(params['pq_nbits'], int(math.log2(max(n // 39, 2)))))
+            index = faiss.IndexIVFPQ(
+                quantizer, dimension, params['nlist'], params['pq_m'], params['pq_nbits'], faiss_metric
+            )
+        index.train(vectors)
+
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+        index.add_with_ids(vectors, np.asarray(ids, dtype='int64'))
+    else:
+        index.add(vectors)
+    configure_search(index, index_type, params)
+    return index, params
+
+
+def configure_search(index, index_type, params):
+    """Applies query-time knobs (efSearch / nprobe); env vars override for tuning"""
+    index = base_index(index)
+    if index_type == 'hnsw':
+        index.hnsw.efSearch = int(os.environ.get("HNSW_EF_SEARCH", params['ef_search']))
+    elif index_type in ('ivf_flat', 'ivf_pq'):
+        index.nprobe = int(os.environ.get("IVF_NPROBE", params['nprobe']))
+
+
+def filter_parameters(index, index_type, allowed, ids=None):
+    """
+    SearchParameters restricting a search to the rows where `allowed` is
+    True, carrying the index's own efSearch / nprobe since per-call
+    parameters replace them. Plain indexes get an IDSelectorBitmap over
+    row numbers; an IndexIDMap (pass its per-row `ids`) sees the external
+    ids, so it gets an IDSelectorBatch of the allowed ones.
+    """
+    if ids is not None:
+        selector = faiss.IDSelectorBatch(np.ascontiguousarray(ids[allowed], dtype='int64'))
+    else:
+        selector = faiss.IDSelectorBitmap(np.packbits(allowed, bitorder='little'))
+    index = base_index(index)
+    if index_type == 'hnsw':
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    if index_type in ('ivf_flat', 'ivf_pq'):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+
+def save_index(index, index_path, info):
+    faiss.write_index(index, index_path)
+    with open(index_info_path(index_path), 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=2)
+
+
+def load_index(index_path):
+    """
+    Returns (index, info). Indexes built before the sidecar existed are
+    plain IndexFlatL2 and get the matching default info.
+    """
+    index = faiss.read_index(index_path)
+    info_path = index_info_path(index_path)
+    if os.path.exists(info_path):
+        with open(info_path, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+    else:
+        info = {'index_type': 'flat', 'metric': 'l2', 'params': {}}
+    configure_search(index, info['index_type'], info['params'])
+    return index, info
+
+
+def distances_to_scores(distances, metric):
+    """Maps FAISS distances to higher-is-better similarities"""
+    distances = np.asarray(distances, dtype='float32')
+    if metric == 'cosine':
+        return distances
+    return 1 / (1 + distances)
@@ -1,10 +1,72 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from pydantic import BaseModel
-from retrieval_engine import RetrievalEngine
+from telemetry import REGISTRY, REQUEST_SECONDS, PROFILER, PROFILE_SAMPLE_RATE, get_logger, trace
+from upstream import UpstreamError, CircuitOpenError, BREAKER_RESET
+import os
+import hmac
+import asyncio
+import json
+import time
+import threading
 import uvicorn
 
-app = FastAPI(title="SHL Assessment Recommendation API")
+# eager: build the engine (FAISS, catalog, BM25) at import - with gunicorn
+#        preload_app that happens once in the master and workers share it
+# lazy:  import returns at once and the engine is built by the warm-up thread
+#        (or the first request); /health answers immediately, /ready once warm
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "eager")
+# Bearer token for the admin endpoints (cache flush, snapshot reload); unset = they are disabled
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+log = get_logger("api")
+
+engine = None
+_engine_lock = threading.Lock()
+_startup = {'status': 'warming', 'error': None, 'warm_up_seconds': None}
+
+def get_engine():
+    """The RetrievalEngine, imported and built on first use"""
+    global engine
+    if engine is None:
+        with _engine_lock:
+            if engine is None:
+                from retrieval_engine import RetrievalEngine
+                engine = RetrievalEngine()
+    return engine
+
+async def ready_engine():
+    # Only requests arriving before a lazy build finishes wait, off the event loop
+    return engine if engine is not None else await asyncio.to_thread(get_engine)
+
+def warm_up():
+    start = time.perf_counter()
+    try:
+        get_engine().warm_up()
+    except Exception as e:
+        log.exception("Warm-up failed")
+        _startup.update(status='failed', error=str(e))
+        return
+    _startup.update(status='ready', warm_up_seconds=round(time.perf_counter() - start, 3))
+    log.info("✅ Ready (warm-up %.2fs)", _startup['warm_up_seconds'])
+
+def after_fork():
+    """gunicorn post_fork hook (gunicorn.conf.py)"""
+    if engine is not None:
+        engine.after_fork()
+
+if STARTUP_MODE == 'eager':
+    get_engine()
+
+@asynccontextmanager
+async def lifespan(app):
+    # Per worker; readiness does not block the server from accepting /health
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+
+app = FastAPI(title="SHL Assessment Recommendation API", lifespan=lifespan)
 
 # CORS for frontend
 app.add_middleware(
@@ -15,11 +77,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize engine
-engine = RetrievalEngine()
+@app.middleware("http")
+async def record_timing(request: Request, call_next):
+    """
+    Request latency histogram plus a per-request trace: the stage spans
+    are returned in a Server-Timing header and logged at DEBUG
+    """
+    start = time.perf_counter()
+    status = 500
+    with trace() as spans:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            elapsed = time.perf_counter() - start
+            # Route template, not the raw path, to keep label cardinality bounded
+            route = request.scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            REQUEST_SECONDS.observe(elapsed, request.method, path, str(status))
+    if spans.spans:
+        response.headers["Server-Timing"] = spans.server_timing()
+        log.debug("%s %s %d %.1fms [%s]", request.method, path, status, elapsed * 1000, spans.server_timing())
+    return response
+
+
+class SearchFilters(BaseModel):
+    test_types: list[str] | None = None
+    min_duration: int | None = None
+    max_duration: int | None = None
+    job_levels: list[str] | None = None
+    languages: list[str] | None = None
+    remote: bool | None = None
 
 class QueryRequest(BaseModel):
     query: str
+    filters: SearchFilters | None = None
+
+class BatchQueryRequest(BaseModel):
+    queries: list[str]
+    filters: SearchFilters | None = None
+
+def filter_dict(filters):
+    return filters.model_dump(exclude_none=True) if filters else None
+
+# Queries handed to retrieve_batch at a time; each chunk is streamed as soon as it is ranked
+BATCH_CHUNK_SIZE = 32
 
 class RecommendationResponse(BaseModel):
     assessment_name: str
@@ -27,12 +129,85 @@ class RecommendationResponse(BaseModel):
 
 @app.get("/health")
 def health_check():
+    """Liveness: the process is serving, whether or not the engine is loaded"""
     return {"status": "ok"}
 
+@app.get("/ready")
+def readiness_check():
+    """Readiness: 200 once the engine is built and warmed up, 503 before (or if that failed)"""
+    if _startup['status'] == 'ready':
+        return {"status": "ready", "mode": STARTUP_MODE, "warm_up_seconds": _startup['warm_up_seconds']}
+    return JSONResponse(status_code=503, content={"status": _startup['status'], "error": _startup['error']})
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile")
+def debug_profile(reset: bool = False):
+    """
+    Collapsed stacks (flamegraph.pl / speedscope) sampled from the
+    PROFILE_SAMPLE_RATE slice of requests; empty when profiling is off
+    """
+    samples = PROFILER.samples
+    return PlainTextResponse(PROFILER.collapsed(reset=reset), headers={
+        "X-Profile-Sample-Rate": str(PROFILE_SAMPLE_RATE),
+        "X-Profile-Samples": str(samples)
+    })
+
+@app.get("/cache/stats")
+def cache_stats():
+    engine = get_engine()
+    return {**engine.cache.get_stats(), "semantic": engine.semantic_cache.get_stats()}
+
+@app.get("/cascade/stats")
+def cascade_stats():
+    engine = get_engine()
+    return {
+        "enabled": engine.CASCADE,
+        "depths": engine.CASCADE_DEPTHS,
+        "reranker": engine.RERANKER,
+        **engine.cascade_stats.get_stats()
+    }
+
+@app.get("/analyzer/stats")
+def analyzer_stats():
+    analyzer = get_engine().analyzer
+    if hasattr(analyzer, "get_stats"):
+        return analyzer.get_stats()
+    return {"mode": "custom"}
+
+def require_admin(request: Request):
+    """Admin endpoints answer 404 unless ADMIN_TOKEN is set, then need `Authorization: Bearer <token>`"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Admin token required", headers={"WWW-Authenticate": "Bearer"})
+
+@app.post("/cache/invalidate", dependencies=[Depends(require_admin)])
+def cache_invalidate():
+    get_engine().invalidate_cache()
+    return {"status": "invalidated"}
+
+@app.post("/vector-store/reload", dependencies=[Depends(require_admin)])
+def vector_store_reload():
+    """Installs the snapshot published by update_index.py without waiting for the periodic check"""
+    engine = get_engine()
+    reloaded = engine.reload()
+    return {"reloaded": reloaded, "version": engine.snapshot.version, "assessments": len(engine.snapshot)}
+
 @app.post("/recommend", response_model=list[RecommendationResponse])
-def recommend(request: QueryRequest):
+async def recommend(request: QueryRequest, response: Response):
     try:
-        results = engine.retrieve(request.query, top_k=10)
+        engine = await ready_engine()
+        results = await engine.retrieve_async(request.query, top_k=10, filters=filter_dict(request.filters))
+        
+        # Served from a fallback because Groq or Gemini failed (see UPSTREAM_FALLBACK)
+        degraded = getattr(results, "degraded", None)
+        if degraded:
+            response.headers["X-Degraded"] = ",".join(degraded)
         
         # Format response per SHL spec
         recommendations = [
@@ -45,8 +220,49 @@ def recommend(request: QueryRequest):
         
         return recommendations
         
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Upstream model call timed out")
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(BREAKER_RESET))})
+    except UpstreamError as e:
+        raise HTTPException(status_code=502, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/recommend/batch")
+async def recommend_batch(request: BatchQueryRequest):
+    """
+    Streams one NDJSON line per query, in input order:
+    {"index": 0, "recommendations": [...]} or {"index": 0, "error": "..."},
+    with "degraded": ["llm"] etc. on results served from a fallback
+    """
+    engine = await ready_engine()
+
+    async def stream():
+        queries = request.queries
+        for start in range(0, len(queries), BATCH_CHUNK_SIZE):
+            chunk = queries[start:start + BATCH_CHUNK_SIZE]
+            results = await asyncio.to_thread(
+                engine.retrieve_batch, chunk, 10,
+                return_exceptions=True, filters=filter_dict(request.filters)
+            )
+            for offset, result in enumerate(results):
+                line = {"index": start + offset}
+                if isinstance(result, Exception):
+                    line["error"] = str(result)
+                else:
+                    line["recommendations"] = [
+                        {
+                            "assessment_name": rec["assessment_name"],
+                            "assessment_url": rec["assessment_url"]
+                        }
+                        for rec in result
+                    ]
+                    if getattr(result, "degraded", None):
+                        line["degraded"] = result.degraded
+                yield json.dumps(line) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
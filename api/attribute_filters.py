@@ -0,0 +1,164 @@
+# api/attribute_filters.py
+
+import os
+import re
+import json
+import numpy as np
+from balancing import type_mask
+
+# SHL job levels as they appear on the product pages; one bit each
+JOB_LEVELS = [
+    'Director', 'Entry-Level', 'Executive', 'Front Line Manager', 'General Population',
+    'Graduate', 'Manager', 'Mid-Professional', 'Professional Individual Contributor', 'Supervisor'
+]
+# Languages share one uint64 bitset; extra ones beyond this are dropped at build time
+MAX_LANGUAGES = 64
+UNKNOWN_DURATION = -1
+
+FILTER_KEYS = ['test_types', 'min_duration', 'max_duration', 'job_levels', 'languages', 'remote']
+
+_DURATION = re.compile(r'(\d+)\s*minutes?', re.IGNORECASE)
+# The scraper sometimes shifted fields, e.g. "Job Levels: ..." landing in assessment_length
+_FIELD_PREFIX = re.compile(r'^(?:job levels|languages|assessment length)\s*:\s*', re.IGNORECASE)
+_NOT_VALUES = {'', 'not found', 'failed', 'unknown'}
+_LANGUAGE = re.compile(r"^[A-Z][A-Za-z]+(?: [A-Za-z()]+){0,3}$")
+
+
+def _segments(*fields):
+    for field in fields:
+        for part in (field or '').split(','):
+            part = _FIELD_PREFIX.sub('', part.strip()).strip()
+            if part.lower() not in _NOT_VALUES:
+                yield part
+
+
+def parse_attributes(assessment_length, job_levels, languages, remote_testing):
+    """
+    Cleans the scraped attribute strings of one assessment into
+    (duration_minutes, job levels, languages, remote). Values are picked
+    up from whichever of the three text fields they ended up in.
+    """
+    match = _DURATION.search(assessment_length or '')
+    duration = int(match.group(1)) if match else UNKNOWN_DURATION
+
+    levels, langs = [], []
+    for part in _segments(job_levels, languages, assessment_length):
+        if part in JOB_LEVELS:
+            levels.append(part)
+        elif _LANGUAGE.match(part) and not _DURATION.search(part):
+            langs.append(part)
+
+    remote = (remote_testing or '').strip().lower() in ('remote', 'yes', 'true')
+    return duration, list(dict.fromkeys(levels)), list(dict.fromkeys(langs)), remote
+
+
+def _bits(names, vocab):
+    return sum(1 << vocab.index(n) for n in names if n in vocab)
+
+
+class AttributeIndex:
+    """
+    Per-assessment filter attributes as flat arrays aligned with the FAISS
+    ids: duration in minutes (int16, -1 unknown), job-level and language
+    bitsets, a remote flag, and the test-type bitmasks used for balancing.
+    A filter dict compiles to one boolean mask over the catalog.
+    """
+
+    def __init__(self, duration, job_level_bits, language_bits, remote, type_masks, languages):
+        self.duration = duration
+        self.job_level_bits = job_level_bits
+        self.language_bits = language_bits
+        self.remote = remote
+        self.type_masks = type_masks
+        self.languages = languages
+
+    def __len__(self):
+        return len(self.duration)
+
+    @classmethod
+    def build(cls, store, type_masks):
+        """From the catalog's attribute columns (empty strings on older catalogs)"""
+        columns = store.columns
+        parsed = []
+        for i in range(len(store)):
+            parsed.append(parse_attributes(*(
+                columns[name][i] if name in columns else ''
+                for name in ('assessment_length', 'job_levels', 'languages', 'remote_testing')
+            )))
+
+        counts = {}
+        for _, _, langs, _ in parsed:
+            for lang in langs:
+                counts[lang] = counts.get(lang, 0) + 1
+        # Most common first so a cap only ever drops the rarest (usually scraping noise)
+        languages = sorted(counts, key=lambda l: (-counts[l], l))[:MAX_LANGUAGES]
+
+        return cls(
+            duration=np.array([p[0] for p in parsed], dtype='int16'),
+            job_level_bits=np.array([_bits(p[1], JOB_LEVELS) for p in parsed], dtype='uint16'),
+            language_bits=np.array([_bits(p[2], languages) for p in parsed], dtype='uint64'),
+            remote=np.array([p[3] for p in parsed], dtype='bool'),
+            type_masks=np.asarray(type_masks, dtype='uint8'),
+            languages=languages
+        )
+
+    def save(self, out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+        np.save(os.path.join(out_dir, 'duration.npy'), self.duration)
+        np.save(os.path.join(out_dir, 'job_level_bits.npy'), self.job_level_bits)
+        np.save(os.path.join(out_dir, 'language_bits.npy'), self.language_bits)
+        np.save(os.path.join(out_dir, 'remote.npy'), self.remote)
+        with open(os.path.join(out_dir, 'vocab.json'), 'w', encoding='utf-8') as f:
+            json.dump({'job_levels': JOB_LEVELS, 'languages': self.languages}, f, indent=2)
+
+    @classmethod
+    def load(cls, in_dir, type_masks):
+        with open(os.path.join(in_dir, 'vocab.json'), 'r', encoding='utf-8') as f:
+            vocab = json.load(f)
+        if vocab['job_levels'] != JOB_LEVELS:
+            raise ValueError(f"Job level vocabulary in {in_dir} is out of date; rebuild the index")
+        return cls(
+            duration=np.load(os.path.join(in_dir, 'duration.npy'), mmap_mode='r'),
+            job_level_bits=np.load(os.path.join(in_dir, 'job_level_bits.npy'), mmap_mode='r'),
+            language_bits=np.load(os.path.join(in_dir, 'language_bits.npy'), mmap_mode='r'),
+            remote=np.load(os.path.join(in_dir, 'remote.npy'), mmap_mode='r'),
+            type_masks=type_masks,
+            languages=vocab['languages']
+        )
+
+    @staticmethod
+    def _matching(requested, vocab):
+        """Case-insensitive substring match, so 'English' covers 'English (USA)' etc."""
+        requested = [r.strip().lower() for r in requested]
+        return [v for v in vocab if any(r and r in v.lower() for r in requested)]
+
+    def mask(self, filters):
+        """
+        Boolean mask of assessments passing every given filter, or None when
+        nothing is filtered. List filters match any of their values; duration
+        bounds exclude assessments without a known duration.
+        """
+        if not filters:
+            return None
+        unknown = set(filters) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown filters {sorted(unknown)}, expected some of {FILTER_KEYS}")
+
+        allowed = np.ones(len(self), dtype='bool')
+
+        if filters.get('test_types'):
+            allowed &= (self.type_masks & type_mask(filters['test_types'])) != 0
+        if filters.get('min_duration') is not None:
+            allowed &= self.duration >= int(filters['min_duration'])
+        if filters.get('max_duration') is not None:
+            allowed &= (self.duration != UNKNOWN_DURATION) & (self.duration <= int(filters['max_duration']))
+        if filters.get('job_levels'):
+            bits = _bits(self._matching(filters['job_levels'], JOB_LEVELS), JOB_LEVELS)
+            allowed &= (self.job_level_bits & np.uint16(bits)) != 0
+        if filters.get('languages'):
+            bits = _bits(self._matching(filters['languages'], self.languages), self.languages)
+            allowed &= (self.language_bits & np.uint64(bits)) != 0
+        if filters.get('remote') is not None:
+            allowed &= self.remote == bool(filters['remote'])
+
+        return allowed
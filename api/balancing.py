@@ -0,0 +1,100 @@
+# api/balancing.py
+
+import numpy as np
+
+# One bit per SHL test type letter (see TEST_TYPE_MAPPING); 8 letters fit a uint8
+TYPE_BITS = {letter: 1 << i for i, letter in enumerate('ABCDEKPS')}
+
+
+def type_mask(test_types):
+    """Bitmask for a list of test type letters; unknown labels get no bit"""
+    mask = 0
+    for t in test_types:
+        mask |= TYPE_BITS.get(t, 0)
+    return mask
+
+
+def build_type_masks(test_type_lists):
+    return np.fromiter((type_mask(types) for types in test_type_lists), dtype='uint8')
+
+
+def build_url_ids(urls):
+    """Dense id per distinct URL so de-duplication is an integer array lookup"""
+    seen = {}
+    return np.fromiter((seen.setdefault(u, len(seen)) for u in urls), dtype='int32')
+
+
+def top_k_stable(scores, k):
+    """
+    Positions of the k highest scores, best first, ties broken by position -
+    the same order sorted(..., reverse=True) gives - via a partial sort.
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.zeros(0, dtype='int64')
+    if n <= k:
+        return np.argsort(-scores, kind='stable')
+    kth = np.partition(scores, n - k)[n - k]
+    above = np.flatnonzero(scores > kth)
+    equal = np.flatnonzero(scores == kth)[:k - len(above)]
+    selected = np.sort(np.concatenate([above, equal]))
+    return selected[np.argsort(-scores[selected], kind='stable')]
+
+
+def _first_unique(positions, url_ids, taken_urls, limit):
+    """Walks positions in order, keeping the first hit per URL not yet taken"""
+    kept = []
+    for p in positions:
+        url = url_ids[p]
+        if url in taken_urls:
+            continue
+        taken_urls.add(url)
+        kept.append(p)
+        if len(kept) == limit:
+            break
+    return kept
+
+
+def _top_unique(scores, eligible, url_ids, taken_urls, limit):
+    """
+    Best `limit` eligible positions with distinct URLs. Starts with a
+    partial sort of size `limit` and only widens it when duplicates
+    push the count below the limit.
+    """
+    eligible = np.flatnonzero(eligible)
+    k = limit
+    while True:
+        order = eligible[top_k_stable(scores[eligible], k)]
+        trial = set(taken_urls)
+        kept = _first_unique(order, url_ids, trial, limit)
+        if len(kept) == limit or k >= len(eligible):
+            taken_urls |= trial
+            return kept
+        k *= 2
+
+
+def select_balanced(scores, masks, url_ids, required_mask, target_count=10):
+    """
+    Array form of the relaxed test-type balancing. All arguments are aligned
+    per candidate (scores, type bitmasks, URL ids). Returns candidate
+    positions in output order:
+
+    * no required types (required_mask is None): top target_count by score
+    * otherwise: best candidates (distinct URLs) having any required type,
+      then the best remaining distinct URLs to fill up to target_count
+    """
+    scores = np.asarray(scores, dtype='float32')
+    if required_mask is None:
+        return list(top_k_stable(scores, target_count))
+
+    taken_urls = set()
+    matching = (masks & required_mask) != 0
+    first = _top_unique(scores, matching, url_ids, taken_urls, target_count)
+    if len(first) >= target_count:
+        return first
+
+    remaining = ~np.isin(url_ids, list(taken_urls))
+    second = _top_unique(scores, remaining, url_ids, taken_urls, target_count - len(first))
+
+    # The first pass preferred matching candidates; fill in score order after them
+    return first + second
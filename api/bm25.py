@@ -0,0 +1,121 @@
+# api/bm25.py
+
+import os
+import re
+import json
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9+#]+)*|\.net")
+
+# Catalog boilerplate that would otherwise dominate every posting list
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to with
+will can you your our we who their they them which what when where how not but if into
+assessment assessments test tests solution new description job levels languages duration
+remote testing types type minutes
+""".split())
+
+
+def tokenize(text):
+    """Lowercased word tokens; keeps skill spellings like c++, c#, .net and node.js"""
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    BM25 over a fixed document set with CSR-style posting lists:
+    postings for term id t are doc_ids[indptr[t]:indptr[t + 1]] with the
+    matching precomputed BM25 weights, so scoring a query is a handful of
+    array slices and one np.add.at.
+    """
+
+    def __init__(self, vocab, indptr, doc_ids, weights, n_docs):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.n_docs = n_docs
+
+    @classmethod
+    def build(cls, texts, k1=1.5, b=0.75):
+        docs = [tokenize(t) for t in texts]
+        n_docs = len(docs)
+        doc_lengths = np.array([len(d) for d in docs], dtype='float32')
+        avg_length = float(doc_lengths.mean()) if n_docs else 0.0
+
+        # term -> {doc: tf}
+        term_docs = {}
+        for doc_id, tokens in enumerate(docs):
+            for token in tokens:
+                counts = term_docs.setdefault(token, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+
+        vocab = {term: i for i, term in enumerate(sorted(term_docs))}
+        indptr = np.zeros(len(vocab) + 1, dtype='int64')
+        doc_id_parts = []
+        weight_parts = []
+        for term, term_id in vocab.items():
+            counts = term_docs[term]
+            ids = np.fromiter(counts.keys(), dtype='int32', count=len(counts))
+            tf = np.fromiter(counts.values(), dtype='float32', count=len(counts))
+            idf = np.log(1 + (n_docs - len(counts) + 0.5) / (len(counts) + 0.5))
+            norm = k1 * (1 - b + b * doc_lengths[ids] / avg_length)
+            doc_id_parts.append(ids)
+            weight_parts.append((idf * tf * (k1 + 1) / (tf + norm)).astype('float32'))
+            indptr[term_id + 1] = indptr[term_id] + len(ids)
+
+        doc_ids = np.concatenate(doc_id_parts) if doc_id_parts else np.zeros(0, dtype='int32')
+        weights = np.concatenate(weight_parts) if weight_parts else np.zeros(0, dtype='float32')
+        return cls(vocab, indptr, doc_ids, weights, n_docs)
+
+    def term_ids(self, tokens):
+        return [self.vocab[t] for t in dict.fromkeys(tokens) if t in self.vocab]
+
+    def scores(self, query_text):
+        """Dense BM25 score per document (zeros where nothing matched)"""
+        return self.scores_for_tokens(tokenize(query_text))
+
+    def scores_for_tokens(self, tokens):
+        term_ids = self.term_ids(tokens)
+        if not term_ids:
+            return np.zeros(self.n_docs, dtype='float32')
+        slices = [slice(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        doc_ids = np.concatenate([self.doc_ids[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        return np.bincount(doc_ids, weights=weights, minlength=self.n_docs).astype('float32')
+
+    def search(self, query_text, top_k=10, tokens=None, allowed=None):
+        """
+        Returns (doc_ids, scores) of the best matching documents, best first.
+        `allowed` (boolean per document) restricts the hits to a filtered subset.
+        """
+        scores = self.scores_for_tokens(tokens if tokens is not None else tokenize(query_text))
+        if allowed is not None:
+            scores[~allowed] = 0
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        order = matched[np.argsort(-scores[matched], kind='stable')]
+        return order, scores[order]
+
+    def save(self, out_dir):
+        """indptr / doc_ids / weights as .npy (memory-mappable) plus the vocabulary in id order"""
+        os.makedirs(out_dir, exist_ok=True)
+        np.save(os.path.join(out_dir, 'indptr.npy'), self.indptr)
+        np.save(os.path.join(out_dir, 'doc_ids.npy'), self.doc_ids)
+        np.save(os.path.join(out_dir, 'weights.npy'), self.weights)
+        terms = sorted(self.vocab, key=self.vocab.get)
+        with open(os.path.join(out_dir, 'vocab.json'), 'w', encoding='utf-8') as f:
+            json.dump({'n_docs': self.n_docs, 'terms': terms}, f)
+
+    @classmethod
+    def load(cls, in_dir):
+        with open(os.path.join(in_dir, 'vocab.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return cls(
+            vocab={term: i for i, term in enumerate(meta['terms'])},
+            indptr=np.load(os.path.join(in_dir, 'indptr.npy'), mmap_mode='r'),
+            doc_ids=np.load(os.path.join(in_dir, 'doc_ids.npy'), mmap_mode='r'),
+            weights=np.load(os.path.join(in_dir, 'weights.npy'), mmap_mode='r'),
+            n_docs=meta['n_docs']
+        )
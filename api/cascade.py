@@ -0,0 +1,267 @@
+# api/cascade.py
+
+import os
+import time
+import threading
+import numpy as np
+from bm25 import tokenize
+from balancing import TYPE_BITS, type_mask, top_k_stable
+from field_index import field_texts
+from telemetry import REGISTRY, COUNT_BUCKETS, get_logger, upstream
+
+log = get_logger("cascade")
+
+# Local second stage over the first-stage survivors: none | features | cross-encoder
+CROSS_ENCODER_MODEL = os.environ.get("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+CROSS_ENCODER_THREADS = int(os.environ.get("CROSS_ENCODER_THREADS", 2))
+RERANKERS = ['none', 'features', 'cross-encoder']
+
+# FeatureReranker: first-stage score (min-max over the survivors) plus boosts
+FEATURE_WEIGHTS = {'score': 1.0, 'type_match': 0.3, 'skill_match': 0.3, 'name_overlap': 0.2}
+
+CASCADE_DEPTH = REGISTRY.histogram(
+    "shl_cascade_depth", "Candidate depth the cascade stopped at", buckets=COUNT_BUCKETS)
+CASCADE_EXPANSIONS = REGISTRY.counter(
+    "shl_cascade_expansions_total", "Cascade depth increases by reason", labels=("reason",))
+RERANK_TRUNCATED = REGISTRY.counter(
+    "shl_rerank_truncated_total", "Rerank stages cut short by the time budget")
+
+
+def expansion_reason(source_scores, masks, url_ids, required_types, top_k, flat_gap):
+    """
+    Why a candidate pool should be searched deeper, or None when it is
+    deep enough. `masks` and `url_ids` are aligned with the pool;
+    `source_scores` are the dense hits' similarities, best first (fused
+    RRF scores depend on rank only, so they say nothing about flatness).
+
+    * 'quota': fewer than top_k distinct URLs with a required type (or at
+      all), or a required type with no candidate - balancing would have to
+      fill from non-matching candidates that a deeper pool could replace
+    * 'flat': the last candidate scores within `flat_gap` (relative) of the
+      top_k-th, so the cut-off falls inside a run of near-ties
+    """
+    required_mask = type_mask(required_types) if required_types else 0
+    matching = (masks & required_mask) != 0 if required_mask else np.ones(len(masks), dtype=bool)
+    if len(np.unique(url_ids[matching])) < top_k:
+        return 'quota'
+    if any(not (masks & TYPE_BITS[t]).any() for t in required_types if t in TYPE_BITS):
+        return 'quota'
+
+    if len(source_scores) > top_k:
+        boundary = float(source_scores[top_k - 1])
+        if boundary - float(source_scores[-1]) < flat_gap * max(abs(boundary), 1e-6):
+            return 'flat'
+    return None
+
+
+class FeatureReranker:
+    """
+    Cheap second stage: the first-stage score plus the share of required
+    test types an assessment covers, the share of analyzed hard skills in
+    its name and the query's token overlap with its name. Runs in well
+    under a millisecond for a few dozen survivors, so it takes them all
+    in one call.
+    """
+
+    model = 'features'
+    batch_size = None
+    # Running estimate of one score() call, for the budget check (see rerank)
+    batch_ms = None
+
+    def __init__(self, weights=FEATURE_WEIGHTS):
+        self.weights = weights
+
+    def ready(self):
+        return True
+
+    def score(self, query_text, query_analysis, ids, scores, snapshot):
+        names = [set(tokenize(snapshot.store.columns['name'][int(i)])) for i in ids]
+        query_tokens = set(tokenize(query_text))
+        skills = [set(tokenize(s)) for s in query_analysis.get('hard_skills', [])]
+        skills = [s for s in skills if s]
+        required = query_analysis.get('required_test_types', [])
+        required_mask = type_mask(required)
+
+        scores = np.asarray(scores, dtype='float32')
+        spread = float(scores.max() - scores.min()) if len(scores) else 0.0
+        features = {
+            'score': (scores - scores.min()) / spread if spread > 0 else np.ones(len(scores), dtype='float32'),
+            'type_match': np.array([bin(int(m) & required_mask).count('1') for m in snapshot.type_masks[ids]],
+                                   dtype='float32') / max(bin(required_mask).count('1'), 1),
+            'skill_match': np.array([sum(s <= name for s in skills) for name in names],
+                                    dtype='float32') / max(len(skills), 1),
+            'name_overlap': np.array([len(name & query_tokens) / len(name) if name else 0.0 for name in names],
+                                     dtype='float32')
+        }
+        return sum(self.weights[f] * values for f, values in features.items())
+
+
+class CrossEncoderReranker:
+    """
+    Small sentence-transformers cross-encoder on CPU scoring (query,
+    name + description) pairs, `batch_size` at a time so the time budget
+    can stop it between batches. Loaded by connect() at warm-up; until it
+    is, ready() starts the load in the background and rerank() skips it.
+    """
+
+    batch_size = int(os.environ.get("RERANK_BATCH", 8))
+    batch_ms = None
+
+    def __init__(self, model_name=CROSS_ENCODER_MODEL, threads=CROSS_ENCODER_THREADS):
+        self.model_name = model_name
+        self.threads = threads
+        self.model = f"cross-encoder/{os.path.basename(model_name.rstrip('/'))}"
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._loader = None
+
+    def ready(self):
+        """True once the model is loaded; never loads it on the caller's thread"""
+        if self._model is not None:
+            return True
+        if self._loader is None:
+            self._loader = threading.Thread(target=self._background_load, name="cross-encoder-load", daemon=True)
+            self._loader.start()
+        return False
+
+    def _background_load(self):
+        try:
+            self.connect()
+        except Exception as e:
+            log.warning("⚠ Could not load %s: %s", self.model, e)
+
+    def connect(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    import torch
+                    from sentence_transformers import CrossEncoder
+                    torch.set_num_threads(self.threads)
+                    start = time.perf_counter()
+                    model = CrossEncoder(self.model_name, device='cpu')
+                    model.predict([("warm up", "warm up")], show_progress_bar=False)
+                    # A full batch seeds the cost estimate the first request's budget check uses
+                    batch_start = time.perf_counter()
+                    model.predict([("warm up", "warm up")] * self.batch_size, show_progress_bar=False)
+                    self.batch_ms = (time.perf_counter() - batch_start) * 1000
+                    self._model = model
+                    log.info("✅ Loaded %s in %.2fs", self.model, time.perf_counter() - start)
+        return self._model
+
+    def score(self, query_text, query_analysis, ids, scores, snapshot):
+        pairs = [(query_text, ' '.join(t for t in field_texts(snapshot.store, int(i))[:2] if t)) for i in ids]
+        with upstream('cross_encoder'):
+            return np.asarray(self.connect().predict(pairs, show_progress_bar=False), dtype='float32')
+
+
+def get_reranker(name):
+    if name not in RERANKERS:
+        raise ValueError(f"Unknown reranker {name!r}, expected one of {RERANKERS}")
+    if name == 'features':
+        return FeatureReranker()
+    if name == 'cross-encoder':
+        return CrossEncoderReranker()
+    return None
+
+
+def rerank(reranker, query_text, query_analysis, ids, scores, snapshot, depth, budget_ms):
+    """
+    Ordering scores for balancing: the best `depth` candidates are
+    re-scored batch by batch while the reranker's running per-batch cost
+    estimate still fits in `budget_ms` - checked before the first batch
+    too, so a reranker slower than the whole budget (or one still
+    loading) re-scores nothing. A skip shrinks the estimate by 10%, so a
+    transient slowdown is re-probed after a few queries. The re-scored
+    ones are reordered among themselves by taking over their own
+    first-stage score values, so they stay ahead of the rest. Returns
+    (ordering scores, candidates re-scored, truncated).
+    """
+    order = top_k_stable(np.asarray(scores, dtype='float32'), depth)
+    step = reranker.batch_size or len(order)
+    start = time.perf_counter()
+    rescored = []
+    if reranker.ready():
+        for i in range(0, len(order), step):
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            estimate = reranker.batch_ms
+            if estimate is not None and elapsed_ms + estimate > budget_ms:
+                if not i:
+                    reranker.batch_ms = estimate * 0.9
+                break
+            batch_start = time.perf_counter()
+            batch = order[i:i + step]
+            rescored.extend(reranker.score(query_text, query_analysis, ids[batch], scores[batch], snapshot))
+            batch_ms = (time.perf_counter() - batch_start) * 1000
+            reranker.batch_ms = batch_ms if estimate is None else 0.8 * estimate + 0.2 * batch_ms
+
+    prefix = order[:len(rescored)]
+    rank_scores = np.array(scores, dtype='float32')
+    rank_scores[prefix[np.argsort(-np.asarray(rescored), kind='stable')]] = rank_scores[prefix]
+    truncated = len(prefix) < len(order)
+    if truncated:
+        RERANK_TRUNCATED.inc()
+    return rank_scores, len(prefix), truncated
+
+
+class CascadeStats:
+    """
+    Counters behind /cascade/stats: depth per query, expansions by
+    reason, rerank work, and for the sampled shadow runs the search +
+    selection time of the cascade next to the fixed-depth baseline on
+    the same query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stats = {
+                'queries': 0, 'depth_sum': 0, 'quota': 0, 'flat': 0,
+                'reranked': 0, 'rescored_sum': 0, 'truncated': 0, 'rerank_ms_sum': 0.0,
+                'shadow': 0, 'shadow_cascade_ms': 0.0, 'shadow_baseline_ms': 0.0, 'shadow_same': 0
+            }
+
+    def record(self, depth, reasons):
+        CASCADE_DEPTH.observe(depth)
+        for reason in reasons:
+            CASCADE_EXPANSIONS.inc(reason)
+        with self._lock:
+            self.stats['queries'] += 1
+            self.stats['depth_sum'] += depth
+            for reason in reasons:
+                self.stats[reason] += 1
+
+    def record_rerank(self, rescored, truncated, elapsed_ms):
+        with self._lock:
+            self.stats['reranked'] += 1
+            self.stats['rescored_sum'] += rescored
+            self.stats['truncated'] += int(truncated)
+            self.stats['rerank_ms_sum'] += elapsed_ms
+
+    def record_shadow(self, cascade_ms, baseline_ms, same_results):
+        with self._lock:
+            self.stats['shadow'] += 1
+            self.stats['shadow_cascade_ms'] += cascade_ms
+            self.stats['shadow_baseline_ms'] += baseline_ms
+            self.stats['shadow_same'] += int(same_results)
+
+    def get_stats(self):
+        with self._lock:
+            s = dict(self.stats)
+        queries, shadow, reranked = s['queries'], s['shadow'], s['reranked']
+        return {
+            'queries': queries,
+            'avg_depth': s['depth_sum'] / queries if queries else 0.0,
+            'expansions': {'quota': s['quota'], 'flat': s['flat']},
+            'reranked': reranked,
+            'avg_rescored': s['rescored_sum'] / reranked if reranked else 0.0,
+            'rerank_truncated': s['truncated'],
+            'avg_rerank_ms': s['rerank_ms_sum'] / reranked if reranked else 0.0,
+            'shadow_samples': shadow,
+            'avg_cascade_ms': s['shadow_cascade_ms'] / shadow if shadow else 0.0,
+            'avg_baseline_ms': s['shadow_baseline_ms'] / shadow if shadow else 0.0,
+            'avg_saved_ms': (s['shadow_baseline_ms'] - s['shadow_cascade_ms']) / shadow if shadow else 0.0,
+            'same_results_ratio': s['shadow_same'] / shadow if shadow else 0.0
+        }
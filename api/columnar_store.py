@@ -0,0 +1,345 @@
+# api/columnar_store.py
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+VECTORS_FILE = 'vectors.npy'
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CATALOG_DIR = os.path.join(BASE_DIR, 'vector_store', 'catalog')
+
+# String columns kept next to the vectors; test_type is stored space-joined.
+# The raw attribute strings feed the filter arrays built by faiss_index.py.
+STRING_COLUMNS = [
+    'name', 'url', 'test_type', 'test_type_full', 'embedding_text',
+    'assessment_length', 'job_levels', 'languages', 'remote_testing'
+]
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _fsync(path):
+    """Flushes a file's or directory's entry to disk"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _save_npy(path, array):
+    """np.save into a new file - never over an existing one, which a reader may have mapped"""
+    with open(path, 'xb') as f:
+        np.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _staging_dir(out_dir):
+    """Empty sibling of out_dir, on the same filesystem so it can be renamed into place"""
+    parent, name = os.path.split(os.path.abspath(out_dir))
+    os.makedirs(parent, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f".{name}.staging-", dir=parent)
+
+
+def _install_dir(staging_dir, out_dir):
+    """
+    Renames a complete catalog from staging_dir to out_dir. An existing
+    catalog is renamed aside and deleted, never rewritten, so processes
+    that have it mapped keep reading the old files. out_dir is missing
+    between the two renames: the live store is replaced by publishing a
+    new snapshot (vector_snapshot.publish_snapshot), not through this.
+    """
+    out_dir = os.path.abspath(out_dir)
+    _fsync(staging_dir)
+    old_dir = None
+    if os.path.exists(out_dir):
+        old_dir = f"{out_dir}.old-{os.getpid()}"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        os.rename(out_dir, old_dir)
+    os.rename(staging_dir, out_dir)
+    _fsync(os.path.dirname(out_dir))
+    if old_dir is not None:
+        shutil.rmtree(old_dir)
+
+
+def write_string_column(out_dir, name, values):
+    """
+    Stores a string column as `<name>.offsets.npy` (int64, n + 1 entries)
+    and `<name>.blob.npy` (uint8 UTF-8 bytes). Row i is blob[off[i]:off[i+1]].
+    """
+    encoded = [v.encode('utf-8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype='int64')
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    blob = np.frombuffer(b''.join(encoded), dtype='uint8')
+
+    files = [f"{name}.offsets.npy", f"{name}.blob.npy"]
+    _save_npy(os.path.join(out_dir, files[0]), offsets)
+    _save_npy(os.path.join(out_dir, files[1]), blob)
+    return files
+
+
+def write_store(out_dir, vectors, records, model):
+    """
+    Writes a versioned catalog: float32 vectors.npy, one offsets + blob pair
+    per string column, and a manifest with model, dimension, row count and
+    a sha256 per file. The files are written and fsynced in a sibling
+    staging directory, which then replaces out_dir (see _install_dir).
+
+    records: list of dicts with the STRING_COLUMNS keys, aligned with vectors
+    """
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    if vectors.ndim != 2 or vectors.shape[0] != len(records):
+        raise ValueError(f"Expected {len(records)} vectors, got shape {vectors.shape}")
+
+    staging_dir = _staging_dir(out_dir)
+    try:
+        _save_npy(os.path.join(staging_dir, VECTORS_FILE), vectors)
+        files = [VECTORS_FILE]
+
+        for column in STRING_COLUMNS:
+            values = []
+            for record in records:
+                value = record.get(column, '')
+                if isinstance(value, list):
+                    value = ' '.join(value)
+                values.append(value)
+            files.extend(write_string_column(staging_dir, column, values))
+
+        manifest = _write_manifest(staging_dir, files, model, int(vectors.shape[0]), int(vectors.shape[1]))
+        _install_dir(staging_dir, out_dir)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    print(f"✅ Wrote {manifest['count']} x {manifest['dimension']} catalog to {out_dir}")
+    return manifest
+
+
+def _write_manifest(out_dir, files, model, count, dimension):
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'model': model,
+        'dimension': dimension,
+        'count': count,
+        'columns': STRING_COLUMNS,
+        'checksums': {f: _sha256_file(os.path.join(out_dir, f)) for f in files}
+    }
+    # Manifest last - readers treat a catalog without one as incomplete
+    with open(os.path.join(out_dir, MANIFEST_FILE), 'x', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    return manifest
+
+
+def _raw_to_npy(raw_path, npy_path, dtype, shape):
+    """Puts a .npy header for `shape` in front of a headerless file of `dtype` rows, in a new file"""
+    dtype = np.dtype(dtype)
+    expected = int(np.prod(shape)) * dtype.itemsize
+    if os.path.getsize(raw_path) != expected:
+        raise ValueError(f"{raw_path} holds {os.path.getsize(raw_path)} bytes, expected {expected}")
+
+    header = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': shape}
+    with open(npy_path, 'xb') as out, open(raw_path, 'rb') as source:
+        np.lib.format.write_array_header_1_0(out, header)
+        shutil.copyfileobj(source, out, 1 << 22)
+        out.flush()
+        os.fsync(out.fileno())
+    os.remove(raw_path)
+
+
+class CatalogWriter:
+    """
+    Streaming form of write_store for catalogs produced batch by batch:
+    append() writes each batch's vectors and string bytes to headerless
+    temporary files in a sibling staging directory, so only the row
+    offsets stay in memory. close() turns them into the same .npy files
+    and manifest as write_store and only then replaces out_dir; abort()
+    removes the staging directory and leaves any existing catalog untouched.
+    """
+
+    def __init__(self, out_dir, model):
+        self.out_dir = out_dir
+        self.model = model
+        self.count = 0
+        self.dimension = None
+        self.staging_dir = _staging_dir(out_dir)
+
+        self._vectors = open(self._tmp(VECTORS_FILE), 'wb')
+        self._blobs = {c: open(self._tmp(f"{c}.blob.npy"), 'wb') for c in STRING_COLUMNS}
+        self._offsets = {c: [0] for c in STRING_COLUMNS}
+
+    def _path(self, name):
+        return os.path.join(self.staging_dir, name)
+
+    def _tmp(self, name):
+        return self._path(name + '.tmp')
+
+    def append(self, vectors, records):
+        """vectors: (len(records), dim) float32 rows for the STRING_COLUMNS dicts in `records`"""
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        if vectors.ndim != 2 or vectors.shape[0] != len(records):
+            raise ValueError(f"Expected {len(records)} vectors, got shape {vectors.shape}")
+        if self.dimension is None:
+            self.dimension = int(vectors.shape[1])
+        elif vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dimensional vectors, got {vectors.shape[1]}")
+
+        self._vectors.write(vectors.tobytes())
+        for column in STRING_COLUMNS:
+            offsets = self._offsets[column]
+            for record in records:
+                value = record.get(column, '')
+                if isinstance(value, list):
+                    value = ' '.join(value)
+                encoded = value.encode('utf-8')
+                self._blobs[column].write(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+        self.count += len(records)
+
+    def _close_files(self):
+        for f in [self._vectors, *self._blobs.values()]:
+            f.close()
+
+    def close(self):
+        self._close_files()
+        try:
+            if self.dimension is None:
+                raise ValueError("No rows were written to the catalog")
+
+            files = [VECTORS_FILE]
+            _raw_to_npy(self._tmp(VECTORS_FILE), self._path(VECTORS_FILE), 'float32', (self.count, self.dimension))
+            for column in STRING_COLUMNS:
+                offsets_file, blob_file = f"{column}.offsets.npy", f"{column}.blob.npy"
+                _save_npy(self._path(offsets_file), np.array(self._offsets[column], dtype='int64'))
+                _raw_to_npy(self._tmp(blob_file), self._path(blob_file), 'uint8', (self._offsets[column][-1],))
+                files.extend([offsets_file, blob_file])
+            manifest = _write_manifest(self.staging_dir, files, self.model, self.count, self.dimension)
+            _install_dir(self.staging_dir, self.out_dir)
+        except BaseException:
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
+            raise
+
+        print(f"✅ Wrote {manifest['count']} x {manifest['dimension']} catalog to {self.out_dir}")
+        return manifest
+
+    def abort(self):
+        self._close_files()
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+
+class StringColumn:
+    """Memory-mapped string column; rows are decoded on access"""
+
+    def __init__(self, store_dir, name):
+        self.offsets = np.load(os.path.join(store_dir, f"{name}.offsets.npy"), mmap_mode='r')
+        self.blob = np.load(os.path.join(store_dir, f"{name}.blob.npy"), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+
+class ColumnarStore:
+    """
+    Read side of the catalog. Opening only parses the manifest and maps the
+    files; pages are faulted in on demand and, being file-backed, are shared
+    by every worker process on the host.
+    """
+
+    def __init__(self, store_dir=DEFAULT_CATALOG_DIR, verify=False):
+        manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"Catalog manifest not found at {manifest_path}")
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+
+        if self.manifest['format_version'] != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported catalog format {self.manifest['format_version']} (expected {FORMAT_VERSION})"
+            )
+
+        self.store_dir = store_dir
+        if verify:
+            self.verify()
+
+        self.vectors = np.load(os.path.join(store_dir, VECTORS_FILE), mmap_mode='r')
+        self.columns = {name: StringColumn(store_dir, name) for name in self.manifest['columns']}
+
+    @property
+    def model(self):
+        return self.manifest['model']
+
+    @property
+    def dimension(self):
+        return self.manifest['dimension']
+
+    def __len__(self):
+        return self.manifest['count']
+
+    def verify(self):
+        for name, expected in self.manifest['checksums'].items():
+            actual = _sha256_file(os.path.join(self.store_dir, name))
+            if actual != expected:
+                raise ValueError(f"Checksum mismatch for {name} in {self.store_dir}")
+
+    def record(self, i):
+        """Row i in the shape the retrieval code uses for metadata"""
+        return {
+            'id': int(i),
+            'name': self.columns['name'][i],
+            'url': self.columns['url'][i],
+            'test_type': self.columns['test_type'][i].split(),
+            'test_type_full': self.columns['test_type_full'][i]
+        }
+
+
+class MetadataView:
+    """List-like view over the catalog so `metadata[idx]['url']` keeps working"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.store)
+        if not 0 <= i < len(self.store):
+            raise IndexError(i)
+        return self.store.record(i)
+
+    def __iter__(self):
+        for i in range(len(self.store)):
+            yield self.store.record(i)
+
+
+def convert_pickles(vector_store_dir=os.path.join(BASE_DIR, 'vector_store'),
+                    model='models/text-embedding-004'):
+    """One-off migration from the old embeddings.pkl / metadata.pkl layout"""
+    import pickle
+    with open(os.path.join(vector_store_dir, 'embeddings.pkl'), 'rb') as f:
+        embeddings_data = pickle.load(f)
+
+    vectors = np.array([item['embedding'] for item in embeddings_data], dtype='float32')
+    write_store(os.path.join(vector_store_dir, 'catalog'), vectors, embeddings_data, model)
+
+
+if __name__ == "__main__":
+    convert_pickles()
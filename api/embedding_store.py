@@ -0,0 +1,182 @@
+# api/embedding_store.py
+
+import os
+import hashlib
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows - single writer assumed
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STORE_DIR = os.environ.get(
+    "EMBEDDING_CACHE_DIR",
+    os.path.join(BASE_DIR, 'vector_store', 'embedding_cache')
+)
+
+
+def text_key(text):
+    """Content address of an embedding input"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class _ModelShard:
+    """
+    Vectors of one model: `<model>.f32` holds raw float32 rows and is
+    memory-mapped for reads, `<model>.idx` maps sha256 -> row, one
+    "<sha256> <row>" line per vector. Both files are append-only. The
+    flock serializes writers across processes; `_lock` keeps threads of
+    one process from reading the offsets and mapping mid-refresh.
+    """
+
+    def __init__(self, store_dir, model):
+        safe_name = model.replace('/', '_').replace(':', '_')
+        self.vectors_path = os.path.join(store_dir, f"{safe_name}.f32")
+        self.index_path = os.path.join(store_dir, f"{safe_name}.idx")
+        self.lock_path = os.path.join(store_dir, f"{safe_name}.lock")
+
+        self.dim = None
+        self.rows = {}
+        self._index_offset = 0
+        self._matrix = None
+        self._matrix_rows = 0
+        self._lock = threading.RLock()
+
+        self.refresh()
+
+    def refresh(self):
+        """Picks up rows appended since the last read (possibly by another process)"""
+        with self._lock:
+            if not os.path.exists(self.index_path):
+                return
+            with open(self.index_path, 'rb') as f:
+                f.seek(self._index_offset)
+                for raw in f:
+                    if not raw.endswith(b'\n'):
+                        break  # partially written by a concurrent writer
+                    line = raw.decode('ascii')
+                    if line.startswith('#dim='):
+                        self.dim = int(line[5:])
+                    else:
+                        key, row = line.split()
+                        self.rows[key] = int(row)
+                    self._index_offset += len(raw)
+
+    def _vectors(self):
+        needed = max(self.rows.values()) + 1 if self.rows else 0
+        if self._matrix is None or self._matrix_rows < needed:
+            # Only map whole rows; a concurrent append may still be in flight
+            n_rows = os.path.getsize(self.vectors_path) // (self.dim * 4)
+            self._matrix = np.memmap(self.vectors_path, dtype='float32', mode='r', shape=(n_rows, self.dim))
+            self._matrix_rows = n_rows
+        return self._matrix
+
+    def get(self, key):
+        with self._lock:
+            row = self.rows.get(key)
+            if row is None:
+                self.refresh()
+                row = self.rows.get(key)
+                if row is None:
+                    return None
+            return np.array(self._vectors()[row])
+
+    def append(self, items):
+        """items: list of (key, float32 vector)"""
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        with self._lock, open(self.lock_path, 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                items = [(k, v) for k, v in dict(items).items() if k not in self.rows]
+                if not items:
+                    return
+
+                if self.dim is None:
+                    self.dim = len(items[0][1])
+                    with open(self.index_path, 'a', encoding='utf-8') as f:
+                        f.write(f"#dim={self.dim}\n")
+
+                first_row = 0
+                if os.path.exists(self.vectors_path):
+                    first_row = os.path.getsize(self.vectors_path) // (self.dim * 4)
+
+                block = np.asarray([v for _, v in items], dtype='float32').reshape(-1, self.dim)
+                # Vectors first, index second: a crash never leaves an index
+                # line pointing at a row that was not written
+                with open(self.vectors_path, 'ab') as f:
+                    f.write(block.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                with open(self.index_path, 'a', encoding='utf-8') as f:
+                    for i, (key, _) in enumerate(items):
+                        f.write(f"{key} {first_row + i}\n")
+
+                self.refresh()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class EmbeddingStore:
+    """
+    Content-addressed embedding cache keyed by (model name, sha256 of text).
+
+    Written by the offline catalog build (embeddings/embeddings.py,
+    faiss_index.py), so a rebuild only calls the embedding API for text
+    that actually changed. The online query path (RetrievalEngine.embed_query)
+    only reads it; query vectors stay in a bounded in-memory cache.
+    """
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR):
+        self.store_dir = store_dir
+        self._shards = {}
+        self._lock = threading.Lock()
+
+    def _shard(self, model):
+        shard = self._shards.get(model)
+        if shard is None:
+            with self._lock:
+                shard = self._shards.get(model)
+                if shard is None:
+                    shard = _ModelShard(self.store_dir, model)
+                    self._shards[model] = shard
+        return shard
+
+    def get(self, model, text):
+        return self._shard(model).get(text_key(text))
+
+    def get_many(self, model, texts):
+        """Returns a list aligned with texts, None where no vector is stored"""
+        shard = self._shard(model)
+        return [shard.get(text_key(t)) for t in texts]
+
+    def put(self, model, text, vector):
+        self.put_many(model, [text], [vector])
+
+    def put_many(self, model, texts, vectors):
+        self._shard(model).append([(text_key(t), v) for t, v in zip(texts, vectors)])
+
+    def __len__(self):
+        return sum(len(shard.rows) for shard in self._shards.values())
+
+
+def seed_from_catalog(catalog_dir=os.path.join(BASE_DIR, 'vector_store', 'catalog'), store_dir=DEFAULT_STORE_DIR):
+    """
+    Imports the vectors of an existing catalog (keyed by its embedding_text
+    column) so the next pipeline run starts with a warm cache
+    """
+    from columnar_store import ColumnarStore
+    catalog = ColumnarStore(catalog_dir)
+    texts = [catalog.columns['embedding_text'][i] for i in range(len(catalog))]
+
+    store = EmbeddingStore(store_dir)
+    store.put_many(catalog.model, texts, catalog.vectors)
+    print(f"✅ Seeded {len(texts)} embeddings into {store_dir}")
+
+
+if __name__ == "__main__":
+    seed_from_catalog()
@@ -0,0 +1,165 @@
+# api/field_index.py
+
+import os
+import re
+import json
+import numpy as np
+
+# Directory of the field index inside a snapshot (built by faiss_index.py --fields)
+FIELD_INDEX_DIR = 'field_index'
+# Fields embedded separately, in the order of the `fields` codes
+FIELDS = ['name', 'description', 'job_levels']
+DEFAULT_FIELD_WEIGHTS = {'name': 0.35, 'description': 0.5, 'job_levels': 0.15}
+
+# The description only exists inside embedding_text ("... | Description: X | Job Levels: ...")
+_DESCRIPTION = re.compile(
+    r'(?:^|\| )Description: (.*?)(?= \| (?:Job Levels|Languages|Duration|Remote Testing): |$)', re.S
+)
+
+
+def parse_field_weights(spec):
+    """'name=0.3,description=0.5' -> weights for FIELDS; unnamed fields keep their default"""
+    weights = dict(DEFAULT_FIELD_WEIGHTS)
+    for part in filter(None, (p.strip() for p in (spec or '').split(','))):
+        field, _, value = part.partition('=')
+        if field.strip() not in weights:
+            raise ValueError(f"Unknown field {field.strip()!r} in field weights, expected one of {FIELDS}")
+        weights[field.strip()] = float(value)
+    return weights
+
+
+def field_texts(store, i):
+    """Text embedded for each field of catalog row i ('' = field missing, no vector)"""
+    columns = store.columns
+    match = _DESCRIPTION.search(columns['embedding_text'][i])
+    description = match.group(1).strip() if match else ''
+    job_levels = columns['job_levels'][i].strip() if 'job_levels' in columns else ''
+    return [
+        f"Assessment: {columns['name'][i].strip()}",
+        f"Description: {description}" if description else '',
+        f"Job Levels: {job_levels}" if job_levels else ''
+    ]
+
+
+class FieldIndex:
+    """
+    Several vectors per assessment, one per non-empty field, packed into
+    one contiguous float32 matrix (L2-normalized) grouped by owner:
+    `owners` holds each vector's catalog row and `fields` its FIELDS code.
+    A query is scored late, in one matrix product for all query rows:
+    each field vector's cosine is weighted by its field weight, summed per
+    assessment with np.add.reduceat and divided by the weight of the fields
+    that assessment has. A multi-row query (a chunked job description)
+    keeps each assessment's best row, or a row-weighted sum.
+    """
+
+    def __init__(self, vectors, owners, fields, n_docs, model):
+        self.vectors = vectors
+        self.owners = owners
+        self.fields = fields
+        self.n_docs = n_docs
+        self.model = model
+
+        # Owners are sorted, so each assessment's vectors are one contiguous run
+        self.starts = np.flatnonzero(np.diff(owners, prepend=-1))
+        self.doc_rows = np.asarray(owners[self.starts], dtype='int64')
+        self._weight_cache = {}
+
+    @classmethod
+    def build(cls, store, embed):
+        """From the catalog; `embed(texts)` returns one row per text from the catalog's embedder"""
+        texts, owners, fields = [], [], []
+        for i in range(len(store)):
+            for code, text in enumerate(field_texts(store, i)):
+                if text:
+                    texts.append(text)
+                    owners.append(i)
+                    fields.append(code)
+
+        vectors = np.ascontiguousarray(embed(texts), dtype='float32')
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return cls(vectors, np.array(owners, dtype='int32'), np.array(fields, dtype='int8'), len(store), store.model)
+
+    def save(self, out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+        np.save(os.path.join(out_dir, 'vectors.npy'), self.vectors)
+        np.save(os.path.join(out_dir, 'owners.npy'), self.owners)
+        np.save(os.path.join(out_dir, 'fields.npy'), self.fields)
+        with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump({'fields': FIELDS, 'model': self.model, 'count': int(len(self.owners)),
+                       'documents': int(self.n_docs), 'dimension': int(self.vectors.shape[1])}, f, indent=2)
+
+    @classmethod
+    def load(cls, in_dir):
+        with open(os.path.join(in_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['fields'] != FIELDS:
+            raise ValueError(f"Field list in {in_dir} is out of date; rebuild the field index")
+        return cls(
+            vectors=np.load(os.path.join(in_dir, 'vectors.npy'), mmap_mode='r'),
+            owners=np.load(os.path.join(in_dir, 'owners.npy')),
+            fields=np.load(os.path.join(in_dir, 'fields.npy')),
+            n_docs=manifest['documents'],
+            model=manifest['model']
+        )
+
+    def memory_bytes(self):
+        return int(self.vectors.nbytes + self.owners.nbytes + self.fields.nbytes)
+
+    def _weights(self, field_weights):
+        """Per-vector weights and per-assessment normalizers, cached per weight setting"""
+        key = tuple(field_weights.get(f, 0.0) for f in FIELDS)
+        cached = self._weight_cache.get(key)
+        if cached is None:
+            vector_weights = np.array(key, dtype='float32')[self.fields]
+            totals = np.add.reduceat(vector_weights, self.starts)
+            cached = (vector_weights, np.where(totals > 0, totals, 1.0).astype('float32'))
+            self._weight_cache[key] = cached
+        return cached
+
+    def search_batch(self, queries, top_k, field_weights=DEFAULT_FIELD_WEIGHTS, allowed=None,
+                     aggregation='max', row_weights=None):
+        """
+        (ids, scores) per query, best first; each query is a 1-D vector or
+        a matrix of rows. `row_weights` (one array per query, or None)
+        are used by the 'sum' aggregation. `allowed` masks catalog rows.
+        """
+        rows = [np.atleast_2d(np.asarray(q, dtype='float32')) for q in queries]
+        if not len(self.owners):
+            return [(np.empty(0, dtype='int64'), np.empty(0, dtype='float32')) for _ in rows]
+        matrix = np.vstack(rows)
+        matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        vector_weights, totals = self._weights(field_weights)
+
+        # (vectors x query rows) cosines -> weighted mean over each assessment's fields
+        sims = self.vectors @ matrix.T
+        sims *= vector_weights[:, None]
+        doc_scores = np.add.reduceat(sims, self.starts, axis=0) / totals[:, None]
+
+        keep = None if allowed is None else np.asarray(allowed)[self.doc_rows]
+        results = []
+        start = 0
+        for q, query_rows in enumerate(rows):
+            block = doc_scores[:, start:start + len(query_rows)]
+            start += len(query_rows)
+            if len(query_rows) == 1:
+                scores = block[:, 0]
+            elif aggregation == 'sum':
+                scores = block @ np.asarray(row_weights[q], dtype='float32')
+            else:
+                scores = block.max(axis=1)
+
+            ids = self.doc_rows
+            if keep is not None:
+                ids, scores = ids[keep], scores[keep]
+            if len(scores) > top_k:
+                top = np.argpartition(-scores, top_k - 1)[:top_k]
+                ids, scores = ids[top], scores[top]
+            order = np.argsort(-scores, kind='stable')
+            results.append((ids[order], scores[order].astype('float32')))
+        return results
+
+    def search(self, query, top_k, field_weights=DEFAULT_FIELD_WEIGHTS, allowed=None, aggregation='max',
+               row_weights=None):
+        return self.search_batch([query], top_k, field_weights, allowed, aggregation,
+                                 None if row_weights is None else [row_weights])[0]
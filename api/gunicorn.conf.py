@@ -0,0 +1,26 @@
+# api/gunicorn.conf.py
+#
+#   gunicorn -c gunicorn.conf.py app:app
+#
+# With PRELOAD_INDEX=1 (default) the master imports app.py and builds the
+# engine once before forking: the FAISS index, BM25 arrays and the
+# memory-mapped catalog are then shared by every worker copy-on-write
+# instead of being loaded WEB_CONCURRENCY times.
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+
+preload_app = os.environ.get("PRELOAD_INDEX", "1") == "1"
+if preload_app:
+    # Only an engine built at import can be shared; lazy mode would load it per worker
+    os.environ.setdefault("STARTUP_MODE", "eager")
+
+
+def post_fork(server, worker):
+    # Drop per-process handles (SQLite cache connection, locks) inherited from the master
+    import app
+    app.after_fork()
@@ -0,0 +1,82 @@
+# api/hybrid_search.py
+
+import numpy as np
+
+# Reciprocal-rank-fusion constant from the original RRF paper
+RRF_K = 60
+
+
+def rrf_fuse(ranked_ids, weights=None, k=RRF_K, top_k=100):
+    """
+    Reciprocal-rank fusion of several best-first id arrays:
+    score(d) = sum_i w_i / (k + rank_i(d)). Works on the union of the
+    candidates only, so the cost is independent of catalog size.
+
+    Returns (ids, scores), best first.
+    """
+    weights = weights or [1.0] * len(ranked_ids)
+    ids = np.concatenate([np.asarray(r, dtype='int64') for r in ranked_ids])
+    contributions = np.concatenate([
+        w / (k + np.arange(1, len(r) + 1, dtype='float32')) for r, w in zip(ranked_ids, weights)
+    ])
+    return _sum_by_id(ids, contributions, top_k)
+
+
+def weighted_fuse(ranked_ids, ranked_scores, weights, top_k=100):
+    """
+    Min-max normalizes each list's scores to [0, 1] and sums them with the
+    given weights; documents missing from a list get 0 from it.
+    """
+    ids = np.concatenate([np.asarray(r, dtype='int64') for r in ranked_ids])
+    parts = []
+    for scores, w in zip(ranked_scores, weights):
+        scores = np.asarray(scores, dtype='float32')
+        if len(scores) == 0:
+            parts.append(scores)
+            continue
+        low, high = scores.min(), scores.max()
+        normalized = (scores - low) / (high - low) if high > low else np.ones_like(scores)
+        parts.append(w * normalized)
+    return _sum_by_id(ids, np.concatenate(parts), top_k)
+
+
+def _sum_by_id(ids, contributions, top_k):
+    if len(ids) == 0:
+        return ids, contributions
+    unique_ids, inverse = np.unique(ids, return_inverse=True)
+    fused = np.bincount(inverse, weights=contributions).astype('float32')
+    return _top(unique_ids, fused, top_k)
+
+
+def _top(ids, scores, top_k):
+    if len(scores) > top_k:
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        best = np.arange(len(scores))
+    best = best[np.argsort(-scores[best], kind='stable')]
+    return ids[best], scores[best]
+
+
+def max_fuse(ranked_ids, ranked_scores, top_k=100):
+    """
+    Max-sim aggregation of several (ids, scores) lists, e.g. one per query
+    chunk: each document keeps its best score from any list.
+    """
+    ids = np.concatenate([np.asarray(r, dtype='int64') for r in ranked_ids])
+    scores = np.concatenate([np.asarray(s, dtype='float32') for s in ranked_scores])
+    if len(ids) == 0:
+        return ids, scores
+    # Sort by id, best score first within an id, and keep the first of each run
+    order = np.lexsort((-scores, ids))
+    ids, scores = ids[order], scores[order]
+    first = np.concatenate(([True], ids[1:] != ids[:-1]))
+    return _top(ids[first], scores[first], top_k)
+
+
+def sum_fuse(ranked_ids, ranked_scores, weights, top_k=100):
+    """Weighted sum of raw scores per document; a list a document is missing from adds 0"""
+    ids = np.concatenate([np.asarray(r, dtype='int64') for r in ranked_ids])
+    contributions = np.concatenate([
+        w * np.asarray(s, dtype='float32') for s, w in zip(ranked_scores, weights)
+    ])
+    return _sum_by_id(ids, contributions, top_k)
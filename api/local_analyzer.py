@@ -0,0 +1,259 @@
+# api/local_analyzer.py
+
+import re
+import time
+import threading
+import numpy as np
+from bm25 import BM25Index, tokenize
+
+# Mirrors TEST_TYPE_MAPPING in scraper/scrape_details.py
+TEST_TYPE_MAPPING = {
+    'A': 'Ability & Aptitude',
+    'B': 'Biodata & Situational Judgment',
+    'C': 'Competencies',
+    'D': 'Development & 360',
+    'E': 'Assessment Exercises',
+    'K': 'Knowledge & Skills',
+    'P': 'Personality & Behavior',
+    'S': 'Simulations'
+}
+
+# Query phrases that point at a test type regardless of the catalog match
+TYPE_CUES = {
+    'K': ['knowledge', 'technical', 'programming', 'coding', 'developer', 'engineer', 'proficiency'],
+    'P': ['personality', 'behavior', 'behaviour', 'communication', 'leadership', 'teamwork',
+          'collaborate', 'collaboration', 'interpersonal', 'stakeholder', 'culture', 'motivation',
+          'attitude', 'people management', 'customer service'],
+    'A': ['cognitive', 'aptitude', 'reasoning', 'numerical', 'verbal', 'analytical', 'problem solving',
+          'problem-solving', 'logical', 'inductive', 'deductive', 'attention to detail', 'critical thinking'],
+    'B': ['situational', 'judgment', 'judgement', 'biodata'],
+    'C': ['competency', 'competencies'],
+    'D': ['360', 'development feedback'],
+    'E': ['exercise', 'in-tray', 'role play', 'assessment center', 'assessment centre'],
+    'S': ['simulation', 'hands-on', 'typing', 'call center', 'call centre']
+}
+
+SOFT_SKILL_CUES = set(TYPE_CUES['P'])
+
+# Tokens that appear in assessment names but are not skills
+_NAME_NOISE = frozenset("""
+entry level mid senior advanced essentials basic fundamentals professional manager managers
+solution short form focused job general skills i ii iii us uk version hiring experience team
+key business candidate potential impact services project platform assistant bank management
+administrative associate agent representative officer support staff worker workers
+""".split())
+
+# A name token found in more than this share of catalog texts is too generic to be a skill
+SKILL_MAX_DF = 0.05
+# Queries longer than this many tokens get proportionally less confidence,
+# since scattered keyword hits in a long JD say less than in a short query
+CONFIDENT_QUERY_TOKENS = 60
+
+# Cue weight vs. catalog vote when classifying test types
+CUE_WEIGHT = 1.0
+VOTE_WEIGHT = 1.0
+VOTE_DEPTH = 10
+
+
+class LocalAnalyzer:
+    """
+    LLM-free query analysis built from the assessment catalog.
+
+    * hard skills: query tokens found in a vocabulary mined from assessment
+      names (java, sql, .net, selenium, ...)
+    * soft skills: fixed behavioural cue list
+    * test types: keyword cues per TEST_TYPE_MAPPING letter plus a vote of
+      the test types of the top BM25 matches in the catalog
+
+    Returns the same shape as GroqAnalyzer plus a `confidence` in [0, 1]
+    that HybridAnalyzer uses to decide whether to ask the LLM.
+    """
+
+    model = "local/bm25-keywords"
+
+    def __init__(self, names, test_types, texts, index=None):
+        self.test_types = test_types
+        self.index = index if index is not None else BM25Index.build(texts)
+
+        max_df = max(1, int(SKILL_MAX_DF * len(texts)))
+        self.skill_vocab = set()
+        for name in names:
+            for token in tokenize(name):
+                if token in _NAME_NOISE or token.isdigit() or len(token) < 2:
+                    continue
+                term_id = self.index.vocab.get(token)
+                if term_id is None or self.index.indptr[term_id + 1] - self.index.indptr[term_id] <= max_df:
+                    self.skill_vocab.add(token)
+
+        # Single-word cues are token-set lookups; only phrases need a regex
+        self._cue_words = {letter: {c for c in cues if ' ' not in c} for letter, cues in TYPE_CUES.items()}
+        self._cue_phrases = {
+            letter: [re.compile(r'(?<![\w])' + re.escape(c) + r'(?![\w])') for c in cues if ' ' in c]
+            for letter, cues in TYPE_CUES.items()
+        }
+
+        # One row per assessment, one column per test type letter
+        self.letters = sorted(TEST_TYPE_MAPPING)
+        self.type_matrix = np.zeros((len(test_types), len(self.letters)), dtype='float32')
+        for row, types in enumerate(test_types):
+            for t in types:
+                if t in TEST_TYPE_MAPPING:
+                    self.type_matrix[row, self.letters.index(t)] = 1.0
+
+    @classmethod
+    def from_catalog(cls, store, index=None):
+        """Builds from a ColumnarStore (the deployed copy of processed_assessments.json)"""
+        n = len(store)
+        return cls(
+            names=[store.columns['name'][i] for i in range(n)],
+            test_types=[store.columns['test_type'][i].split() for i in range(n)],
+            texts=[store.columns['embedding_text'][i] for i in range(n)],
+            index=index
+        )
+
+    @classmethod
+    def from_json(cls, path):
+        import json
+        with open(path, 'r', encoding='utf-8') as f:
+            assessments = json.load(f)
+        return cls(
+            names=[a['name'] for a in assessments],
+            test_types=[a['test_type'] for a in assessments],
+            texts=[a['embedding_text'] for a in assessments]
+        )
+
+    def analyze(self, query_text):
+        text = query_text.lower()
+        tokens = tokenize(text)
+        token_set = set(tokens)
+
+        hard_skills = [t for t in dict.fromkeys(tokens) if t in self.skill_vocab]
+
+        cue_hits = {}
+        found_cues = set()
+        for letter, words in self._cue_words.items():
+            found = words & token_set
+            hits = len(found) + sum(1 for p in self._cue_phrases[letter] if p.search(text))
+            found_cues |= found
+            if hits:
+                cue_hits[letter] = hits
+        soft_skills = sorted(c for c in SOFT_SKILL_CUES if c in found_cues or (' ' in c and c in text))
+
+        type_scores = np.zeros(len(self.letters), dtype='float32')
+        for letter, hits in cue_hits.items():
+            type_scores[self.letters.index(letter)] += CUE_WEIGHT * min(hits, 3) / 3
+        if hard_skills:
+            type_scores[self.letters.index('K')] += CUE_WEIGHT
+
+        doc_ids, scores = self.index.search(query_text, top_k=VOTE_DEPTH, tokens=tokens)
+        if len(doc_ids):
+            weights = scores / scores.sum()
+            type_scores += VOTE_WEIGHT * (weights @ self.type_matrix[doc_ids])
+
+        required_test_types = []
+        if type_scores.max() > 0:
+            order = np.argsort(-type_scores)
+            cutoff = 0.5 * type_scores[order[0]]
+            required_test_types = [self.letters[i] for i in order[:3] if type_scores[i] >= cutoff]
+
+        # Evidence: distinct skill hits and cue hits; no catalog match at all means no confidence
+        evidence = len(hard_skills) + sum(cue_hits.values())
+        confidence = min(1.0, evidence / 3) if len(doc_ids) else 0.0
+        if len(tokens) > CONFIDENT_QUERY_TOKENS:
+            confidence *= CONFIDENT_QUERY_TOKENS / len(tokens)
+
+        return {
+            'hard_skills': hard_skills,
+            'soft_skills': soft_skills,
+            'required_test_types': required_test_types,
+            'confidence': round(confidence, 3)
+        }
+
+
+class FallbackAnalysis(dict):
+    """
+    Local analysis served because the LLM call failed (`error`). The
+    engine treats it as a degraded 'llm' stage, like any other analysis
+    failure.
+    """
+
+    def __init__(self, analysis, error):
+        super().__init__(analysis)
+        self.error = error
+
+
+class HybridAnalyzer:
+    """
+    Runs the LocalAnalyzer first and only calls the LLM analyzer when the
+    local confidence is below `threshold` (or when mode='llm'). Counts how
+    often each path is taken, failed LLM calls in every mode, and local
+    answers served in place of a failed LLM call ('fallbacks'). In 'llm'
+    mode a failure is re-raised; the engine serves its degraded analysis.
+    """
+
+    MODES = ['llm', 'local', 'hybrid']
+
+    def __init__(self, local, llm=None, mode='hybrid', threshold=0.5):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown analyzer mode {mode!r}, expected one of {self.MODES}")
+        if mode != 'local' and llm is None:
+            raise ValueError(f"Analyzer mode {mode!r} needs an LLM analyzer")
+        if mode != 'llm' and local is None:
+            raise ValueError(f"Analyzer mode {mode!r} needs a local analyzer")
+        self.local = local
+        self.llm = llm
+        self.mode = mode
+        self.threshold = threshold
+        self.model = f"{mode}:" + '+'.join(a.model for a in (local, llm) if a is not None)
+
+        self._lock = threading.Lock()
+        self.stats = {'local': 0, 'llm': 0, 'llm_errors': 0, 'fallbacks': 0, 'local_time_us': 0.0}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def analyze(self, query_text):
+        if self.mode == 'llm':
+            try:
+                result = self.llm.analyze(query_text)
+            except Exception:
+                self._count('llm_errors')
+                raise
+            self._count('llm')
+            return result
+
+        start = time.perf_counter()
+        result = self.local.analyze(query_text)
+        self._count('local_time_us', (time.perf_counter() - start) * 1e6)
+
+        if self.mode == 'local' or result['confidence'] >= self.threshold:
+            self._count('local')
+            return result
+
+        try:
+            llm_result = self.llm.analyze(query_text)
+        except Exception as e:
+            # The local answer beats no analysis, but the request is still degraded
+            self._count('llm_errors')
+            self._count('fallbacks')
+            return FallbackAnalysis(result, e)
+
+        self._count('llm')
+        return llm_result
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        total = stats['local'] + stats['llm'] + stats['fallbacks']
+        local_runs = total if self.mode != 'llm' else 0
+        return {
+            'mode': self.mode,
+            'threshold': self.threshold,
+            'local': stats['local'],
+            'llm': stats['llm'],
+            'llm_errors': stats['llm_errors'],
+            'fallbacks': stats['fallbacks'],
+            'local_ratio': stats['local'] / total if total else 0.0,
+            'avg_local_us': stats['local_time_us'] / local_runs if local_runs else 0.0
+        }
@@ -0,0 +1,216 @@
+# api/local_embedder.py
+
+import os
+import time
+import queue
+import threading
+import argparse
+from concurrent.futures import Future
+from telemetry import REGISTRY, COUNT_BUCKETS, get_logger, upstream
+
+log = get_logger("embedder")
+
+# Small CPU model run in-process instead of the Gemini API:
+#   EMBEDDER=local  LOCAL_EMBED_MODEL=<hub id or directory>  LOCAL_EMBED_RUNTIME=torch|onnx|onnx-int8
+LOCAL_EMBED_MODEL = os.environ.get("LOCAL_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+LOCAL_EMBED_RUNTIME = os.environ.get("LOCAL_EMBED_RUNTIME", "torch")
+# onnx-int8: dynamic-quantization target, picks the quantized file (see export_quantized)
+LOCAL_EMBED_QUANTIZATION = os.environ.get("LOCAL_EMBED_QUANTIZATION", "avx2")
+# Intra-op threads per process; keep threads x gunicorn workers <= cores
+LOCAL_EMBED_THREADS = int(os.environ.get("LOCAL_EMBED_THREADS", 2))
+# Concurrent requests are coalesced for up to MAX_WAIT_MS or MAX_BATCH texts
+LOCAL_EMBED_MAX_BATCH = int(os.environ.get("LOCAL_EMBED_MAX_BATCH", 32))
+LOCAL_EMBED_MAX_WAIT_MS = float(os.environ.get("LOCAL_EMBED_MAX_WAIT_MS", 2))
+
+RUNTIMES = ['torch', 'onnx', 'onnx-int8']
+QUANTIZED_FILES = {
+    'arm64': 'onnx/model_qint8_arm64.onnx',
+    'avx2': 'onnx/model_quint8_avx2.onnx',
+    'avx512': 'onnx/model_qint8_avx512.onnx',
+    'avx512_vnni': 'onnx/model_qint8_avx512_vnni.onnx'
+}
+
+BATCH_TEXTS = REGISTRY.histogram(
+    "shl_local_embed_batch_texts", "Texts per local model call after micro-batching", buckets=COUNT_BUCKETS)
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent encode calls into one model call. Callers submit
+    lists of texts and block on a Future; a single worker thread takes the
+    first waiting job, then keeps collecting jobs for up to `max_wait_ms`
+    or until `max_batch` texts, encodes them together and splits the rows
+    back out. One worker also means one model call at a time, so the
+    thread budget holds however many requests are in flight.
+    """
+
+    def __init__(self, encode, max_batch=LOCAL_EMBED_MAX_BATCH, max_wait_ms=LOCAL_EMBED_MAX_WAIT_MS):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_worker(self):
+        # Threads do not survive fork; a gunicorn worker starts its own
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                    threading.Thread(target=self._run, args=(self._queue,), daemon=True,
+                                     name="local-embed").start()
+                    self._pid = os.getpid()
+
+    def submit(self, texts):
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((list(texts), future))
+        return future
+
+    def __call__(self, texts):
+        return self.submit(texts).result()
+
+    def _run(self, jobs):
+        while True:
+            batch = [jobs.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = jobs.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(job)
+                size += len(job[0])
+
+            texts = [t for job_texts, _ in batch for t in job_texts]
+            BATCH_TEXTS.observe(len(texts))
+            try:
+                vectors = self.encode(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            start = 0
+            for job_texts, future in batch:
+                future.set_result(vectors[start:start + len(job_texts)])
+                start += len(job_texts)
+
+
+class LocalEmbedder:
+    """
+    Sentence-transformers model on CPU, optionally through ONNX Runtime
+    with an int8 dynamically quantized graph. The model is loaded on
+    connect() (or the first call), not at import. Vectors are
+    L2-normalized and live in their own index variant
+    (api/vector_store/variants/<model>/), built by
+    `embeddings.py --embedder local` and `faiss_index.py --variant`.
+    """
+
+    # Computed in-process in milliseconds; the EmbeddingStore would not save anything
+    cacheable = False
+
+    def __init__(self, model_name=LOCAL_EMBED_MODEL, runtime=LOCAL_EMBED_RUNTIME,
+                 quantization=LOCAL_EMBED_QUANTIZATION, threads=LOCAL_EMBED_THREADS,
+                 max_batch=LOCAL_EMBED_MAX_BATCH, max_wait_ms=LOCAL_EMBED_MAX_WAIT_MS):
+        if runtime not in RUNTIMES:
+            raise ValueError(f"Unknown local embedding runtime {runtime!r}, expected one of {RUNTIMES}")
+        if runtime == 'onnx-int8' and quantization not in QUANTIZED_FILES:
+            raise ValueError(f"Unknown quantization {quantization!r}, expected one of {list(QUANTIZED_FILES)}")
+
+        self.model_name = model_name
+        self.runtime = runtime
+        self.quantization = quantization
+        self.threads = threads
+
+        suffix = {'torch': '', 'onnx': '@onnx', 'onnx-int8': f"@onnx-int8-{quantization}"}[runtime]
+        self.model = f"local/{os.path.basename(model_name.rstrip('/'))}{suffix}"
+        # Directory under vector_store/variants/ holding this model's index
+        self.index_variant = self.model.replace('/', '_').replace(':', '_')
+
+        self.dim = None
+        self._model = None
+        self._load_lock = threading.Lock()
+        self.batcher = MicroBatcher(self._encode, max_batch, max_wait_ms)
+
+    def connect(self):
+        """Loads the model and runs one encode so the first request pays nothing"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    model = load_model(self.model_name, self.runtime, self.quantization, self.threads)
+                    model.encode(["warm up"], normalize_embeddings=True)
+                    self.dim = model.get_sentence_embedding_dimension()
+                    self._model = model
+                    log.info("✅ Loaded %s (%d dims) in %.2fs", self.model, self.dim, time.perf_counter() - start)
+        return self._model
+
+    def _encode(self, texts):
+        return self.connect().encode(
+            texts, batch_size=LOCAL_EMBED_MAX_BATCH, normalize_embeddings=True,
+            convert_to_numpy=True, show_progress_bar=False
+        ).astype('float32')
+
+    def embed(self, text):
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts):
+        with upstream('local_embed'):
+            return list(self.batcher(texts))
+
+
+def load_model(model_name, runtime, quantization=LOCAL_EMBED_QUANTIZATION, threads=LOCAL_EMBED_THREADS):
+    """SentenceTransformer on CPU for `runtime`, limited to `threads` intra-op threads"""
+    from sentence_transformers import SentenceTransformer
+
+    if runtime == 'torch':
+        import torch
+        torch.set_num_threads(threads)
+        return SentenceTransformer(model_name, device='cpu')
+
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    model_kwargs = {'provider': 'CPUExecutionProvider', 'session_options': options}
+    if runtime == 'onnx-int8':
+        model_kwargs['file_name'] = QUANTIZED_FILES[quantization]
+    try:
+        return SentenceTransformer(model_name, device='cpu', backend='onnx', model_kwargs=model_kwargs)
+    except (OSError, FileNotFoundError) as e:
+        if runtime != 'onnx-int8':
+            raise
+        raise FileNotFoundError(
+            f"{model_name} has no {QUANTIZED_FILES[quantization]}; create it with "
+            f"`python local_embedder.py --export DIR --quantization {quantization}` "
+            f"and set LOCAL_EMBED_MODEL=DIR"
+        ) from e
+
+
+def export_quantized(model_name, out_dir, quantization=LOCAL_EMBED_QUANTIZATION):
+    """
+    Saves `model_name` to `out_dir` with an ONNX graph plus an int8
+    dynamically quantized copy (onnx/model_*int8_<quantization>.onnx)
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    model = SentenceTransformer(model_name, device='cpu', backend='onnx')
+    model.save(out_dir)
+    export_dynamic_quantized_onnx_model(model, quantization, out_dir)
+    print(f"✅ Exported {model_name} to {out_dir} ({QUANTIZED_FILES[quantization]})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the local embedding model to int8 ONNX")
+    parser.add_argument('--model', default=LOCAL_EMBED_MODEL)
+    parser.add_argument('--export', required=True, metavar='DIR', help="directory to save the model to")
+    parser.add_argument('--quantization', default=LOCAL_EMBED_QUANTIZATION, choices=list(QUANTIZED_FILES))
+    args = parser.parse_args()
+
+    export_quantized(args.model, args.export, args.quantization)
@@ -0,0 +1,288 @@
+# api/providers.py
+
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import numpy as np
+from telemetry import upstream
+from upstream import UpstreamClient, UpstreamError
+
+# Backends are picked by name so benchmarks and tests can run fully offline:
+#   QUERY_ANALYZER=groq|fake   EMBEDDER=gemini|local|fake
+ANALYZER_BACKEND = os.environ.get("QUERY_ANALYZER", "groq")
+EMBEDDER_BACKEND = os.environ.get("EMBEDDER", "gemini")
+# llm: always ask the LLM; local: catalog keyword analyzer only;
+# hybrid: local first, LLM only below ANALYZER_CONFIDENCE
+ANALYZER_MODE = os.environ.get("ANALYZER_MODE", "llm")
+ANALYZER_CONFIDENCE = float(os.environ.get("ANALYZER_CONFIDENCE", 0.5))
+
+GEMINI_EMBEDDING_MODEL = 'models/text-embedding-004'
+EMBEDDING_DIM = 768
+
+
+# ---------- hosted backends ----------
+
+class GroqAnalyzer:
+    """
+    Query analysis via Groq Llama 3.1, over Groq's OpenAI-compatible REST
+    API through a pooled UpstreamClient (deadline, retries, hedging,
+    circuit breaker). GROQ_BASE_URL points it at a stub server.
+    """
+
+    model = "llama-3.1-8b-instant"
+
+    def __init__(self, api_key=None, base_url=None, timeout=None):
+        self.api_key = api_key or os.environ.get("GROQ_API_KEY")
+        self.http = UpstreamClient(
+            'groq', base_url or os.environ.get("GROQ_BASE_URL", "https://api.groq.com"),
+            timeout=timeout or float(os.environ.get("LLM_TIMEOUT", 15))
+        )
+
+    def connect(self):
+        self.http.connect()
+
+    def analyze(self, query_text):
+        if not self.api_key:
+            raise UpstreamError("GROQ_API_KEY is not set")
+
+        prompt = f"""Analyze this job query and extract:
+1. Hard skills (Java, Python, SQL, etc.)
+2. Soft skills (leadership, communication, etc.)
+3. Required test types: K (Knowledge), P (Personality), A (Ability)
+
+Query: {query_text}
+
+Respond ONLY in JSON format:
+{{"hard_skills": ["skill1"], "soft_skills": ["skill2"], "required_test_types": ["K", "P"]}}"""
+
+        response = self.http.post_json(
+            '/openai/v1/chat/completions',
+            {
+                'model': self.model,
+                'messages': [{'role': 'user', 'content': prompt}],
+                'temperature': 0.1
+            },
+            headers={'Authorization': f"Bearer {self.api_key}"}
+        )
+
+        text = response['choices'][0]['message']['content']
+
+        json_match = re.search(r'```json\n(.*?)\n```', text, re.DOTALL)
+        if json_match:
+            text = json_match.group(1)
+
+        text = text.strip()
+        result = json.loads(text)
+        return result
+
+
+class GeminiEmbedder:
+    """
+    Query embeddings via Gemini text-embedding-004 (batchEmbedContents
+    REST call through a pooled UpstreamClient). GEMINI_BASE_URL points it
+    at a stub server.
+    """
+
+    model = GEMINI_EMBEDDING_MODEL
+    # Vectors are stable for a given text, so they go through the EmbeddingStore
+    cacheable = True
+
+    def __init__(self, api_key=None, base_url=None, timeout=None):
+        self.api_key = api_key or os.environ.get("GEMINI_API_KEY")
+        self.http = UpstreamClient(
+            'gemini', base_url or os.environ.get("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com"),
+            timeout=timeout or float(os.environ.get("EMBED_TIMEOUT", 10))
+        )
+
+    def connect(self):
+        self.http.connect()
+
+    def embed(self, text):
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts):
+        if not self.api_key:
+            raise UpstreamError("GEMINI_API_KEY is not set")
+
+        response = self.http.post_json(
+            f"/v1beta/{self.model}:batchEmbedContents",
+            {'requests': [{'model': self.model, 'content': {'parts': [{'text': t}]}} for t in texts]},
+            headers={'x-goog-api-key': self.api_key}
+        )
+        embeddings = response['embeddings']
+        if len(embeddings) != len(texts):
+            raise UpstreamError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        return [np.array(e['values'], dtype='float32') for e in embeddings]
+
+
+# ---------- offline deterministic backends ----------
+
+class _SimulatedLatency:
+    """Sleeps latency_ms +/- jitter_ms per call, reproducibly for a given seed"""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rng = random.Random(seed)
+
+    def wait(self):
+        delay = self.latency_ms
+        if self.jitter_ms:
+            delay += self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+
+class FakeAnalyzer:
+    """
+    Rule-based stand-in for GroqAnalyzer: keyword lists for hard and soft
+    skills, and test types inferred from what was found. Same output shape.
+    """
+
+    model = "fake/rule-based"
+
+    HARD_SKILLS = [
+        'java', 'python', 'sql', 'javascript', 'typescript', '.net', 'c#', 'c++', 'html', 'css',
+        'react', 'angular', 'node', 'selenium', 'excel', 'tableau', 'power bi', 'aws', 'azure',
+        'linux', 'unix', 'spring', 'hibernate', 'data science', 'machine learning', 'accounting',
+        'seo', 'marketing', 'sales', 'salesforce', 'sap', 'automation', 'testing', 'drupal'
+    ]
+    SOFT_SKILLS = [
+        'communication', 'leadership', 'collaboration', 'collaborate', 'teamwork', 'stakeholder',
+        'interpersonal', 'customer service', 'negotiation', 'presentation', 'management',
+        'personality', 'culture', 'motivation', 'adaptability', 'empathy'
+    ]
+    ABILITY_TERMS = [
+        'cognitive', 'aptitude', 'reasoning', 'numerical', 'verbal', 'analytical', 'problem solving',
+        'problem-solving', 'logical', 'inductive', 'deductive', 'attention to detail'
+    ]
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, seed=0):
+        self.latency = _SimulatedLatency(latency_ms, jitter_ms, seed)
+        self._patterns = {
+            term: re.compile(r'(?<![\w.#+])' + re.escape(term) + r'(?![\w#+])')
+            for term in self.HARD_SKILLS + self.SOFT_SKILLS + self.ABILITY_TERMS
+        }
+
+    def _found(self, terms, text):
+        return [t for t in terms if self._patterns[t].search(text)]
+
+    def analyze(self, query_text):
+        with upstream('fake_llm'):
+            self.latency.wait()
+        text = query_text.lower()
+
+        hard_skills = self._found(self.HARD_SKILLS, text)
+        soft_skills = self._found(self.SOFT_SKILLS, text)
+        ability = self._found(self.ABILITY_TERMS, text)
+
+        required_test_types = []
+        if hard_skills:
+            required_test_types.append('K')
+        if soft_skills:
+            required_test_types.append('P')
+        if ability:
+            required_test_types.append('A')
+
+        return {
+            'hard_skills': hard_skills,
+            'soft_skills': soft_skills,
+            'required_test_types': required_test_types or ['K']
+        }
+
+
+class FakeEmbedder:
+    """
+    Deterministic embeddings: word unigrams and character trigrams are
+    feature-hashed (sha1, so stable across processes) into `dim` signed
+    buckets and L2-normalized. Similar texts get similar vectors.
+    """
+
+    model = f"fake/hashed-ngram-{EMBEDDING_DIM}"
+    # Cheap to recompute; keep fake vectors out of the shared on-disk cache
+    cacheable = False
+
+    def __init__(self, dim=EMBEDDING_DIM, latency_ms=0.0, jitter_ms=0.0, seed=0):
+        self.dim = dim
+        self.latency = _SimulatedLatency(latency_ms, jitter_ms, seed)
+        self._buckets = {}
+
+    def _bucket(self, feature):
+        bucket = self._buckets.get(feature)
+        if bucket is None:
+            digest = hashlib.sha1(feature.encode('utf-8')).digest()
+            index = int.from_bytes(digest[:4], 'little') % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            bucket = (index, sign)
+            if len(self._buckets) < 200000:
+                self._buckets[feature] = bucket
+        return bucket
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype='float32')
+        text = ' '.join(text.lower().split())
+        features = text.split()
+        padded = f" {text} "
+        features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+        for feature in features:
+            index, sign = self._bucket(feature)
+            vector[index] += sign
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed(self, text):
+        with upstream('fake_embed'):
+            self.latency.wait()
+        return self._vector(text)
+
+    def embed_many(self, texts):
+        # One simulated round-trip per batch, like a multi-text API call
+        with upstream('fake_embed'):
+            self.latency.wait()
+        return [self._vector(t) for t in texts]
+
+
+# ---------- factory ----------
+
+def get_llm_analyzer(name=None):
+    name = name or ANALYZER_BACKEND
+    if name == 'groq':
+        return GroqAnalyzer()
+    if name == 'fake':
+        return FakeAnalyzer(
+            latency_ms=float(os.environ.get("FAKE_LLM_LATENCY_MS", 0)),
+            jitter_ms=float(os.environ.get("FAKE_LLM_JITTER_MS", 0))
+        )
+    raise ValueError(f"Unknown query analyzer backend {name!r}")
+
+
+def get_analyzer(name=None, mode=None, store=None, bm25=None):
+    """
+    LLM backend `name` wrapped in a HybridAnalyzer running in `mode`.
+    `store` (a ColumnarStore) is needed to build the local analyzer; pass
+    the engine's BM25Index as `bm25` to share it instead of rebuilding.
+    """
+    from local_analyzer import LocalAnalyzer, HybridAnalyzer
+
+    mode = mode or ANALYZER_MODE
+    local = LocalAnalyzer.from_catalog(store, index=bm25) if mode != 'llm' else None
+    llm = get_llm_analyzer(name) if mode != 'local' else None
+    return HybridAnalyzer(local, llm, mode=mode, threshold=ANALYZER_CONFIDENCE)
+
+
+def get_embedder(name=None):
+    name = name or EMBEDDER_BACKEND
+    if name == 'gemini':
+        return GeminiEmbedder()
+    if name == 'local':
+        from local_embedder import LocalEmbedder
+        return LocalEmbedder()
+    if name == 'fake':
+        return FakeEmbedder(
+            latency_ms=float(os.environ.get("FAKE_EMBED_LATENCY_MS", 0)),
+            jitter_ms=float(os.environ.get("FAKE_EMBED_JITTER_MS", 0))
+        )
+    raise ValueError(f"Unknown embedder backend {name!r}")
@@ -0,0 +1,374 @@
+# api/query_cache.py
+
+import os
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict
+from itertools import islice
+import numpy as np
+import faiss
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(query_text):
+    """
+    Canonical cache key text - case and whitespace differences
+    between otherwise identical job descriptions are ignored
+    """
+    return _WHITESPACE.sub(' ', query_text).strip().lower()
+
+
+class QueryCache:
+    """
+    Two-tier cache for retrieve() results.
+
+    Tier 1 is an in-process LRU with per-entry TTL. Tier 2 is an optional
+    SQLite file that survives restarts. Every entry is tagged with the
+    vector store `namespace` (a fingerprint of the index files), so a
+    rebuilt index never serves results computed against the old one.
+
+    Concurrent misses for the same key are collapsed into a single
+    upstream call (singleflight), for both threaded and asyncio callers.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, db_path=None, namespace=''):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.namespace = namespace
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_async = {}
+
+        self.stats = {
+            'hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'coalesced': 0
+        }
+
+        self._db = None
+        if db_path:
+            self._open_db()
+
+    # ---------- disk tier ----------
+
+    def _open_db(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS query_cache ("
+            "key TEXT PRIMARY KEY, namespace TEXT, value TEXT, expires_at REAL)"
+        )
+        # Drop anything computed against a previous vector store
+        self._db.execute("DELETE FROM query_cache WHERE namespace != ?", (self.namespace,))
+        self._db.execute("DELETE FROM query_cache WHERE expires_at < ?", (time.time(),))
+        self._db.commit()
+
+    def _disk_get(self, key):
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT value, expires_at FROM query_cache WHERE key = ? AND namespace = ?",
+            (key, self.namespace)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < time.time():
+            self._db.execute("DELETE FROM query_cache WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _disk_put(self, key, value, expires_at):
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO query_cache (key, namespace, value, expires_at) VALUES (?, ?, ?, ?)",
+            (key, self.namespace, json.dumps(value), expires_at)
+        )
+        self._db.commit()
+
+    def reopen(self):
+        """
+        Fresh SQLite connection for a forked worker; a connection must not
+        be used on both sides of fork(). The parent's handle is left open.
+        """
+        if self.db_path:
+            self._db = None
+            self._open_db()
+
+    # ---------- lookup ----------
+
+    def make_key(self, query_text, top_k, filters=None):
+        key = f"{top_k}:{normalize_query(query_text)}"
+        if filters:
+            key += '|' + json.dumps(filters, sort_keys=True)
+        return key
+
+    def get(self, key):
+        """Returns the cached value or None, promoting disk hits into memory"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return value
+                del self._entries[key]
+                self.stats['expirations'] += 1
+
+            disk_entry = self._disk_get(key)
+            if disk_entry is not None:
+                value, expires_at = disk_entry
+                self._store(key, value, expires_at)
+                self.stats['disk_hits'] += 1
+                return value
+
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key, value):
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store(key, value, expires_at)
+            self._disk_put(key, value, expires_at)
+
+    def _store(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    # ---------- singleflight ----------
+
+    def get_or_compute(self, key, compute, cacheable=None):
+        """
+        Threaded callers: only one thread runs compute() per missing key.
+        A value failing `cacheable(value)` is returned (also to coalesced
+        callers) but not stored.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = {'event': threading.Event(), 'value': None, 'error': None}
+                self._inflight[key] = flight
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            flight['event'].wait()
+            if flight['error'] is not None:
+                raise flight['error']
+            return flight['value']
+
+        try:
+            value = compute()
+            if cacheable is None or cacheable(value):
+                self.put(key, value)
+            flight['value'] = value
+            return value
+        except Exception as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight['event'].set()
+
+    async def get_or_compute_async(self, key, compute, cacheable=None):
+        """Asyncio callers: concurrent requests for one key await the same future"""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        future = self._inflight_async.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The leader was cancelled, not us - take over the call
+                if not future.cancelled():
+                    raise
+                return await self.get_or_compute_async(key, compute, cacheable)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight_async[key] = future
+        try:
+            value = await compute()
+            if cacheable is None or cacheable(value):
+                self.put(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure is not logged as lost
+            future.exception()
+            raise
+        finally:
+            self._inflight_async.pop(key, None)
+
+    # ---------- maintenance ----------
+
+    def invalidate(self, namespace=None):
+        """
+        Clears both tiers. Pass the new vector store fingerprint when the
+        index under api/vector_store/ has been rebuilt.
+        """
+        with self._lock:
+            self._entries.clear()
+            if namespace is not None:
+                self.namespace = namespace
+            if self._db is not None:
+                self._db.execute("DELETE FROM query_cache")
+                self._db.commit()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+class SemanticCache:
+    """
+    Approximate result cache for near-duplicate queries: a changed company
+    name, reordered bullet points or extra whitespace in an otherwise
+    identical job description.
+
+    Past query embeddings (L2-normalized) live in a small flat
+    inner-product FAISS index. A lookup returns the value of the nearest
+    entry with the same `scope` (index version, top_k and filters) if its
+    cosine similarity is at least `threshold`. LRU eviction at
+    `max_entries`, per-entry TTL.
+
+    Every lookup also records the similarity of the nearest same-scope
+    entry, so threshold_curve() reports the hit rate each of
+    CURVE_THRESHOLDS would have had on the same traffic.
+    """
+
+    CURVE_THRESHOLDS = (0.8, 0.85, 0.9, 0.92, 0.94, 0.95, 0.96, 0.97, 0.98, 0.99)
+
+    def __init__(self, threshold=0.95, max_entries=1024, ttl_seconds=3600, probe=8):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # Nearest neighbours checked for one with a matching scope
+        self.probe = probe
+
+        self._index = None  # created on the first put, when the dimension is known
+        self._entries = OrderedDict()  # id -> (scope, value, expires_at)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+        self._curve = dict.fromkeys(self.CURVE_THRESHOLDS, 0)
+        self._lookups = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.array(embedding, dtype='float32').reshape(1, -1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, ids):
+        for entry_id in ids:
+            del self._entries[entry_id]
+        self._index.remove_ids(np.asarray(ids, dtype='int64'))
+
+    def get(self, embedding, scope):
+        """The cached value of the nearest same-scope entry within threshold, else None"""
+        vector = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            nearest = None
+            if self._entries and self._index.d == vector.shape[1]:
+                similarities, ids = self._index.search(vector, min(self.probe, len(self._entries)))
+                expired = []
+                for similarity, entry_id in zip(similarities[0], ids[0]):
+                    entry = self._entries.get(int(entry_id))
+                    if entry is None or entry[0] != scope:
+                        continue
+                    if entry[2] < now:
+                        expired.append(int(entry_id))
+                        continue
+                    nearest = (float(similarity), int(entry_id))
+                    break
+                if expired:
+                    self._remove(expired)
+                    self.stats['expirations'] += len(expired)
+
+            self._lookups += 1
+            if nearest is not None:
+                for t in self.CURVE_THRESHOLDS:
+                    if nearest[0] >= t:
+                        self._curve[t] += 1
+
+            if nearest is not None and nearest[0] >= self.threshold:
+                self._entries.move_to_end(nearest[1])
+                self.stats['hits'] += 1
+                return self._entries[nearest[1]][1]
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, embedding, scope, value):
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._index is None or self._index.d != vector.shape[1]:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+                self._entries.clear()
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype='int64'))
+            self._entries[entry_id] = (scope, value, time.time() + self.ttl_seconds)
+
+            if len(self._entries) > self.max_entries:
+                evicted = list(islice(self._entries, len(self._entries) - self.max_entries))
+                self._remove(evicted)
+                self.stats['evictions'] += len(evicted)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._index = None
+
+    def threshold_curve(self):
+        """{threshold: hit rate that threshold would have had over all lookups so far}"""
+        with self._lock:
+            lookups = self._lookups
+            curve = dict(self._curve)
+        return {t: (count / lookups if lookups else 0.0) for t, count in curve.items()}
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['threshold'] = self.threshold
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['threshold_curve'] = {str(t): round(r, 4) for t, r in self.threshold_curve().items()}
+        return stats
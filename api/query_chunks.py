@@ -0,0 +1,61 @@
+# api/query_chunks.py
+
+import re
+import numpy as np
+
+# Sentence ends followed by what looks like the start of the next sentence
+_SENTENCE_END = re.compile(r'(?<=[.!?;])\s+(?=["(\[]?[A-Z0-9])')
+_BULLET = re.compile(r'^(?:[-*•●▪◦➢►]+|\d{1,2}[.)])\s*')
+
+
+def split_query(text, chunk_chars=300, max_chunks=16):
+    """
+    Splits a long query (a pasted job description) into chunks of about
+    `chunk_chars`. Lines - sections, bullet points - are the units, long
+    lines are cut at sentence ends, and units are packed greedily in order,
+    so short headings travel with the text under them. The target size
+    grows when needed to stay within `max_chunks`.
+    """
+    pieces = []
+    for line in text.splitlines():
+        line = _BULLET.sub('', ' '.join(line.split()))
+        if not line:
+            continue
+        pieces.extend(_SENTENCE_END.split(line) if len(line) > chunk_chars else [line])
+
+    total = sum(len(p) + 1 for p in pieces)
+    chunk_chars = max(chunk_chars, -(-total // max_chunks))
+
+    chunks = []
+    current = ''
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > chunk_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+
+    # Greedy packing can overshoot by a chunk or two; fold the tail together
+    if len(chunks) > max_chunks:
+        chunks[max_chunks - 1:] = [' '.join(chunks[max_chunks - 1:])]
+    return chunks
+
+
+def chunk_weights(chunks):
+    """Share of the text in each chunk, for the weighted-sum aggregation"""
+    lengths = np.array([len(c) for c in chunks], dtype='float32')
+    return lengths / lengths.sum()
+
+
+def head_chunks(chunks, max_chars):
+    """Leading chunks that fit in `max_chars` (at least one), space-joined"""
+    kept = chunks[:1]
+    size = len(kept[0]) if kept else 0
+    for chunk in chunks[1:]:
+        size += 1 + len(chunk)
+        if size > max_chars:
+            break
+        kept.append(chunk)
+    return ' '.join(kept)
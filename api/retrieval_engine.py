@@ -1,172 +1,873 @@
-# api/retrieval_engine.py - REVERT TO THIS (original without BM25)
+# api/retrieval_engine.py - query analysis, hybrid BM25 + dense retrieval and test-type balancing
 
 import os
-import pickle
-import faiss
-import numpy as np
-from google import genai
-import re
 import json
-from groq import Groq
+import time
+import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from query_cache import QueryCache, SemanticCache
+from embedding_store import EmbeddingStore
+from providers import get_analyzer, get_embedder
+from local_analyzer import FallbackAnalysis
+from hybrid_search import rrf_fuse, weighted_fuse, max_fuse, sum_fuse
+from query_chunks import split_query, chunk_weights, head_chunks
+from field_index import parse_field_weights
+from cascade import CascadeStats, expansion_reason, get_reranker, rerank
+from vector_snapshot import VectorStoreSnapshot, current_version, variant_dir
+from telemetry import get_logger, span, trace, CANDIDATES, REGISTRY
+
+log = get_logger("retrieval")
+
+DEGRADED = REGISTRY.counter(
+    "shl_degraded_total", "Requests served with a fallback because an upstream stage failed", labels=("stage",))
+
+# Stand-in when query analysis is unavailable: no required types, so no balancing
+DEGRADED_ANALYSIS = {'hard_skills': [], 'soft_skills': [], 'required_test_types': []}
+
+
+class DegradedResults(list):
+    """
+    Recommendations produced without one of the upstream stages
+    (`degraded` lists which: 'llm', 'embed'). Never cached.
+    """
+
+    def __init__(self, recommendations, degraded):
+        super().__init__(recommendations)
+        self.degraded = degraded
+
+
+def _complete(results):
+    return not isinstance(results, DegradedResults)
+
+
+def _l2_similarities(snapshot, ids, query_embedding):
+    """
+    1 / (1 + squared L2 distance) between the query and the catalog
+    vectors of `ids`, whatever the index metric or fusion; the closest
+    chunk counts for a long query
+    """
+    if query_embedding is None:
+        return [None] * len(ids)
+    vectors = np.asarray(snapshot.store.vectors[np.asarray(ids, dtype='int64')], dtype='float32')
+    rows = np.atleast_2d(np.asarray(query_embedding, dtype='float32'))
+    distances = ((vectors[:, None, :] - rows[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+    return [float(s) for s in 1 / (1 + distances)]
+
+
+def _query_vector(query_embedding):
+    """A long query's chunk matrix is represented by its mean (semantic cache key)"""
+    return query_embedding.mean(axis=0) if query_embedding.ndim == 2 else query_embedding
 
-groq_client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-gemini_client = genai.Client(
-    api_key=os.environ.get("GEMINI_API_KEY")
-)
 
 class RetrievalEngine:
-    def __init__(self):
+    # Per-call upstream deadlines (seconds) used by retrieve_async
+    LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 15))
+    EMBED_TIMEOUT = float(os.environ.get("EMBED_TIMEOUT", 10))
+
+    # retrieve_batch: texts per embed_content call and concurrent LLM analyses
+    EMBED_BATCH_SIZE = 100
+    BATCH_ANALYSIS_WORKERS = int(os.environ.get("BATCH_ANALYSIS_WORKERS", 8))
+
+    # Candidate generation: 'dense' (FAISS only) or 'hybrid' (FAISS + BM25 fused).
+    # Fusion recovers exact skill-name matches, so the dense pool can be smaller.
+    RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")
+    FUSION = os.environ.get("FUSION", "rrf")  # rrf | weighted
+    DENSE_CANDIDATES = int(os.environ.get("DENSE_CANDIDATES", 100 if RETRIEVAL_MODE == "dense" else 50))
+    LEXICAL_CANDIDATES = int(os.environ.get("LEXICAL_CANDIDATES", 50))
+    LEXICAL_WEIGHT = float(os.environ.get("LEXICAL_WEIGHT", 1.0))
+    CANDIDATE_POOL = 100
+
+    # On an upstream failure serve degraded results (no balancing without the
+    # analysis, BM25-only candidates without the embedding) instead of an error
+    UPSTREAM_FALLBACK = os.environ.get("UPSTREAM_FALLBACK", "1") == "1"
+
+    # Cascade: the first stage starts at CASCADE_DEPTHS[0] candidates and only goes
+    # deeper while balancing could not meet the required test types from the pool or
+    # the dense scores are flat at the cut-off. CASCADE_SHADOW_RATE of the queries
+    # also run the fixed CANDIDATE_POOL depth to measure the saving (/cascade/stats).
+    CASCADE = os.environ.get("CASCADE", "0") == "1"
+    CASCADE_DEPTHS = [int(d) for d in os.environ.get("CASCADE_DEPTHS", "20,50,100").split(',')]
+    CASCADE_FLAT_GAP = float(os.environ.get("CASCADE_FLAT_GAP", 0.02))
+    CASCADE_SHADOW_RATE = float(os.environ.get("CASCADE_SHADOW_RATE", 0.02))
+    # Optional local rerank of the best RERANK_DEPTH survivors within RERANK_BUDGET_MS
+    RERANKER = os.environ.get("RERANKER", "none")  # none | features | cross-encoder
+    RERANK_DEPTH = int(os.environ.get("RERANK_DEPTH", 30))
+    RERANK_BUDGET_MS = float(os.environ.get("RERANK_BUDGET_MS", 25))
+
+    # Dense candidates from the single-vector FAISS index, or from the per-field
+    # vectors (name / description / job levels) scored by late interaction with
+    # FIELD_WEIGHTS, e.g. "name=0.3,description=0.5,job_levels=0.2"
+    DENSE_INDEX = os.environ.get("DENSE_INDEX", "single")  # single | fields
+    FIELD_WEIGHTS = parse_field_weights(os.environ.get("FIELD_WEIGHTS"))
+
+    # Long queries (pasted job descriptions) are split into chunks that are embedded
+    # in one batched call and searched as one multi-row query; each assessment
+    # keeps its best chunk score ('max') or a length-weighted sum ('sum')
+    LONG_QUERY_CHARS = int(os.environ.get("LONG_QUERY_CHARS", 600))  # 0 = never chunk
+    CHUNK_CHARS = int(os.environ.get("CHUNK_CHARS", 300))
+    MAX_CHUNKS = int(os.environ.get("MAX_CHUNKS", 16))
+    CHUNK_AGGREGATION = os.environ.get("CHUNK_AGGREGATION", "max")  # max | sum
+    # Leading chunks of a long query sent to the analyzer (0 = the whole text)
+    LONG_QUERY_ANALYSIS_CHARS = int(os.environ.get("LONG_QUERY_ANALYSIS_CHARS", 2000))
+
+    # Near-duplicate queries (cosine >= threshold to a cached query embedding)
+    # reuse its results without the LLM call or the search. Approximate, so
+    # off by default; 'shadow' only records lookups for threshold_curve()
+    SEMANTIC_CACHE = os.environ.get("SEMANTIC_CACHE", "0")  # 0 | shadow | 1
+    SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.95))
+
+    # Seconds between checks of api/vector_store/CURRENT for a new snapshot (0 = never)
+    RELOAD_INTERVAL = float(os.environ.get("VECTOR_STORE_RELOAD_INTERVAL", 5))
+
+    def __init__(self, analyzer=None, embedder=None):
         # Get absolute path of this file
         BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-        # Correct vector store path (inside api/)
-        vector_store_dir = os.path.join(BASE_DIR, 'vector_store')
-        index_path = os.path.join(vector_store_dir, 'faiss_index.bin')
-        metadata_path = os.path.join(vector_store_dir, 'metadata.pkl')
-
-        # Load FAISS index
-        if not os.path.exists(index_path):
-            raise FileNotFoundError(f"FAISS index not found at {index_path}")
-        self.index = faiss.read_index(index_path)
+        # Upstream embedder (EMBEDDER env, or a fake for offline runs); it picks the index variant
+        self.embedder = embedder or get_embedder()
 
-        # Load metadata
-        if not os.path.exists(metadata_path):
-            raise FileNotFoundError(f"Metadata file not found at {metadata_path}")
-        with open(metadata_path, 'rb') as f:
-            self.metadata = pickle.load(f)
+        # Correct vector store path (inside api/ unless VECTOR_STORE_DIR says otherwise). Embedders
+        # other than the default one search their own variant under vector_store/variants/
+        self.vector_store_dir = os.environ.get("VECTOR_STORE_DIR") or variant_dir(
+            os.path.join(BASE_DIR, 'vector_store'), getattr(self.embedder, 'index_variant', None)
+        )
+        self.verify_store = os.environ.get("VECTOR_STORE_VERIFY") == "1"
 
-        print(f"✅ Loaded {len(self.metadata)} assessments from {vector_store_dir}")
+        # Index, catalog and derived arrays of the live build; replaced as a
+        # whole by reload() while in-flight requests keep the one they started with
+        self.snapshot = VectorStoreSnapshot.load_current(self.vector_store_dir, verify=self.verify_store)
+        self._reload_lock = threading.Lock()
+        self._reload_thread = None
+        self._next_reload_check = time.monotonic() + self.RELOAD_INTERVAL
 
-    
-    def analyze_query_with_llm(self, query_text):
-        prompt = f"""Analyze this job query and extract:
-1. Hard skills (Java, Python, SQL, etc.)
-2. Soft skills (leadership, communication, etc.)
-3. Required test types: K (Knowledge), P (Personality), A (Ability)
+        log.info("✅ Loaded %d assessments from %s (%s/%s index)", len(self.snapshot),
+                 self.snapshot.directory, self.snapshot.index_info['index_type'], self.snapshot.metric)
+        index_model = self.snapshot.index_info.get('model')
+        if index_model and index_model != self.embedder.model and not self.embedder.model.startswith('fake/'):
+            log.warning("⚠ Index was built with %s but queries are embedded with %s", index_model, self.embedder.model)
+        if self.DENSE_INDEX == 'fields' and self.snapshot.field_index is None:
+            log.warning("⚠ DENSE_INDEX=fields but %s has no field index (faiss_index.py --fields); "
+                        "using the single-vector index", self.snapshot.directory)
 
-Query: {query_text}
+        # Result cache in front of retrieve(); entries are scoped to this index build
+        self.cache = QueryCache(
+            max_entries=int(os.environ.get("QUERY_CACHE_SIZE", 1024)),
+            ttl_seconds=float(os.environ.get("QUERY_CACHE_TTL", 3600)),
+            db_path=os.environ.get("QUERY_CACHE_DB") or None,
+            namespace=self.vector_store_fingerprint()
+        )
+        self.semantic_cache = SemanticCache(
+            threshold=self.SEMANTIC_CACHE_THRESHOLD,
+            max_entries=int(os.environ.get("SEMANTIC_CACHE_SIZE", 1024)),
+            ttl_seconds=float(os.environ.get("QUERY_CACHE_TTL", 3600))
+        )
 
-Respond ONLY in JSON format:
-{{"hard_skills": ["skill1"], "soft_skills": ["skill2"], "required_test_types": ["K", "P"]}}"""
+        # Second stage over the first-stage survivors, and depth / rerank counters
+        self.reranker = get_reranker(self.RERANKER)
+        self.cascade_stats = CascadeStats()
 
-        response = groq_client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1
+        # Content-addressed embeddings written by the offline build (read-only
+        # here); new query vectors go to a bounded in-memory LRU instead, so
+        # the request path never appends and fsyncs the store
+        self.embedding_store = EmbeddingStore()
+        self.embedding_cache = QueryCache(
+            max_entries=int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", 4096)),
+            ttl_seconds=float('inf')
         )
-        
-        text = response.choices[0].message.content
-        
-        json_match = re.search(r'```json\n(.*?)\n```', text, re.DOTALL)
-        if json_match:
-            text = json_match.group(1)
-        
-        text = text.strip()
-        result = json.loads(text)
-        return result
+
+        # Upstream analyzer (QUERY_ANALYZER env, or a fake for offline runs)
+        self.analyzer = analyzer or get_analyzer(store=self.snapshot.store, bm25=self.snapshot.bm25)
+
+        REGISTRY.callback("shl_query_cache_lookups_total", "Result cache lookups by outcome",
+                          self._cache_lookups, type='counter', labels=("result",))
+        REGISTRY.callback("shl_query_cache_hit_ratio", "Result cache hits / lookups since start",
+                          lambda: self.cache.get_stats()['hit_rate'])
+        REGISTRY.callback("shl_query_cache_entries", "Entries in the in-memory result cache",
+                          lambda: self.cache.get_stats()['entries'])
+        REGISTRY.callback("shl_semantic_cache_lookups_total", "Near-duplicate cache lookups by outcome",
+                          self._semantic_lookups, type='counter', labels=("result",))
+        REGISTRY.callback("shl_semantic_cache_hit_ratio",
+                          "Hit rate each similarity threshold would have had on the lookups so far",
+                          lambda: {(str(t),): r for t, r in self.semantic_cache.threshold_curve().items()},
+                          labels=("threshold",))
+
+    # Live-snapshot shortcuts, for callers outside the request path
+    index = property(lambda self: self.snapshot.index)
+    index_info = property(lambda self: self.snapshot.index_info)
+    metric = property(lambda self: self.snapshot.metric)
+    store = property(lambda self: self.snapshot.store)
+    metadata = property(lambda self: self.snapshot.metadata)
+    bm25 = property(lambda self: self.snapshot.bm25)
+    attributes = property(lambda self: self.snapshot.attributes)
+    type_masks = property(lambda self: self.snapshot.type_masks)
+    url_ids = property(lambda self: self.snapshot.url_ids)
+
+    def _cache_lookups(self):
+        stats = self.cache.get_stats()
+        return {('hit',): stats['hits'], ('disk_hit',): stats['disk_hits'],
+                ('miss',): stats['misses'], ('coalesced',): stats['coalesced']}
+
+    def _semantic_lookups(self):
+        stats = self.semantic_cache.get_stats()
+        return {('hit',): stats['hits'], ('miss',): stats['misses']}
+
+    def vector_store_fingerprint(self):
+        """Changes whenever the index or metadata files are rebuilt"""
+        return self.snapshot.fingerprint()
+
+    def invalidate_cache(self):
+        """Call after the vector store under api/vector_store/ has been rebuilt"""
+        self.cache.invalidate(namespace=self.vector_store_fingerprint())
+        self.semantic_cache.invalidate()
+
+    def reload(self, force=False):
+        """
+        Loads the snapshot named by api/vector_store/CURRENT (written by
+        update_index.py) and swaps it in with a single reference assignment.
+        Requests already running finish on the old snapshot. Returns True
+        when a new snapshot was installed.
+        """
+        with self._reload_lock:
+            version = current_version(self.vector_store_dir)
+            if version == self.snapshot.version and not force:
+                return False
+
+            snapshot = VectorStoreSnapshot.load_current(self.vector_store_dir, verify=self.verify_store)
+
+            # The keyword analyzer is built from the catalog too; swap it alongside
+            local = getattr(self.analyzer, 'local', None)
+            if local is not None and hasattr(local, 'from_catalog'):
+                self.analyzer.local = type(local).from_catalog(snapshot.store, index=snapshot.bm25)
+
+            self.snapshot = snapshot
+            self.cache.invalidate(namespace=snapshot.fingerprint())
+            self.semantic_cache.invalidate()
+
+        log.info("🔄 Reloaded vector store snapshot %s (%d assessments)", snapshot.version, len(snapshot))
+        return True
+
+    def warm_up(self):
+        """
+        Pays the first request's one-off costs up front: index and catalog
+        pages, BM25 postings, the local analyzer, the upstream HTTP clients
+        and local embedding / reranking models. Makes no upstream calls.
+        """
+        snapshot = self.snapshot
+        snapshot.dense_search(snapshot.store.vectors[:1], 1)
+        if snapshot.field_index is not None:
+            snapshot.field_index.search(snapshot.field_index.vectors[0], 1)
+        snapshot.bm25.search("warm up", top_k=1)
+        snapshot.metadata[0]
+
+        local = getattr(self.analyzer, 'local', None)
+        if local is not None:
+            local.analyze("warm up")
+        for backend in (getattr(self.analyzer, 'llm', None), self.embedder, self.reranker):
+            if hasattr(backend, 'connect'):
+                try:
+                    backend.connect()
+                except Exception as e:
+                    # e.g. a missing API key or model; requests report it (or fall back) on their own
+                    log.warning("⚠ Could not create %s client: %s", backend.model, e)
+
+    def after_fork(self):
+        """Resets per-process state inherited from a preloading gunicorn master"""
+        self._reload_lock = threading.Lock()
+        self._reload_thread = None
+        self.cache.reopen()
+
+    def current_snapshot(self):
+        """
+        The live snapshot. At most every RELOAD_INTERVAL a background thread
+        checks for a newly published one and loads it; requests (including
+        those on the event loop) never wait for the load and keep getting
+        the old snapshot until the swap.
+        """
+        if self.RELOAD_INTERVAL > 0 and time.monotonic() >= self._next_reload_check:
+            self._next_reload_check = time.monotonic() + self.RELOAD_INTERVAL
+            if self._reload_thread is None or not self._reload_thread.is_alive():
+                self._reload_thread = threading.Thread(target=self._background_reload, name="snapshot-reload",
+                                                       daemon=True)
+                self._reload_thread.start()
+        return self.snapshot
+
+    def _background_reload(self):
+        try:
+            self.reload()
+        except Exception as e:
+            log.warning("⚠ Vector store reload failed, keeping %s: %s", self.snapshot.version, e)
+
+    def filter_mask(self, filters):
+        return self.snapshot.filter_mask(filters)
+
+    def _cache_key(self, snapshot, query_text, top_k, filters):
+        # Version-scoped, so a result computed on a replaced snapshot is never served
+        return f"{snapshot.version}|" + self.cache.make_key(query_text, top_k, filters)
+
+    def _semantic_scope(self, snapshot, top_k, filters):
+        """Results are only shared between queries with the same snapshot, top_k and filters"""
+        if self.SEMANTIC_CACHE not in ('1', 'shadow'):
+            return None
+        return f"{snapshot.version}|{top_k}|" + (json.dumps(filters, sort_keys=True) if filters else '')
+
+    def _semantic_get(self, query_embedding, scope):
+        if scope is None or query_embedding is None:
+            return None
+        with span('semantic_cache'):
+            results = self.semantic_cache.get(_query_vector(query_embedding), scope)
+        if self.SEMANTIC_CACHE != '1':
+            return None  # shadow: measured, never served
+        if results is not None:
+            log.debug("♻️  Near-duplicate query, reusing cached results")
+        return results
+
+    def _semantic_put(self, query_embedding, scope, results):
+        if scope is not None and query_embedding is not None and _complete(results):
+            self.semantic_cache.put(_query_vector(query_embedding), scope, results)
+
+    def query_chunks(self, query_text):
+        """Chunks of a query longer than LONG_QUERY_CHARS (see split_query), else None"""
+        if self.LONG_QUERY_CHARS <= 0 or len(query_text) < self.LONG_QUERY_CHARS:
+            return None
+        chunks = split_query(query_text, self.CHUNK_CHARS, self.MAX_CHUNKS)
+        return chunks if len(chunks) > 1 else None
+
+    def analyze_query_with_llm(self, query_text):
+        chunks = self.query_chunks(query_text) if self.LONG_QUERY_ANALYSIS_CHARS > 0 else None
+        if chunks is not None:
+            # The prompt, and so the latency, no longer grows with the pasted text
+            query_text = head_chunks(chunks, self.LONG_QUERY_ANALYSIS_CHARS)
+        with span('llm'):
+            return self.analyzer.analyze(query_text)
     
+    def embed_search_query(self, query_text):
+        """
+        What the dense search runs on: one vector, or for a long query the
+        chunk matrix (one batched embedding call)
+        """
+        chunks = self.query_chunks(query_text)
+        if chunks is None:
+            return self.embed_query(query_text)
+        with span('embed'):
+            return self.embed_queries(chunks)
+
     def embed_query(self, query_text):
-        response = gemini_client.models.embed_content(
-            model='models/text-embedding-004',
-            contents=query_text
-        )
-        return np.array(response.embeddings[0].values).astype('float32')
+        with span('embed'):
+            if not self.embedder.cacheable:
+                return self.embedder.embed(query_text)
+
+            cached = self._cached_embedding(query_text)
+            if cached is not None:
+                return cached
+
+            embedding = self.embedder.embed(query_text)
+            self.embedding_cache.put(query_text, embedding)
+            return embedding
+
+    def _cached_embedding(self, text):
+        embedding = self.embedding_cache.get(text)
+        if embedding is None:
+            embedding = self.embedding_store.get(self.embedder.model, text)
+        return embedding
+    
+    def _degrade(self, stage, error, reasons):
+        """Records a failed upstream stage, or re-raises when UPSTREAM_FALLBACK is off"""
+        if not self.UPSTREAM_FALLBACK:
+            raise error
+        log.warning("⚠ %s failed, serving degraded results: %r", stage, error)
+        DEGRADED.inc(stage)
+        reasons.append(stage)
+
+    def _analyze_or_degrade(self, query_text, reasons):
+        try:
+            return self._check_analysis(self.analyze_query_with_llm(query_text), reasons)
+        except Exception as e:
+            self._degrade('llm', e, reasons)
+            return DEGRADED_ANALYSIS
+
+    def _check_analysis(self, query_analysis, reasons):
+        """A hybrid analyzer's local fallback for a failed LLM call is served, but as a degraded 'llm' stage"""
+        if isinstance(query_analysis, FallbackAnalysis):
+            self._degrade('llm', query_analysis.error, reasons)
+        return query_analysis
+
+    def _embed_or_degrade(self, query_text, reasons):
+        try:
+            return self.embed_search_query(query_text)
+        except Exception as e:
+            self._degrade('embed', e, reasons)
+            return None
+
+    def embed_queries(self, query_texts):
+        """Batch form of embed_query: one embed_many call per EMBED_BATCH_SIZE uncached texts"""
+        if not self.embedder.cacheable:
+            embeddings = []
+            for i in range(0, len(query_texts), self.EMBED_BATCH_SIZE):
+                embeddings.extend(self.embedder.embed_many(query_texts[i:i + self.EMBED_BATCH_SIZE]))
+            return np.vstack(embeddings).astype('float32')
+
+        embeddings = [self._cached_embedding(t) for t in query_texts]
+        missing = list(dict.fromkeys(t for t, e in zip(query_texts, embeddings) if e is None))
+
+        fresh = {}
+        for i in range(0, len(missing), self.EMBED_BATCH_SIZE):
+            chunk = missing[i:i + self.EMBED_BATCH_SIZE]
+            for text, embedding in zip(chunk, self.embedder.embed_many(chunk)):
+                self.embedding_cache.put(text, embedding)
+                fresh[text] = embedding
+
+        embeddings = [fresh[t] if e is None else e for t, e in zip(query_texts, embeddings)]
+        return np.vstack(embeddings).astype('float32')
     
+    def _embed_batch(self, query_texts):
+        """
+        Per-query entries for candidate_arrays_batch: a vector, or a long
+        query's chunk matrix. Every text and chunk goes into one embed_queries call.
+        """
+        pieces = [self.query_chunks(q) or [q] for q in query_texts]
+        flat = self.embed_queries([p for query_pieces in pieces for p in query_pieces])
+        embeddings = []
+        start = 0
+        for query_pieces in pieces:
+            block = flat[start:start + len(query_pieces)]
+            embeddings.append(block if len(query_pieces) > 1 else block[0])
+            start += len(query_pieces)
+        return embeddings
+
     def vector_search(self, query_embedding, top_k=100):
         # Increased from 50 to 100
-        query_embedding = query_embedding.reshape(1, -1)
-        distances, indices = self.index.search(query_embedding, top_k)
-        
+        return self.vector_search_batch(query_embedding.reshape(1, -1), top_k)[0]
+
+    def vector_search_batch(self, query_embeddings, top_k=100):
+        """One matrix-shaped FAISS search; returns a candidate list per query row"""
+        snapshot = self.snapshot
+        distances, indices = snapshot.dense_search(query_embeddings, top_k)
+        return [
+            snapshot.candidates(*snapshot.valid_dense(row_indices, row_distances))
+            for row_indices, row_distances in zip(indices, distances)
+        ]
+
+    def candidate_search(self, query_text, query_embedding):
+        return self.candidate_search_batch([query_text], [query_embedding])[0]
+
+    def candidate_search_batch(self, query_texts, query_embeddings):
+        """Candidate dicts per query (see candidate_arrays_batch)"""
+        snapshot = self.snapshot
+        return [snapshot.candidates(ids, scores)
+                for ids, scores in self.candidate_arrays_batch(query_texts, query_embeddings, snapshot=snapshot)]
+
+    def candidate_arrays_batch(self, query_texts, query_embeddings, allowed=None, snapshot=None, depth=None):
+        """
+        First-stage candidates for each query as (ids, scores) arrays. In
+        hybrid mode the dense FAISS hits (one multi-row search) are fused with
+        BM25 hits over embedding_text and the scores are the fused scores.
+        Metadata is only decoded later, for the handful of selected results.
+
+        `allowed` (from filter_mask) is applied inside both searches, so a
+        filtered query still gets a full candidate pool. Ids are rows of
+        `snapshot` (default: the live one). With `query_embeddings` None
+        (embedding backend down) the candidates are BM25 hits only.
+
+        `query_embeddings` has one row per query, or is a list with one
+        entry per query where a long query's entry is its chunk matrix
+        (see embed_search_query). All rows go into the same FAISS search,
+        or with DENSE_INDEX=fields the same field-index matrix product.
+
+        `depth` (default CANDIDATE_POOL) is the pool size; both searches
+        shrink in proportion (see _cascade).
+        """
+        return [(ids, scores) for ids, scores, _ in
+                self._candidates(query_texts, query_embeddings, allowed, snapshot or self.snapshot, depth)]
+
+    def _source_depth(self, candidates, depth):
+        """Per-source search depth for a pool of `depth`, in proportion to the full-pool setting"""
+        return max(1, -(-candidates * depth // self.CANDIDATE_POOL))
+
+    def _candidates(self, query_texts, query_embeddings, allowed, snapshot, depth=None):
+        """candidate_arrays_batch plus the dense (or BM25-only) scores, which the cascade tests for flatness"""
+        depth = depth or self.CANDIDATE_POOL
+        if query_embeddings is None:
+            return [(ids, scores, scores) for ids, scores in
+                    (snapshot.bm25.search(q, top_k=depth, allowed=allowed) for q in query_texts)]
+
+        if self.RETRIEVAL_MODE == 'dense':
+            batch_results = self._dense_candidates(query_texts, query_embeddings, depth, allowed, snapshot)
+            for ids, _ in batch_results:
+                CANDIDATES.observe(len(ids), 'dense')
+            return [(ids, scores, scores) for ids, scores in batch_results]
+
+        dense_results = self._dense_candidates(query_texts, query_embeddings,
+                                               self._source_depth(self.DENSE_CANDIDATES, depth), allowed, snapshot)
+        lexical_depth = self._source_depth(self.LEXICAL_CANDIDATES, depth)
+
+        batch_results = []
+        for query_text, (dense_ids, dense_scores) in zip(query_texts, dense_results):
+            lexical_ids, lexical_scores = snapshot.bm25.search(
+                query_text, top_k=lexical_depth, allowed=allowed
+            )
+
+            if self.FUSION == 'weighted':
+                ids, scores = weighted_fuse(
+                    [dense_ids, lexical_ids], [dense_scores, lexical_scores],
+                    weights=[1.0, self.LEXICAL_WEIGHT], top_k=depth
+                )
+            else:
+                ids, scores = rrf_fuse(
+                    [dense_ids, lexical_ids], weights=[1.0, self.LEXICAL_WEIGHT], top_k=depth
+                )
+            batch_results.append((ids, scores, dense_scores))
+
+            CANDIDATES.observe(len(dense_ids), 'dense')
+            CANDIDATES.observe(len(lexical_ids), 'lexical')
+            CANDIDATES.observe(len(ids), 'fused')
+
+        return batch_results
+
+    def _cascade(self, query_text, query_analysis, query_embedding, top_k, allowed, snapshot, first=None):
+        """
+        Adaptive-depth first stage: searches CASCADE_DEPTHS in turn and
+        stops at the first pool expansion_reason() accepts, or when the
+        searches return fewer hits than asked for. `first` is the result
+        for the first depth when already computed (retrieve_batch searches
+        every query at once). Returns (ids, scores).
+        """
+        start = time.perf_counter()
+        required_types = query_analysis.get('required_test_types', [])
+        expansions = []
+        for step, depth in enumerate(self.CASCADE_DEPTHS):
+            if step or first is None:
+                first = self._candidates([query_text], query_embedding, allowed, snapshot, depth)[0]
+            ids, scores, source_scores = first
+            wanted = depth if query_embedding is None or self.RETRIEVAL_MODE == 'dense' else \
+                self._source_depth(self.DENSE_CANDIDATES, depth)
+            if step + 1 == len(self.CASCADE_DEPTHS) or len(source_scores) < wanted:
+                break
+            reason = expansion_reason(source_scores, snapshot.type_masks[ids], snapshot.url_ids[ids],
+                                      required_types, top_k, self.CASCADE_FLAT_GAP)
+            if reason is None:
+                break
+            expansions.append(reason)
+        self.cascade_stats.record(depth, expansions)
+
+        if self.CASCADE_SHADOW_RATE > 0 and random.random() < self.CASCADE_SHADOW_RATE:
+            positions = snapshot.select(ids, scores, required_types, top_k)
+            cascade_ms = (time.perf_counter() - start) * 1000
+            self._shadow_baseline(query_text, query_embedding, required_types, top_k, allowed, snapshot,
+                                  cascade_ms, list(ids[positions]))
+        return ids, scores
+
+    def _shadow_baseline(self, query_text, query_embedding, required_types, top_k, allowed, snapshot,
+                         cascade_ms, cascade_ids):
+        """Times the fixed CANDIDATE_POOL search + selection the cascade replaced, for /cascade/stats"""
+        start = time.perf_counter()
+        ids, scores = self.candidate_arrays_batch([query_text], query_embedding, allowed, snapshot)[0]
+        positions = snapshot.select(ids, scores, required_types, top_k)
+        baseline_ms = (time.perf_counter() - start) * 1000
+        self.cascade_stats.record_shadow(cascade_ms, baseline_ms, list(ids[positions]) == cascade_ids)
+
+    def _dense_candidates(self, query_texts, query_embeddings, top_k, allowed, snapshot):
+        """(ids, scores) per query from one multi-row search; chunk hits aggregated per assessment"""
+        if self.DENSE_INDEX == 'fields' and snapshot.field_index is not None:
+            row_weights = None
+            if self.CHUNK_AGGREGATION == 'sum':
+                row_weights = [chunk_weights(self.query_chunks(q)) if np.ndim(e) == 2 else None
+                               for q, e in zip(query_texts, query_embeddings)]
+            return snapshot.field_index.search_batch(
+                query_embeddings, top_k, self.FIELD_WEIGHTS, allowed, self.CHUNK_AGGREGATION, row_weights
+            )
+
+        rows = [np.atleast_2d(e) for e in query_embeddings]
+        distances, indices = snapshot.dense_search(np.vstack(rows), top_k, allowed)
+
         results = []
-        for idx, dist in zip(indices[0], distances[0]):
-            if idx < len(self.metadata):
-                results.append({
-                    'metadata': self.metadata[idx],
-                    'similarity_score': float(1 / (1 + dist))
-                })
-        
+        start = 0
+        for query_text, query_rows in zip(query_texts, rows):
+            hits = [snapshot.valid_dense(indices[r], distances[r]) for r in range(start, start + len(query_rows))]
+            start += len(query_rows)
+            if len(hits) == 1:
+                results.append(hits[0])
+            elif self.CHUNK_AGGREGATION == 'sum':
+                weights = chunk_weights(self.query_chunks(query_text))
+                results.append(sum_fuse([h[0] for h in hits], [h[1] for h in hits], weights, top_k=top_k))
+            else:
+                results.append(max_fuse([h[0] for h in hits], [h[1] for h in hits], top_k=top_k))
         return results
-    
+
     def balance_by_test_type(self, candidates, required_types, target_count=10):
-        """RELAXED balancing - prioritize similarity score more"""
-        if not required_types or len(required_types) == 0:
-            # No required types - just return top by score
-            return sorted(candidates, key=lambda x: x['similarity_score'], reverse=True)[:target_count]
-        
-        # Get top candidates first
-        sorted_candidates = sorted(candidates, key=lambda x: x['similarity_score'], reverse=True)
-        
-        # Try to balance but don't force it
-        balanced = []
-        seen_urls = set()
-        
-        # First pass: get at least 1-2 from each required type if available
-        type_counts = {t: 0 for t in required_types}
-        min_per_type = 2  # Reduced from strict equal distribution
-        
-        for candidate in sorted_candidates:
-            if len(balanced) >= target_count:
-                break
-            
-            meta = candidate['metadata']
-            url = meta['url']
-            
-            if url in seen_urls:
-                continue
-            
-            # Check if this candidate helps balance
-            candidate_types = [t for t in meta['test_type'] if t in required_types]
-            
-            if candidate_types:
-                # Does this help balance?
-                needs_balance = any(type_counts[t] < min_per_type for t in candidate_types)
-                
-                if needs_balance or len(balanced) < target_count:
-                    balanced.append(candidate)
-                    seen_urls.add(url)
-                    
-                    for t in candidate_types:
-                        if t in type_counts:
-                            type_counts[t] += 1
-        
-        # Second pass: fill remaining slots with best scores regardless of type
-        for candidate in sorted_candidates:
-            if len(balanced) >= target_count:
-                break
-            
-            url = candidate['metadata']['url']
-            if url not in seen_urls:
-                balanced.append(candidate)
-                seen_urls.add(url)
-        
-        return balanced[:target_count]
+        """RELAXED balancing - prioritize similarity score more (candidate-dict form)"""
+        ids = np.array([c['metadata']['id'] for c in candidates], dtype='int64')
+        scores = np.array([c['similarity_score'] for c in candidates], dtype='float32')
+        positions = self.snapshot.select(ids, scores, required_types, target_count)
+        return [candidates[p] for p in positions]
     
-    def retrieve(self, query_text, top_k=10):
-        print(f"\n🔍 Query: {query_text[:100]}...")
-        
-        query_analysis = self.analyze_query_with_llm(query_text)
-        print(f"📊 Analysis: {query_analysis}")
-        
-        query_embedding = self.embed_query(query_text)
+    def retrieve(self, query_text, top_k=10, filters=None):
+        """
+        filters: optional dict with any of test_types, min_duration,
+        max_duration (minutes), job_levels, languages (lists match any
+        value) and remote (bool)
+        """
+        snapshot = self.current_snapshot()
+        allowed = snapshot.filter_mask(filters)
+        key = self._cache_key(snapshot, query_text, top_k, filters)
+        scope = self._semantic_scope(snapshot, top_k, filters)
+        return self.cache.get_or_compute(
+            key, lambda: self._retrieve(query_text, top_k, allowed, snapshot, scope), cacheable=_complete
+        )
+
+    async def retrieve_async(self, query_text, top_k=10, filters=None):
+        snapshot = self.current_snapshot()
+        allowed = snapshot.filter_mask(filters)
+        key = self._cache_key(snapshot, query_text, top_k, filters)
+        scope = self._semantic_scope(snapshot, top_k, filters)
+        return await self.cache.get_or_compute_async(
+            key, lambda: self._retrieve_async(query_text, top_k, allowed, snapshot, scope), cacheable=_complete
+        )
+
+    def _retrieve(self, query_text, top_k, allowed=None, snapshot=None, scope=None):
+        log.debug("🔍 Query: %.100s...", query_text)
+        reasons = []
         
-        candidates = self.vector_search(query_embedding, top_k=100)
-        print(f"🔎 Found {len(candidates)} candidates")
+        # Embedding first: a near-duplicate of a cached query needs no analysis
+        query_embedding = self._embed_or_degrade(query_text, reasons)
+        cached = self._semantic_get(query_embedding, scope)
+        if cached is not None:
+            return cached
         
-        required_types = query_analysis.get('required_test_types', [])
-        balanced_results = self.balance_by_test_type(candidates, required_types, top_k)
+        query_analysis = self._analyze_or_degrade(query_text, reasons)
+        log.debug("📊 Analysis: %s", query_analysis)
         
-        print(f"⚖️  Balanced to {len(balanced_results)} results")
+        results = self._rank(query_text, query_analysis, query_embedding, top_k, allowed, snapshot, reasons)
+        self._semantic_put(query_embedding, scope, results)
+        return results
+
+    async def _retrieve_async(self, query_text, top_k, allowed=None, snapshot=None, scope=None):
+        """
+        Same as _retrieve(), but the Groq analysis and the Gemini embedding
+        run concurrently in worker threads, each under its own deadline, and
+        ranking runs in a worker thread too.
+        A failed or timed-out call degrades the result (see _degrade); with
+        fallbacks off it cancels the other call and raises. A near-duplicate
+        cache hit on the embedding stops waiting for the analysis, but the
+        cancel cannot stop its worker thread: a Groq request already sent
+        still runs to completion (within LLM_TIMEOUT) and counts against
+        quota.
+        """
+        log.debug("🔍 Query: %.100s...", query_text)
+
+        analysis_task = asyncio.create_task(asyncio.wait_for(
+            asyncio.to_thread(self.analyze_query_with_llm, query_text),
+            timeout=self.LLM_TIMEOUT
+        ))
+        embed_task = asyncio.create_task(asyncio.wait_for(
+            asyncio.to_thread(self.embed_search_query, query_text),
+            timeout=self.EMBED_TIMEOUT
+        ))
+
+        reasons = []
+        try:
+            query_embedding = await self._await_stage(embed_task, 'embed', None, reasons)
+            cached = self._semantic_get(query_embedding, scope)
+            if cached is not None:
+                analysis_task.cancel()
+                await asyncio.gather(analysis_task, return_exceptions=True)
+                return cached
+            query_analysis = self._check_analysis(
+                await self._await_stage(analysis_task, 'llm', DEGRADED_ANALYSIS, reasons), reasons)
+        except BaseException:
+            for task in (analysis_task, embed_task):
+                task.cancel()
+            await asyncio.gather(analysis_task, embed_task, return_exceptions=True)
+            raise
+
+        log.debug("📊 Analysis: %s", query_analysis)
+
+        # FAISS / BM25 search, fusion, reranking and balancing are all CPU work:
+        # none of it may block the event loop
+        results = await asyncio.to_thread(
+            self._rank, query_text, query_analysis, query_embedding, top_k, allowed, snapshot, reasons)
+        self._semantic_put(query_embedding, scope, results)
+        return results
+
+    async def _await_stage(self, task, stage, fallback, reasons):
+        """The task's result, or `fallback` after recording a degraded stage (see _degrade)"""
+        try:
+            return await task
+        except Exception as e:
+            self._degrade(stage, e, reasons)
+            return fallback
+
+    def retrieve_batch(self, query_texts, top_k=10, return_exceptions=False, filters=None):
+        """
+        Batch form of retrieve(): cached queries are answered directly, the
+        rest are analyzed concurrently, embedded in batched calls (near
+        duplicates of cached queries stop there) and searched with one
+        multi-row FAISS query before per-query balancing. With CASCADE on
+        that search is at the first cascade depth and only the queries that
+        need a deeper pool are searched again. `filters` apply to every
+        query in the batch.
+
+        With return_exceptions=True a failed query yields its exception in
+        place of a result list instead of failing the whole batch. Upstream
+        failures degrade the affected queries first (see _degrade).
+        """
+        snapshot = self.current_snapshot()
+        allowed = snapshot.filter_mask(filters)
+        keys = [self._cache_key(snapshot, q, top_k, filters) for q in query_texts]
+        results = [self.cache.get(key) for key in keys]
+        pending = [i for i, r in enumerate(results) if r is None]
+        if not pending:
+            return results
+
+        pending_texts = [query_texts[i] for i in pending]
+        log.debug("🔍 Batch: %d uncached of %d queries", len(pending_texts), len(query_texts))
+
+        pool = ThreadPoolExecutor(max_workers=self.BATCH_ANALYSIS_WORKERS)
+        try:
+            analysis_futures = [pool.submit(self.analyze_query_with_llm, q) for q in pending_texts]
+            batch_reasons = []
+            try:
+                with span('batch_embed'):
+                    embeddings = self._embed_batch(pending_texts)
+            except Exception as e:
+                try:
+                    self._degrade('embed', e, batch_reasons)
+                except Exception:
+                    if not return_exceptions:
+                        raise
+                    for i in pending:
+                        results[i] = e
+                    return results
+                embeddings = None
+
+            # Near-duplicates of cached queries are answered here; their analyses are dropped
+            scope = self._semantic_scope(snapshot, top_k, filters)
+            if embeddings is not None and scope is not None:
+                misses = []
+                for row, i in enumerate(pending):
+                    cached = self._semantic_get(embeddings[row], scope)
+                    if cached is None:
+                        misses.append(row)
+                        continue
+                    analysis_futures[row].cancel()
+                    self.cache.put(keys[i], cached)
+                    results[i] = cached
+                if not misses:
+                    return results
+                pending = [pending[row] for row in misses]
+                pending_texts = [pending_texts[row] for row in misses]
+                analysis_futures = [analysis_futures[row] for row in misses]
+                embeddings = [embeddings[row] for row in misses]
+
+            with span('batch_search'):
+                first_depth = self.CASCADE_DEPTHS[0] if self.CASCADE else None
+                candidate_lists = self._candidates(pending_texts, embeddings, allowed, snapshot, first_depth)
+
+            for row, (i, future, candidates) in enumerate(zip(pending, analysis_futures, candidate_lists)):
+                reasons = list(batch_reasons)
+                try:
+                    try:
+                        query_analysis = self._check_analysis(future.result(), reasons)
+                    except Exception as e:
+                        self._degrade('llm', e, reasons)
+                        query_analysis = DEGRADED_ANALYSIS
+                    if self.CASCADE:
+                        ids, scores = self._cascade(
+                            pending_texts[row], query_analysis, None if embeddings is None else [embeddings[row]],
+                            top_k, allowed, snapshot, first=candidates
+                        )
+                    else:
+                        ids, scores = candidates[:2]
+                    recommendations = self._balance(pending_texts[row], query_analysis, ids, scores, top_k, snapshot,
+                                                    None if embeddings is None else embeddings[row])
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    results[i] = e
+                    continue
+                if reasons:
+                    results[i] = DegradedResults(recommendations, reasons)
+                    continue
+                self.cache.put(keys[i], recommendations)
+                if embeddings is not None:
+                    self._semantic_put(embeddings[row], scope, recommendations)
+                results[i] = recommendations
+        finally:
+            # Analyses nobody needs any more (near-duplicate hits, a failed batch) are not waited for
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        return results
+
+    def retrieve_timed(self, query_text, top_k=10, filters=None):
+        """
+        Uncached, sequential retrieve() that also returns per-stage latency
+        in milliseconds: {'llm', 'embed', 'search', 'balance', 'total'}.
+        Used by the evaluation runner.
+        """
+        snapshot = self.current_snapshot()
+        allowed = snapshot.filter_mask(filters)
+        start = time.perf_counter()
+
+        with trace() as spans:
+            query_analysis = self.analyze_query_with_llm(query_text)
+            query_embedding = self.embed_search_query(query_text)
+            recommendations = self._rank(query_text, query_analysis, query_embedding, top_k, allowed, snapshot)
+
+        timings = spans.timings()
+        timings['total'] = (time.perf_counter() - start) * 1000
+        return recommendations, timings
+
+    def _rank(self, query_text, query_analysis, query_embedding, top_k, allowed=None, snapshot=None, reasons=None):
+        """Search + balancing stage shared by the sync and async paths"""
+        snapshot = snapshot or self.snapshot
+        if query_embedding is not None:
+            query_embedding = [query_embedding]
+        with span('search'):
+            if self.CASCADE:
+                ids, scores = self._cascade(query_text, query_analysis, query_embedding, top_k, allowed, snapshot)
+            else:
+                ids, scores = self.candidate_arrays_batch([query_text], query_embedding, allowed, snapshot)[0]
+        log.debug("🔎 Found %d candidates", len(ids))
         
-        recommendations = []
-        for result in balanced_results:
-            meta = result['metadata']
-            recommendations.append({
-                'assessment_name': meta['name'],
-                'assessment_url': meta['url'],
-                'test_type': meta['test_type'],
-                'similarity_score': result['similarity_score']
-            })
+        recommendations = self._balance(query_text, query_analysis, ids, scores, top_k, snapshot,
+                                        None if query_embedding is None else query_embedding[0])
+        return DegradedResults(recommendations, reasons) if reasons else recommendations
+
+    def _balance(self, query_text, query_analysis, ids, scores, top_k, snapshot=None, query_embedding=None):
+        """
+        Optional rerank of the survivors, then balancing. Each result
+        reports `rank_score`, the first-stage (fused) score it was ordered
+        by, and `similarity_score`, the original 1 / (1 + squared L2
+        distance) to the query embedding (None without one).
+        """
+        snapshot = snapshot or self.snapshot
+        rank_scores = scores
+        if self.reranker is not None and len(ids):
+            with span('rerank'):
+                start = time.perf_counter()
+                rank_scores, rescored, truncated = rerank(self.reranker, query_text, query_analysis, ids, scores,
+                                                          snapshot, self.RERANK_DEPTH, self.RERANK_BUDGET_MS)
+                self.cascade_stats.record_rerank(rescored, truncated, (time.perf_counter() - start) * 1000)
+
+        with span('balance'):
+            required_types = query_analysis.get('required_test_types', [])
+            positions = snapshot.select(ids, rank_scores, required_types, top_k)
+            
+            similarities = _l2_similarities(snapshot, ids[positions], query_embedding)
+            recommendations = []
+            for p, similarity in zip(positions, similarities):
+                meta = snapshot.metadata[ids[p]]
+                recommendations.append({
+                    'assessment_name': meta['name'],
+                    'assessment_url': meta['url'],
+                    'test_type': meta['test_type'],
+                    'similarity_score': similarity,
+                    'rank_score': float(scores[p])
+                })
         
+        log.debug("⚖️  Balanced to %d results", len(positions))
         return recommendations
 
 if __name__ == "__main__":
@@ -181,5 +882,8 @@ if __name__ == "__main__":
     for i, rec in enumerate(results, 1):
         print(f"{i}. {rec['assessment_name']}")
         print(f"   Types: {rec['test_type']}")
-        print(f"   Score: {rec['similarity_score']:.3f}")
+        # similarity_score is None for lexical-only hits; rank_score is always set
+        similarity = rec['similarity_score']
+        print(f"   Score: {rec['rank_score']:.3f}"
+              + (f" (similarity {similarity:.3f})" if similarity is not None else " (lexical only)"))
         print()
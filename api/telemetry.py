@@ -0,0 +1,328 @@
+# api/telemetry.py
+
+import os
+import sys
+import time
+import random
+import logging
+import threading
+import contextvars
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# Fraction of requests whose spans are stack-sampled (0 = profiler off)
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 5, 10, 20, 30, 50, 75, 100, 150, 200)
+
+
+# ---------- logging ----------
+
+_handler = logging.StreamHandler()
+_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_root = logging.getLogger("shl")
+_root.addHandler(_handler)
+_root.setLevel(LOG_LEVEL)
+_root.propagate = False
+
+
+def get_logger(name):
+    """
+    Logger under "shl", level from LOG_LEVEL. Pass values as %-style
+    arguments so a disabled level skips formatting entirely.
+    """
+    return _root.getChild(name)
+
+
+# ---------- metrics ----------
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        f'{n}="' + str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for n, v in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Fixed-bucket histogram per label combination, Prometheus semantics (le = upper bound)"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self):
+        with self._lock:
+            snapshot = {k: (list(counts), total) for k, (counts, total) in self._series.items()}
+        lines = []
+        for labels, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = _labels(self.label_names + ('le',), labels + (_number(bound),))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            base = _labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{base} {_number(total)}")
+            lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+class CounterMetric:
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in sorted(values.items())]
+
+
+class CallbackMetric:
+    """Value(s) read at scrape time from `fn` -> number or {label values tuple: number}"""
+
+    def __init__(self, name, help, type='gauge', labels=(), fn=None):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.label_names = tuple(labels)
+        self.fn = fn
+
+    def render(self):
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in sorted(values.items())]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        # Re-registering (e.g. a second RetrievalEngine) replaces the callback
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def counter(self, name, help, labels=()):
+        return self.register(CounterMetric(name, help, labels))
+
+    def callback(self, name, help, fn, type='gauge', labels=()):
+        return self.register(CallbackMetric(name, help, type, labels, fn))
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                body = metric.render()
+            except Exception as e:
+                get_logger("telemetry").warning("Metric %s failed to render: %s", metric.name, e)
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(body)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "shl_request_seconds", "HTTP request latency", labels=("method", "path", "status"))
+STAGE_SECONDS = REGISTRY.histogram(
+    "shl_stage_seconds", "Time spent in each retrieval stage", labels=("stage",))
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "shl_upstream_seconds", "Latency of calls to model backends", labels=("backend", "outcome"))
+CANDIDATES = REGISTRY.histogram(
+    "shl_candidates", "Candidates per query from each first-stage source",
+    labels=("source",), buckets=COUNT_BUCKETS)
+
+
+# ---------- spans ----------
+
+class Trace:
+    """Spans recorded for one request, as (stage, milliseconds) in completion order"""
+
+    __slots__ = ('spans', 'sampled')
+
+    def __init__(self, sampled=False):
+        self.spans = []
+        self.sampled = sampled
+
+    def timings(self):
+        """{stage: total ms}; a stage entered more than once is summed"""
+        totals = {}
+        for stage, ms in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + ms
+        return totals
+
+    def server_timing(self):
+        """Value for a Server-Timing response header"""
+        return ', '.join(f"{stage};dur={ms:.2f}" for stage, ms in self.timings().items())
+
+
+# Copied into asyncio.to_thread workers, so spans there land in the request's trace
+_current_trace = contextvars.ContextVar("shl_trace", default=None)
+
+
+@contextmanager
+def trace(sampled=None):
+    """Collects the spans of everything run inside the block (and its to_thread calls)"""
+    if sampled is None:
+        sampled = PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+    current = Trace(sampled)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(stage):
+    """Times a stage into shl_stage_seconds and the current trace, if any"""
+    current = _current_trace.get()
+    profiled = current is not None and current.sampled
+    if profiled:
+        previous = PROFILER.attach(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage)
+        if current is not None:
+            current.spans.append((stage, elapsed * 1000))
+        if profiled:
+            PROFILER.detach(previous)
+
+
+@contextmanager
+def upstream(backend):
+    """Times one call to a model backend, labelled ok / error"""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - start, backend, outcome)
+
+
+# ---------- sampling profiler ----------
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of threads that are inside a span of a
+    sampled request, every `interval_ms`, from one background thread.
+    Stacks are kept in collapsed form ("stage;file:function;... count"),
+    ready for flamegraph.pl or speedscope. Unsampled requests only pay
+    the `sampled` check in span().
+    """
+
+    MAX_STACKS = 20000
+    MAX_DEPTH = 64
+
+    def __init__(self, interval_ms=PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._sampler = None
+
+    def attach(self, stage):
+        """Marks the calling thread as profiled under `stage`; returns what it replaced"""
+        ident = threading.get_ident()
+        with self._lock:
+            previous = self._threads.get(ident)
+            self._threads[ident] = stage
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._run, name="shl-profiler", daemon=True)
+                self._sampler.start()
+        return previous
+
+    def detach(self, previous=None):
+        ident = threading.get_ident()
+        with self._lock:
+            if previous is None:
+                self._threads.pop(ident, None)
+            else:
+                self._threads[ident] = previous
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                threads = dict(self._threads)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            for ident, stage in threads.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.MAX_DEPTH:
+                    code = frame.f_code
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack = stage + ';' + ';'.join(reversed(names))
+                with self._lock:
+                    self.samples += 1
+                    if stack in self.stacks or len(self.stacks) < self.MAX_STACKS:
+                        self.stacks[stack] += 1
+
+    def collapsed(self, reset=False):
+        with self._lock:
+            stacks = self.stacks if reset else Counter(self.stacks)
+            if reset:
+                self.stacks = Counter()
+                self.samples = 0
+        return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+PROFILER = SamplingProfiler()
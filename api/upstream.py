@@ -0,0 +1,284 @@
+# api/upstream.py
+
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from telemetry import REGISTRY, upstream
+
+try:
+    import h2  # noqa: F401 - enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+UPSTREAM_HTTP2 = os.environ.get("UPSTREAM_HTTP2", "1") == "1"
+UPSTREAM_MAX_CONNECTIONS = int(os.environ.get("UPSTREAM_MAX_CONNECTIONS", 20))
+UPSTREAM_RETRIES = int(os.environ.get("UPSTREAM_RETRIES", 2))
+UPSTREAM_BACKOFF = float(os.environ.get("UPSTREAM_BACKOFF", 0.2))
+# Send a duplicate request once the first has been outstanding longer than
+# this percentile of recent latencies (0 = no hedging)
+UPSTREAM_HEDGE_PERCENTILE = float(os.environ.get("UPSTREAM_HEDGE_PERCENTILE", 95))
+UPSTREAM_HEDGE_MIN_SAMPLES = int(os.environ.get("UPSTREAM_HEDGE_MIN_SAMPLES", 20))
+BREAKER_FAILURES = int(os.environ.get("UPSTREAM_BREAKER_FAILURES", 5))
+BREAKER_RESET = float(os.environ.get("UPSTREAM_BREAKER_RESET", 30))
+
+UPSTREAM_EVENTS = REGISTRY.counter(
+    "shl_upstream_events_total", "Retries, hedges, hedge wins and short-circuited calls per backend",
+    labels=("backend", "event"))
+
+
+class UpstreamError(Exception):
+    """A model backend call that failed; `retryable` for timeouts, 429s and 5xx"""
+
+    def __init__(self, message, retryable=False, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class UpstreamTimeout(UpstreamError):
+    def __init__(self, message):
+        super().__init__(message, retryable=True)
+
+
+class CircuitOpenError(UpstreamError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed calls (a call
+    counts once, when its retries are used up), so calls fail fast
+    instead of each waiting out a deadline. After `reset_timeout`
+    seconds a single probe call is let through (half-open): success
+    closes the circuit, failure re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+# One breaker per backend name, shared by every client talking to it
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker()
+        return _breakers[name]
+
+
+def _breaker_states():
+    codes = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+    with _breakers_lock:
+        return {(name,): codes[b.state] for name, b in _breakers.items()}
+
+
+REGISTRY.callback("shl_upstream_circuit_state", "Circuit breaker per backend: 0 closed, 1 half-open, 2 open",
+                  _breaker_states, labels=("backend",))
+
+
+class LatencyWindow:
+    """The last `size` successful call latencies, for the hedging threshold"""
+
+    def __init__(self, size=200):
+        self._values = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._values.append(seconds)
+
+    def percentile(self, p, min_samples=1):
+        with self._lock:
+            values = sorted(self._values)
+        if len(values) < min_samples:
+            return None
+        return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+# Runs the attempts, so a caller stops waiting at its deadline even when
+# the socket does not; hedged duplicates run here too
+_attempt_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("UPSTREAM_WORKERS", 32)), thread_name_prefix="upstream"
+)
+
+
+class UpstreamClient:
+    """
+    JSON-over-HTTP client for one model backend. Connections are pooled
+    and kept alive (HTTP/2 when the h2 package is installed) in a single
+    httpx.Client shared by all threads. Every call runs under a total
+    deadline with jittered exponential-backoff retries of retryable
+    errors, is hedged with a duplicate request once it is slower than
+    the recent latency percentile, and goes through the backend's
+    circuit breaker.
+    """
+
+    def __init__(self, name, base_url, timeout=10.0, retries=UPSTREAM_RETRIES, backoff=UPSTREAM_BACKOFF,
+                 hedge_percentile=UPSTREAM_HEDGE_PERCENTILE, headers=None):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_percentile = hedge_percentile
+        self.headers = headers or {}
+        self.breaker = get_breaker(name)
+        self.latencies = LatencyWindow()
+        self._http = None
+        self._http_lock = threading.Lock()
+
+    def connect(self):
+        """Creates the pooled HTTP client (httpx is imported here, not at startup)"""
+        if self._http is None:
+            with self._http_lock:
+                if self._http is None:
+                    import httpx
+                    self._http = httpx.Client(
+                        base_url=self.base_url,
+                        headers=self.headers,
+                        http2=UPSTREAM_HTTP2 and HTTP2_AVAILABLE,
+                        limits=httpx.Limits(max_connections=UPSTREAM_MAX_CONNECTIONS,
+                                            max_keepalive_connections=UPSTREAM_MAX_CONNECTIONS),
+                        timeout=self.timeout
+                    )
+        return self._http
+
+    def close(self):
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+
+    def post_json(self, path, payload, headers=None, timeout=None):
+        return self.request('POST', path, json=payload, headers=headers, timeout=timeout).json()
+
+    def request(self, method, path, timeout=None, **kwargs):
+        """Returns the successful httpx.Response or raises UpstreamError"""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        if not self.breaker.allow():
+            UPSTREAM_EVENTS.inc(self.name, 'short_circuit')
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        attempt = 0
+        while True:
+            try:
+                response = self._attempt(method, path, deadline, kwargs)
+            except UpstreamError as e:
+                if not e.retryable:
+                    # The backend answered (e.g. 400/401), so it is healthy
+                    self.breaker.record_success()
+                    raise
+                attempt += 1
+                # Full jitter; a Retry-After from the backend is a floor
+                delay = random.uniform(0, self.backoff * 2 ** attempt)
+                if e.retry_after:
+                    delay = max(delay, e.retry_after)
+                if attempt > self.retries or time.monotonic() + delay >= deadline or not self.breaker.allow():
+                    # One failure per logical call, once its retries are used up
+                    self.breaker.record_failure()
+                    raise
+                UPSTREAM_EVENTS.inc(self.name, 'retry')
+                time.sleep(delay)
+                continue
+            except Exception:
+                # Anything else still ends the call; a half-open probe must not stay half-open
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+            return response
+
+    def _attempt(self, method, path, deadline, kwargs):
+        first = _attempt_pool.submit(self._send, method, path, deadline, kwargs)
+        pending = {first}
+
+        hedge_after = None
+        if self.hedge_percentile:
+            hedge_after = self.latencies.percentile(self.hedge_percentile, UPSTREAM_HEDGE_MIN_SAMPLES)
+        if hedge_after is not None and time.monotonic() + hedge_after < deadline:
+            done, _ = wait(pending, timeout=hedge_after)
+            if not done:
+                UPSTREAM_EVENTS.inc(self.name, 'hedge')
+                pending.add(_attempt_pool.submit(self._send, method, path, deadline, kwargs))
+
+        # First success wins; the loser finishes in the pool, bounded by the deadline
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                raise UpstreamTimeout(f"{self.name} did not answer within the deadline")
+            for future in done:
+                try:
+                    response = future.result()
+                except UpstreamError as e:
+                    error = e
+                    continue
+                if future is not first:
+                    UPSTREAM_EVENTS.inc(self.name, 'hedge_won')
+                return response
+        raise error
+
+    def _send(self, method, path, deadline, kwargs):
+        import httpx
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise UpstreamTimeout(f"{self.name} deadline passed before sending")
+
+        start = time.perf_counter()
+        with upstream(self.name):
+            try:
+                response = self.connect().request(method, path, timeout=remaining, **kwargs)
+            except httpx.TimeoutException as e:
+                raise UpstreamTimeout(f"{self.name} timed out: {e}") from e
+            except httpx.TransportError as e:
+                raise UpstreamError(f"{self.name} connection failed: {e}", retryable=True) from e
+            except httpx.HTTPError as e:
+                raise UpstreamError(f"{self.name} request failed: {e}") from e
+
+            status = response.status_code
+            if status == 429 or status >= 500:
+                retry_after = response.headers.get('Retry-After')
+                raise UpstreamError(
+                    f"{self.name} returned {status}", retryable=True,
+                    retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
+                )
+            if status >= 400:
+                raise UpstreamError(f"{self.name} returned {status}: {response.text[:200]}")
+
+        self.latencies.record(time.perf_counter() - start)
+        return response
@@ -0,0 +1,237 @@
+# api/vector_snapshot.py
+
+import os
+import shutil
+import hashlib
+import numpy as np
+from columnar_store import ColumnarStore, MetadataView
+from ann_index import load_index, prepare_vectors, distances_to_scores, filter_parameters
+from bm25 import BM25Index
+from balancing import type_mask, build_type_masks, build_url_ids, select_balanced
+from attribute_filters import AttributeIndex
+from field_index import FieldIndex, FIELD_INDEX_DIR
+
+# api/vector_store/CURRENT names the live snapshot directory under
+# api/vector_store/snapshots/; without it the files in api/vector_store/
+# itself are the live set (the layout faiss_index.py writes)
+CURRENT_FILE = 'CURRENT'
+SNAPSHOTS_DIR = 'snapshots'
+BASE_VERSION = 'base'
+# Vector stores of embedders other than the default one, each a complete
+# layout of its own (CURRENT, snapshots/, faiss_index.bin, catalog/, ...)
+VARIANTS_DIR = 'variants'
+# Catalog written by embeddings.py and not published yet; faiss_index.py
+# turns it into the next snapshot
+BUILD_CATALOG_DIR = os.path.join('build', 'catalog')
+
+
+def stable_id(url):
+    """63-bit id derived from the assessment URL, so it survives re-ordering"""
+    digest = hashlib.sha1(url.strip().encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'little') & ((1 << 63) - 1)
+
+
+def assign_stable_ids(urls):
+    """stable_id per row; repeated URLs get '#2', '#3', ... suffixes to stay unique"""
+    seen = {}
+    ids = []
+    for url in urls:
+        seen[url] = seen.get(url, 0) + 1
+        ids.append(stable_id(url if seen[url] == 1 else f"{url}#{seen[url]}"))
+    return np.array(ids, dtype='int64')
+
+
+def current_version(vector_store_dir):
+    path = os.path.join(vector_store_dir, CURRENT_FILE)
+    if not os.path.exists(path):
+        return BASE_VERSION
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip() or BASE_VERSION
+
+
+def variant_dir(vector_store_dir, variant):
+    """Root of the vector store for index `variant`; None is the default (Gemini) store"""
+    if not variant:
+        return vector_store_dir
+    return os.path.join(vector_store_dir, VARIANTS_DIR, variant)
+
+
+def snapshot_dir(vector_store_dir, version):
+    if version == BASE_VERSION:
+        return vector_store_dir
+    return os.path.join(vector_store_dir, SNAPSHOTS_DIR, version)
+
+
+def build_catalog_dir(vector_store_dir):
+    return os.path.join(vector_store_dir, BUILD_CATALOG_DIR)
+
+
+def next_version(vector_store_dir):
+    root = os.path.join(vector_store_dir, SNAPSHOTS_DIR)
+    versions = [int(v[1:]) for v in os.listdir(root) if v[1:].isdigit()] if os.path.isdir(root) else []
+    return f"v{max(versions, default=0) + 1}"
+
+
+def _fsync_tree(directory):
+    for root, _, files in os.walk(directory):
+        for name in files + ['.']:
+            fd = os.open(os.path.join(root, name), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+
+def publish_snapshot(vector_store_dir, version):
+    """Points CURRENT at a fully written snapshot, once its files are on disk; the rename is atomic"""
+    _fsync_tree(snapshot_dir(vector_store_dir, version))
+    tmp_path = os.path.join(vector_store_dir, CURRENT_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(vector_store_dir, CURRENT_FILE))
+
+
+def prune_snapshots(vector_store_dir, live_version, keep):
+    """Removes all but the newest `keep` snapshots; the live one is never removed"""
+    if keep < 1:
+        raise ValueError(f"keep must be at least 1 (the live snapshot), got {keep}")
+    root = os.path.join(vector_store_dir, SNAPSHOTS_DIR)
+    versions = sorted((v for v in os.listdir(root) if v[1:].isdigit()), key=lambda v: int(v[1:]))
+    for version in versions[:max(0, len(versions) - keep)]:
+        if version != live_version:
+            # Workers still holding it keep their memory maps; the files just lose their names
+            shutil.rmtree(os.path.join(root, version))
+
+
+class VectorStoreSnapshot:
+    """
+    One immutable, self-consistent build of the vector store: FAISS index,
+    columnar catalog and the arrays derived from it. Requests hold on to
+    the snapshot they started with, so a hot reload never mixes ids from
+    two builds; the memory maps stay valid until the last holder drops it.
+    """
+
+    def __init__(self, directory, version=BASE_VERSION, verify=False):
+        index_path = os.path.join(directory, 'faiss_index.bin')
+        catalog_dir = os.path.join(directory, 'catalog')
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"FAISS index not found at {index_path}")
+
+        self.directory = directory
+        self.version = version
+        self.index, self.index_info = load_index(index_path)
+        self.metric = self.index_info['metric']
+
+        # Memory-map the columnar catalog (vectors + string columns); rows are
+        # decoded on access and the pages are shared between workers
+        self.store = ColumnarStore(catalog_dir, verify=verify)
+        if self.store.dimension != self.index.d:
+            raise ValueError(
+                f"Catalog dimension {self.store.dimension} does not match index dimension {self.index.d}"
+            )
+        self.metadata = MetadataView(self.store)
+        n = len(self.store)
+
+        # Per-assessment test-type bitmasks and URL ids for array-based balancing
+        masks_path = os.path.join(directory, 'test_type_masks.npy')
+        url_ids_path = os.path.join(directory, 'url_ids.npy')
+        if os.path.exists(masks_path) and os.path.exists(url_ids_path):
+            self.type_masks = np.load(masks_path, mmap_mode='r')
+            self.url_ids = np.load(url_ids_path, mmap_mode='r')
+        else:
+            self.type_masks = build_type_masks(self.store.columns['test_type'][i].split() for i in range(n))
+            self.url_ids = build_url_ids(self.store.columns['url'][i] for i in range(n))
+
+        # Stable ids: an IndexIDMap returns these, which are mapped back to catalog rows
+        self.id_map = bool(self.index_info.get('id_map'))
+        self.stable_ids = None
+        if self.id_map:
+            stable_ids_path = os.path.join(directory, 'stable_ids.npy')
+            if os.path.exists(stable_ids_path):
+                self.stable_ids = np.load(stable_ids_path)
+            else:
+                self.stable_ids = assign_stable_ids(self.store.columns['url'][i] for i in range(n))
+            self._id_order = np.argsort(self.stable_ids, kind='stable')
+            self._sorted_ids = self.stable_ids[self._id_order]
+
+        # Duration / job level / language / remote arrays behind filtered search
+        attributes_dir = os.path.join(directory, 'attributes')
+        if os.path.exists(os.path.join(attributes_dir, 'vocab.json')):
+            self.attributes = AttributeIndex.load(attributes_dir, self.type_masks)
+        else:
+            self.attributes = AttributeIndex.build(self.store, self.type_masks)
+
+        # BM25 postings built next to the FAISS index (or from the catalog if missing)
+        bm25_dir = os.path.join(directory, 'bm25')
+        if os.path.exists(os.path.join(bm25_dir, 'vocab.json')):
+            self.bm25 = BM25Index.load(bm25_dir)
+        else:
+            self.bm25 = BM25Index.build([self.store.columns['embedding_text'][i] for i in range(n)])
+
+        # Optional per-field vectors (faiss_index.py --fields) for DENSE_INDEX=fields
+        field_dir = os.path.join(directory, FIELD_INDEX_DIR)
+        self.field_index = None
+        if os.path.exists(os.path.join(field_dir, 'manifest.json')):
+            self.field_index = FieldIndex.load(field_dir)
+            if self.field_index.n_docs != n:
+                raise ValueError(f"Field index in {field_dir} covers {self.field_index.n_docs} assessments, "
+                                 f"the catalog has {n}; rebuild it")
+
+    @classmethod
+    def load_current(cls, vector_store_dir, verify=False):
+        version = current_version(vector_store_dir)
+        return cls(snapshot_dir(vector_store_dir, version), version=version, verify=verify)
+
+    def __len__(self):
+        return len(self.store)
+
+    def fingerprint(self):
+        """Changes whenever the index or metadata files are rebuilt"""
+        parts = [self.version]
+        for name in ('faiss_index.bin', os.path.join('catalog', 'manifest.json')):
+            stat = os.stat(os.path.join(self.directory, name))
+            parts.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+        return '|'.join(parts)
+
+    def filter_mask(self, filters):
+        """
+        Boolean mask of the assessments passing `filters` (see
+        AttributeIndex.mask), or None when nothing is excluded
+        """
+        allowed = self.attributes.mask(filters)
+        if allowed is None or allowed.all():
+            return None
+        return allowed
+
+    def dense_search(self, query_embeddings, top_k, allowed=None):
+        query_embeddings = prepare_vectors(query_embeddings, self.metric)
+        if allowed is None:
+            return self.index.search(query_embeddings, top_k)
+        # The ID selector is checked during the scan, so only allowed ids fill the top_k
+        params = filter_parameters(self.index, self.index_info['index_type'], allowed, self.stable_ids)
+        return self.index.search(query_embeddings, top_k, params=params)
+
+    def valid_dense(self, row_indices, row_distances):
+        """Drops FAISS -1 padding, maps stable ids to rows and distances to similarity scores"""
+        if self.id_map:
+            positions = np.searchsorted(self._sorted_ids, row_indices)
+            positions = np.minimum(positions, len(self._sorted_ids) - 1)
+            valid = (row_indices >= 0) & (self._sorted_ids[positions] == row_indices)
+            rows = self._id_order[positions[valid]]
+        else:
+            valid = (row_indices >= 0) & (row_indices < len(self.metadata))
+            rows = row_indices[valid]
+        return rows.astype('int64'), distances_to_scores(row_distances[valid], self.metric)
+
+    def candidates(self, ids, scores):
+        return [
+            {'metadata': self.metadata[idx], 'similarity_score': float(score)}
+            for idx, score in zip(ids, scores)
+        ]
+
+    def select(self, ids, scores, required_types, target_count):
+        """Balanced selection over precomputed per-assessment type bitmasks"""
+        required_mask = type_mask(required_types) if required_types else None
+        return select_balanced(scores, self.type_masks[ids], self.url_ids[ids], required_mask, target_count)
@@ -1,48 +1,179 @@
-import pickle
-import faiss
+import os
+import sys
+import time
+import shutil
+import argparse
 import numpy as np
 
-def build_faiss_index():
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from columnar_store import ColumnarStore, DEFAULT_CATALOG_DIR, MANIFEST_FILE
+from ann_index import INDEX_TYPES, METRICS, build_index, prepare_vectors, save_index
+from bm25 import BM25Index
+from balancing import build_type_masks, build_url_ids
+from attribute_filters import AttributeIndex
+from embedding_store import EmbeddingStore
+from providers import get_embedder
+from field_index import FieldIndex, FIELD_INDEX_DIR
+from vector_snapshot import (assign_stable_ids, variant_dir, current_version, snapshot_dir, build_catalog_dir,
+                             next_version, publish_snapshot, prune_snapshots)
+
+EMBED_BATCH_SIZE = 100
+
+def embed_texts(texts, embedder, model):
+    """Embeddings for new / edited texts, through the content-addressed EmbeddingStore"""
+    if embedder.model != model:
+        raise ValueError(f"Catalog was embedded with {model}, but the embedder is {embedder.model}")
+    if not embedder.cacheable:
+        return np.vstack(embedder.embed_many(texts)).astype('float32')
+
+    store = EmbeddingStore()
+    vectors = store.get_many(model, texts)
+    missing = list(dict.fromkeys(t for t, e in zip(texts, vectors) if e is None))
+    fresh = {}
+    for i in range(0, len(missing), EMBED_BATCH_SIZE):
+        chunk = missing[i:i + EMBED_BATCH_SIZE]
+        chunk_vectors = embedder.embed_many(chunk)
+        store.put_many(model, chunk, chunk_vectors)
+        fresh.update(zip(chunk, chunk_vectors))
+    print(f"  Embedded {len(missing)} texts ({len(texts) - len(missing)} from the embedding cache)")
+    return np.vstack([fresh[t] if e is None else e for t, e in zip(texts, vectors)]).astype('float32')
+
+def save_field_index(store, out_dir, embedder):
+    """Per-field (name / description / job levels) vectors for DENSE_INDEX=fields"""
+    fields = FieldIndex.build(store, lambda texts: embed_texts(texts, embedder, store.model))
+    fields.save(os.path.join(out_dir, FIELD_INDEX_DIR))
+    print(f"✅ Saved field index ({len(fields.owners)} vectors for {len(fields.doc_rows)} assessments, "
+          f"{fields.memory_bytes() / 1e6:.1f} MB) to {FIELD_INDEX_DIR}/")
+
+def save_side_indexes(store, out_dir='.'):
+    """BM25 postings, balancing arrays and filter attributes derived from the catalog"""
+    n = len(store)
+
+    # BM25 postings over embedding_text for hybrid retrieval
+    bm25 = BM25Index.build([store.columns['embedding_text'][i] for i in range(n)])
+    bm25.save(os.path.join(out_dir, 'bm25'))
+    print(f"✅ Saved BM25 index ({len(bm25.vocab)} terms, {len(bm25.doc_ids)} postings) to bm25/")
+
+    # Test-type bitmasks and URL ids for the array-based balancing stage
+    type_masks = build_type_masks(store.columns['test_type'][i].split() for i in range(n))
+    np.save(os.path.join(out_dir, 'test_type_masks.npy'), type_masks)
+    np.save(os.path.join(out_dir, 'url_ids.npy'), build_url_ids(store.columns['url'][i] for i in range(n)))
+    print("✅ Saved test_type_masks.npy and url_ids.npy")
+
+    # Duration / job level / language / remote arrays for filtered search
+    attributes = AttributeIndex.build(store, type_masks)
+    attributes.save(os.path.join(out_dir, 'attributes'))
+    print(f"✅ Saved filter attributes ({int((attributes.duration >= 0).sum())} with duration, "
+          f"{len(attributes.languages)} languages) to attributes/")
+
+def index_info(index, index_type, metric, params, store):
+    """Sidecar describing how the index was built, so RetrievalEngine loads it to match"""
+    return {
+        'index_type': index_type,
+        'metric': metric,
+        'params': params,
+        'count': int(index.ntotal),
+        'dimension': int(store.dimension),
+        'model': store.model,
+        'id_map': True
+    }
+
+def build_faiss_index(catalog_dir=DEFAULT_CATALOG_DIR, index_type='flat', metric='l2', out_dir='.',
+                      field_embedder=None, **params):
     print("="*60)
     print("Building FAISS Vector Index")
     print("="*60)
-    
-    # Load embeddings
-    with open('embeddings.pkl', 'rb') as f:
-        embeddings_data = pickle.load(f)
-    
-    print(f"Loaded {len(embeddings_data)} embeddings")
-    
-    # Extract vectors
-    vectors = np.array([item['embedding'] for item in embeddings_data]).astype('float32')
-    
+
+    # Load embeddings (memory-mapped float32 matrix from the catalog)
+    store = ColumnarStore(catalog_dir, verify=True)
+
+    print(f"Loaded {len(store)} embeddings ({store.model})")
+
+    # Extract vectors (normalized when building a cosine index)
+    vectors = prepare_vectors(store.vectors, metric)
+
     print(f"Vector shape: {vectors.shape}")
-    
-    # Build FAISS index (using L2 distance)
-    dimension = vectors.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(vectors)
-    
-    print(f"✅ Added {index.ntotal} vectors to FAISS index")
-    
-    # Save index
-    faiss.write_index(index, 'faiss_index.bin')
-    print("✅ Saved FAISS index to faiss_index.bin")
-    
-    # Save metadata separately (for quick lookup)
-    metadata = [{
-        'id': item['id'],
-        'name': item['name'],
-        'url': item['url'],
-        'test_type': item['test_type'],
-        'test_type_full': item['test_type_full']
-    } for item in embeddings_data]
-    
-    with open('metadata.pkl', 'wb') as f:
-        pickle.dump(metadata, f)
-    
-    print("✅ Saved metadata to metadata.pkl")
+
+    # Stable URL-derived ids, so update_index.py can upsert / delete single rows later
+    stable_ids = assign_stable_ids(store.columns['url'][i] for i in range(len(store)))
+
+    # Build the selected FAISS backend
+    start = time.perf_counter()
+    index, params = build_index(vectors, index_type=index_type, metric=metric, ids=stable_ids, **params)
+
+    print(f"✅ Added {index.ntotal} vectors to {index_type}/{metric} index in {time.perf_counter() - start:.2f}s")
+
+    # Save index + sidecar describing how it was built, so RetrievalEngine loads it to match
+    save_index(index, os.path.join(out_dir, 'faiss_index.bin'), index_info(index, index_type, metric, params, store))
+    np.save(os.path.join(out_dir, 'stable_ids.npy'), stable_ids)
+    print("✅ Saved FAISS index to faiss_index.bin (+ faiss_index.json, stable_ids.npy)")
+
+    save_side_indexes(store, out_dir)
+    if field_embedder is not None:
+        save_field_index(store, out_dir, field_embedder)
+
+    # Metadata (name/url/test_type) is read straight from the catalog columns
     print("\n✅ Vector store ready!")
 
+def build_snapshot(vector_store_dir, keep=3, field_embedder=None, **index_args):
+    """
+    Full rebuild, published like update_index.py does: the catalog from
+    embeddings.py (build/catalog), or the live snapshot's catalog when
+    there is none, is indexed into a new snapshots/vN, then CURRENT is
+    switched to it. A running API hot-reloads it; nothing live is rewritten.
+    """
+    source = build_catalog_dir(vector_store_dir)
+    from_build = os.path.exists(os.path.join(source, MANIFEST_FILE))
+    if not from_build:
+        source = os.path.join(snapshot_dir(vector_store_dir, current_version(vector_store_dir)), 'catalog')
+
+    version = next_version(vector_store_dir)
+    out_dir = snapshot_dir(vector_store_dir, version)
+    os.makedirs(out_dir)
+    try:
+        build_faiss_index(catalog_dir=source, out_dir=out_dir, field_embedder=field_embedder, **index_args)
+        if from_build:
+            # Consumed: a later re-index starts from the live catalog again
+            os.rename(source, os.path.join(out_dir, 'catalog'))
+        else:
+            shutil.copytree(source, os.path.join(out_dir, 'catalog'))
+    except BaseException:
+        shutil.rmtree(out_dir, ignore_errors=True)
+        raise
+
+    publish_snapshot(vector_store_dir, version)
+    prune_snapshots(vector_store_dir, version, keep)
+    print(f"✅ Published snapshot {version} from {'the new build' if from_build else 'the live'} catalog")
+    return version
+
 if __name__ == "__main__":
-    build_faiss_index()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the FAISS index from the catalog")
+    parser.add_argument('--type', default='flat', choices=INDEX_TYPES)
+    parser.add_argument('--metric', default='l2', choices=METRICS)
+    parser.add_argument('--nlist', type=int, help="IVF: number of inverted lists")
+    parser.add_argument('--nprobe', type=int, help="IVF: lists probed per query")
+    parser.add_argument('--pq-m', type=int, help="IVF-PQ: sub-quantizers (must divide dimension)")
+    parser.add_argument('--hnsw-m', type=int, help="HNSW: graph degree")
+    parser.add_argument('--ef-search', type=int, help="HNSW: search beam width")
+    parser.add_argument('--variant', help="build variants/<name>/ from its own catalog (embeddings.py "
+                                          "--embedder local prints the name)")
+    parser.add_argument('--fields', action='store_true', help="also embed name / description / job levels "
+                                                              "separately for DENSE_INDEX=fields, with the "
+                                                              "EMBEDDER the catalog was built with")
+    parser.add_argument('--keep', type=int, default=3, help="snapshots to keep on disk")
+    args = parser.parse_args()
+    if args.keep < 1:
+        parser.error("--keep must be at least 1")
+
+    build_snapshot(
+        variant_dir(os.path.dirname(os.path.abspath(__file__)), args.variant),
+        keep=args.keep,
+        field_embedder=get_embedder() if args.fields else None,
+        index_type=args.type,
+        metric=args.metric,
+        nlist=args.nlist,
+        nprobe=args.nprobe,
+        pq_m=args.pq_m,
+        M=args.hnsw_m,
+        ef_search=args.ef_search
+    )
@@ -0,0 +1,130 @@
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import faiss
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from columnar_store import ColumnarStore, STRING_COLUMNS, write_store
+from ann_index import build_index, prepare_vectors, save_index, supports_remove
+from providers import get_embedder
+from vector_snapshot import (VectorStoreSnapshot, assign_stable_ids, snapshot_dir, publish_snapshot,
+                             next_version, prune_snapshots)
+from faiss_index import save_side_indexes, save_field_index, embed_texts, index_info
+
+VECTOR_STORE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ASSESSMENTS = os.path.join(VECTOR_STORE_DIR, '..', '..', 'data', 'processed_assessments.json')
+
+def catalog_record(assessment):
+    record = {column: assessment.get(column, '') for column in STRING_COLUMNS}
+    if isinstance(record['test_type'], list):
+        record['test_type'] = ' '.join(record['test_type'])
+    return record
+
+def update_vector_store(assessments, vector_store_dir=VECTOR_STORE_DIR, embedder=None, keep=3):
+    """
+    Applies the difference between `assessments` and the live snapshot as
+    a new snapshot. Rows are matched by URL-derived stable id. Only added
+    rows and rows whose embedding_text changed are re-embedded. The live
+    index is copied, then the stale ids are removed and the new vectors
+    upserted; HNSW, and indexes built before stable ids existed, are
+    rebuilt from the vectors instead. Catalog and side indexes are
+    rewritten, which is cheap. CURRENT is switched last, so a running API
+    picks up either the old snapshot or the complete new one.
+
+    Returns the new version, or None when nothing changed.
+    """
+    print("="*60)
+    print("Updating FAISS Vector Index")
+    print("="*60)
+
+    current = VectorStoreSnapshot.load_current(vector_store_dir)
+    old_store = current.store
+    old_ids = (current.stable_ids if current.id_map
+               else assign_stable_ids(old_store.columns['url'][i] for i in range(len(old_store))))
+    old_rows = {int(sid): row for row, sid in enumerate(old_ids)}
+
+    records = [catalog_record(a) for a in assessments]
+    new_ids = assign_stable_ids(r['url'] for r in records)
+
+    added, changed, kept = [], [], []
+    metadata_changed = False
+    for row, (sid, record) in enumerate(zip(new_ids, records)):
+        old_row = old_rows.get(int(sid))
+        if old_row is None:
+            added.append(row)
+        elif old_store.columns['embedding_text'][old_row] != record['embedding_text']:
+            changed.append(row)
+        else:
+            kept.append(row)
+            metadata_changed = metadata_changed or old_row != row or any(
+                column in old_store.columns and old_store.columns[column][old_row] != record[column]
+                for column in STRING_COLUMNS
+            )
+    removed = sorted(set(old_rows) - {int(sid) for sid in new_ids})
+
+    print(f"Snapshot {current.version}: {len(added)} added, {len(changed)} changed, "
+          f"{len(removed)} removed, {len(kept)} unchanged")
+    if not (added or changed or removed or metadata_changed):
+        print("✅ Vector store is up to date")
+        return None
+
+    # Vectors: unchanged rows are copied from the live catalog, the rest embedded
+    embedder = embedder or get_embedder()
+    vectors = np.empty((len(records), old_store.dimension), dtype='float32')
+    if kept:
+        vectors[kept] = old_store.vectors[[old_rows[int(new_ids[r])] for r in kept]]
+    upserts = added + changed
+    if upserts:
+        vectors[upserts] = embed_texts([records[r]['embedding_text'] for r in upserts], embedder, old_store.model)
+
+    info = current.index_info
+    index_type, metric = info['index_type'], info['metric']
+    if current.id_map and supports_remove(index_type):
+        # Copy-on-write: the live index object is never touched
+        index = faiss.clone_index(current.index)
+        stale = [int(new_ids[r]) for r in changed] + removed
+        if stale:
+            index.remove_ids(np.array(stale, dtype='int64'))
+        if upserts:
+            index.add_with_ids(prepare_vectors(vectors[upserts], metric), new_ids[upserts])
+        params = info['params']
+        print(f"✅ Upserted {len(upserts)} and deleted {len(stale)} vectors in the {index_type} index")
+    else:
+        index, params = build_index(
+            prepare_vectors(vectors, metric), index_type=index_type, metric=metric, ids=new_ids, **info['params']
+        )
+        print(f"✅ Rebuilt the {index_type} index ({index.ntotal} vectors)")
+
+    version = next_version(vector_store_dir)
+    out_dir = snapshot_dir(vector_store_dir, version)
+    os.makedirs(out_dir)
+    write_store(os.path.join(out_dir, 'catalog'), vectors, records, old_store.model)
+    store = ColumnarStore(os.path.join(out_dir, 'catalog'))
+    save_index(index, os.path.join(out_dir, 'faiss_index.bin'), index_info(index, index_type, metric, params, store))
+    np.save(os.path.join(out_dir, 'stable_ids.npy'), new_ids)
+    save_side_indexes(store, out_dir)
+    if current.field_index is not None:
+        # Field texts are looked up in the embedding cache, so only edited fields cost a call
+        save_field_index(store, out_dir, embedder)
+
+    publish_snapshot(vector_store_dir, version)
+    prune_snapshots(vector_store_dir, version, keep)
+    print(f"\n✅ Published snapshot {version} ({len(records)} assessments)")
+    return version
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply catalog changes to the vector store incrementally")
+    parser.add_argument('--assessments', default=DEFAULT_ASSESSMENTS, help="processed_assessments.json")
+    parser.add_argument('--vector-store', default=VECTOR_STORE_DIR, help="directory holding CURRENT / snapshots")
+    parser.add_argument('--keep', type=int, default=3, help="snapshots to keep on disk")
+    args = parser.parse_args()
+
+    if args.keep < 1:
+        parser.error("--keep must be at least 1")
+
+    with open(args.assessments, 'r', encoding='utf-8') as f:
+        assessments = json.load(f)
+
+    update_vector_store(assessments, vector_store_dir=args.vector_store, keep=args.keep)
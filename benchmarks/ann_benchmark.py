@@ -0,0 +1,112 @@
+# benchmarks/ann_benchmark.py
+#
+# Recall-vs-latency comparison of the FAISS backends in api/ann_index.py
+# on synthetic catalogs. Example:
+#   python ann_benchmark.py --sizes 1000,10000,100000 --dim 768
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import numpy as np
+import faiss
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+from ann_index import INDEX_TYPES, build_index, prepare_vectors
+
+def synthetic_catalog(n, dim, n_queries, seed=0):
+    """
+    Gaussian clusters rather than uniform noise - real embedding catalogs are
+    clustered, and uniform data makes every ANN backend look worse than it is
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = max(8, int(np.sqrt(n)))
+    centers = rng.standard_normal((n_clusters, dim)).astype('float32')
+    labels = rng.integers(0, n_clusters, n + n_queries)
+    points = centers[labels] + 0.35 * rng.standard_normal((n + n_queries, dim)).astype('float32')
+    return points[:n], points[n:]
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def recall_at_k(found, truth, k):
+    hits = sum(len(set(f[:k]) & set(t[:k])) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+def bench_backend(index_type, metric, base, queries, truth, k):
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    index, params = build_index(base, index_type=index_type, metric=metric)
+    build_seconds = time.perf_counter() - start
+
+    # Single-query latency, as served by /recommend
+    latencies = []
+    found = []
+    for q in queries:
+        t0 = time.perf_counter()
+        _, ids = index.search(q.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found.append(ids[0])
+
+    return {
+        'index_type': index_type,
+        'metric': metric,
+        'params': params,
+        'build_s': round(build_seconds, 3),
+        'index_mb': round(faiss.serialize_index(index).nbytes / 2**20, 2),
+        'peak_rss_growth_mb': round(peak_rss_mb() - rss_before, 1),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+        f'recall@{k}': round(recall_at_k(found, truth, k), 4)
+    }
+
+def run(sizes, dim, n_queries, k, metric, backends):
+    report = []
+    for n in sizes:
+        print(f"\n=== {n:,} vectors x {dim} dims ({metric}) ===")
+        base, queries = synthetic_catalog(n, dim, n_queries)
+        base = prepare_vectors(base, metric)
+        queries = prepare_vectors(queries, metric)
+
+        # Ground truth from the exact flat index
+        flat, _ = build_index(base, index_type='flat', metric=metric)
+        _, truth = flat.search(queries, k)
+        del flat
+
+        print(f"{'backend':<10} {'build s':>9} {'index MB':>9} {'p50 ms':>8} {'p99 ms':>8} {'recall':>7}")
+        for index_type in backends:
+            result = bench_backend(index_type, metric, base, queries, truth, k)
+            result['n'] = n
+            result['dim'] = dim
+            report.append(result)
+            print(f"{index_type:<10} {result['build_s']:>9.2f} {result['index_mb']:>9.1f} "
+                  f"{result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f} {result[f'recall@{k}']:>7.3f}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark FAISS backends on synthetic catalogs")
+    parser.add_argument('--sizes', default='1000,10000,100000', help="comma-separated catalog sizes (up to 1000000)")
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--metric', default='l2', choices=['l2', 'cosine'])
+    parser.add_argument('--backends', default=','.join(INDEX_TYPES))
+    parser.add_argument('--output', help="write the JSON report here")
+    args = parser.parse_args()
+
+    report = run(
+        sizes=[int(s) for s in args.sizes.split(',')],
+        dim=args.dim,
+        n_queries=args.queries,
+        k=args.k,
+        metric=args.metric,
+        backends=args.backends.split(',')
+    )
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report saved to {args.output}")
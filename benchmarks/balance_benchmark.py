@@ -0,0 +1,132 @@
+# benchmarks/balance_benchmark.py
+#
+# Result assembly + test-type balancing: the original dict/sort
+# implementation vs. the bitmask/partial-sort one in api/balancing.py.
+# Checks both return the same assessments, then times them per pool size.
+#   python balance_benchmark.py --pools 100,1000,10000,100000
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+from balancing import build_type_masks, build_url_ids, type_mask, select_balanced
+
+LETTERS = list('ABCDEKPS')
+
+def reference_balance(candidates, required_types, target_count=10):
+    """RetrievalEngine.balance_by_test_type as it was before the array rewrite"""
+    if not required_types or len(required_types) == 0:
+        return sorted(candidates, key=lambda x: x['similarity_score'], reverse=True)[:target_count]
+
+    sorted_candidates = sorted(candidates, key=lambda x: x['similarity_score'], reverse=True)
+
+    balanced = []
+    seen_urls = set()
+
+    type_counts = {t: 0 for t in required_types}
+    min_per_type = 2
+
+    for candidate in sorted_candidates:
+        if len(balanced) >= target_count:
+            break
+
+        meta = candidate['metadata']
+        url = meta['url']
+
+        if url in seen_urls:
+            continue
+
+        candidate_types = [t for t in meta['test_type'] if t in required_types]
+
+        if candidate_types:
+            needs_balance = any(type_counts[t] < min_per_type for t in candidate_types)
+
+            if needs_balance or len(balanced) < target_count:
+                balanced.append(candidate)
+                seen_urls.add(url)
+
+                for t in candidate_types:
+                    if t in type_counts:
+                        type_counts[t] += 1
+
+    for candidate in sorted_candidates:
+        if len(balanced) >= target_count:
+            break
+
+        url = candidate['metadata']['url']
+        if url not in seen_urls:
+            balanced.append(candidate)
+            seen_urls.add(url)
+
+    return balanced[:target_count]
+
+def synthetic_catalog(n, rng):
+    metadata = []
+    for i in range(n):
+        types = list(rng.choice(LETTERS, size=rng.integers(1, 4), replace=False))
+        metadata.append({
+            'id': i,
+            'name': f"Assessment {i}",
+            # ~2% duplicate URLs to exercise de-duplication
+            'url': f"https://example.com/{i if rng.random() > 0.02 else i // 2}",
+            'test_type': types
+        })
+    return metadata
+
+def run_reference(metadata, ids, scores, required_types, target):
+    # Old result assembly: one dict per FAISS hit, then the sort-based balancing
+    candidates = [{'metadata': metadata[i], 'similarity_score': float(s)} for i, s in zip(ids, scores)]
+    return [c['metadata']['id'] for c in reference_balance(candidates, required_types, target)]
+
+def run_arrays(metadata, masks, url_ids, ids, scores, required_types, target):
+    required_mask = type_mask(required_types) if required_types else None
+    positions = select_balanced(scores, masks[ids], url_ids[ids], required_mask, target)
+    # New result assembly: metadata only for the selected rows
+    return [metadata[ids[p]]['id'] for p in positions]
+
+def time_call(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return float(np.median(samples))
+
+def main(pools, target, repeats, seed):
+    rng = np.random.default_rng(seed)
+    catalog_size = max(pools)
+    metadata = synthetic_catalog(catalog_size, rng)
+    masks = build_type_masks(m['test_type'] for m in metadata)
+    url_ids = build_url_ids(m['url'] for m in metadata)
+
+    print(f"{'pool':>8} {'required':>9} {'reference us':>13} {'arrays us':>10} {'speed-up':>9}")
+    for pool in pools:
+        for required_types in ([], ['K'], ['P', 'A'], ['S']):
+            ids = rng.choice(catalog_size, size=pool, replace=False)
+            # Coarse scores so ties (and their ordering) are exercised too
+            scores = np.round(rng.random(pool), 3).astype('float32')
+
+            expected = run_reference(metadata, ids, scores, required_types, target)
+            actual = run_arrays(metadata, masks, url_ids, ids, scores, required_types, target)
+            if expected != actual:
+                raise AssertionError(f"Mismatch for pool={pool} required={required_types}")
+
+            ref_us = time_call(lambda: run_reference(metadata, ids, scores, required_types, target), repeats)
+            arr_us = time_call(lambda: run_arrays(metadata, masks, url_ids, ids, scores, required_types, target), repeats)
+            label = ''.join(required_types) or '-'
+            print(f"{pool:>8} {label:>9} {ref_us:>13.1f} {arr_us:>10.1f} {ref_us / arr_us:>8.1f}x")
+
+    print("\n✅ Both implementations selected identical results")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark test-type balancing implementations")
+    parser.add_argument('--pools', default='100,1000,10000,100000')
+    parser.add_argument('--target', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    main([int(p) for p in args.pools.split(',')], args.target, args.repeats, args.seed)
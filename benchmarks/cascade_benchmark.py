@@ -0,0 +1,126 @@
+# benchmarks/cascade_benchmark.py
+#
+# Fixed 100-candidate first stage vs the adaptive-depth cascade, each
+# with and without a local reranker, on the labelled Gen_AI Dataset.csv:
+# Mean Recall@10, average candidate depth, expansions by reason and the
+# search + rerank + balance latency per query (embeddings and analyses
+# are computed once up front, so only the ranking stages are timed).
+# "saved" is against the fixed depth with the same reranker.
+#   python cascade_benchmark.py --depths 20,50,100 --rerankers none,features --output cascade.json
+#   EMBEDDER=fake python cascade_benchmark.py            # offline
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+# Read at import by the api modules
+os.environ.setdefault('QUERY_ANALYZER', 'fake')
+os.environ.setdefault('ANALYZER_MODE', 'local')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('SEMANTIC_CACHE', '0')
+os.environ.setdefault('VECTOR_STORE_RELOAD_INTERVAL', '0')
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BENCH_DIR, '..', 'api'))
+sys.path.append(os.path.join(BENCH_DIR, '..', 'evaluation'))
+from retrieval_engine import RetrievalEngine
+from cascade import get_reranker
+from evaluation import load_labels, normalize_url, recall_at_k
+
+DATASET = os.path.join(BENCH_DIR, '..', 'evaluation', 'Gen_AI Dataset.csv')
+
+def latency_summary(values_ms):
+    return {
+        'p50_ms': round(float(np.percentile(values_ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(values_ms, 95)), 3),
+        'mean_ms': round(float(np.mean(values_ms)), 3)
+    }
+
+def bench_setting(engine, labels, inputs, repeats, k, cascade, reranker_name):
+    engine.CASCADE = cascade
+    engine.RERANKER = reranker_name
+    engine.reranker = get_reranker(reranker_name)
+    if hasattr(engine.reranker, 'connect'):
+        engine.reranker.connect()
+
+    recalls = []
+    for (query, analysis, embedding), relevant in zip(inputs, labels.values()):
+        recommendations = engine._rank(query, analysis, embedding, k)
+        predicted = [normalize_url(r['assessment_url']) for r in recommendations]
+        recalls.append(recall_at_k(predicted, relevant, k))
+
+    # Timed passes; the stats cover these only
+    engine.cascade_stats.reset()
+    latencies = []
+    for _ in range(repeats):
+        for query, analysis, embedding in inputs:
+            start = time.perf_counter()
+            engine._rank(query, analysis, embedding, k)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    stats = engine.cascade_stats.get_stats()
+    return {
+        'setting': f"{'cascade' if cascade else 'fixed'}+{reranker_name}",
+        f'recall@{k}': round(float(np.mean(recalls)), 4),
+        'avg_depth': round(stats['avg_depth'], 1) if cascade else engine.CANDIDATE_POOL,
+        'expansions': stats['expansions'],
+        'avg_rescored': round(stats['avg_rescored'], 1),
+        'rerank_truncated': stats['rerank_truncated'],
+        'rank': latency_summary(latencies)
+    }
+
+def run(dataset, depths, rerankers, flat_gap, budget_ms, repeats, k):
+    labels = load_labels(dataset)
+    print(f"{len(labels)} labelled queries from {os.path.basename(dataset)}")
+
+    engine = RetrievalEngine()
+    engine.CASCADE_DEPTHS = depths
+    engine.CASCADE_FLAT_GAP = flat_gap
+    engine.CASCADE_SHADOW_RATE = 0
+    engine.RERANK_BUDGET_MS = budget_ms
+    inputs = [(q, engine.analyze_query_with_llm(q), engine.embed_search_query(q)) for q in labels]
+
+    report = {'dataset': dataset, 'mode': engine.RETRIEVAL_MODE, 'depths': depths, 'flat_gap': flat_gap,
+              'rerank_budget_ms': budget_ms, 'settings': []}
+    for reranker_name in rerankers:
+        baseline = None  # fixed-depth latency with the same reranker
+        for cascade in (False, True):
+            try:
+                result = bench_setting(engine, labels, inputs, repeats, k, cascade, reranker_name)
+            except Exception as e:
+                # e.g. sentence-transformers or the cross-encoder weights missing
+                print(f"  ⚠ {reranker_name}: skipped ({type(e).__name__}: {e})")
+                break
+            baseline = baseline or result['rank']['mean_ms']
+            result['saved_ms'] = round(baseline - result['rank']['mean_ms'], 3)
+            report['settings'].append(result)
+            rank = result['rank']
+            print(f"  {result['setting']:<26} recall@{k} {result[f'recall@{k}']:.4f}  "
+                  f"depth {result['avg_depth']:>5}  expansions {result['expansions']}  "
+                  f"rank p50 {rank['p50_ms']:>6.3f}  p95 {rank['p95_ms']:>6.3f} ms  "
+                  f"saved {result['saved_ms']:>+7.3f} ms/query")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fixed-depth vs cascade ranking, with and without reranking")
+    parser.add_argument('--dataset', default=DATASET)
+    parser.add_argument('--depths', default=os.environ.get('CASCADE_DEPTHS', '20,50,100'))
+    parser.add_argument('--rerankers', default='none,features', help="comma-separated: none, features, "
+                                                                      "cross-encoder")
+    parser.add_argument('--flat-gap', type=float, default=float(os.environ.get('CASCADE_FLAT_GAP', 0.02)))
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('RERANK_BUDGET_MS', 25)))
+    parser.add_argument('--repeats', type=int, default=20, help="timed passes over the queries")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--output', help="write the JSON report here")
+    args = parser.parse_args()
+
+    report = run(args.dataset, [int(d) for d in args.depths.split(',')], args.rerankers.split(','),
+                 args.flat_gap, args.budget_ms, args.repeats, args.k)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report saved to {args.output}")
@@ -0,0 +1,129 @@
+# benchmarks/embedding_benchmark.py
+#
+# Hosted vs local query embedding on the labelled Gen_AI Dataset.csv:
+# per-query embed latency (sequential, and under concurrency where the
+# local model micro-batches), then Mean Recall@10 with each backend
+# searching its own index variant, for dense-only and hybrid candidates.
+# Query analysis is the local keyword analyzer, so only the embedding
+# differs between rows. Backends: gemini, fake, local[:torch|onnx|onnx-int8]
+#   python embedding_benchmark.py --backends gemini,local,local:onnx-int8 --output embeddings.json
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Read at import by the api modules
+os.environ.setdefault('QUERY_ANALYZER', 'fake')
+os.environ.setdefault('ANALYZER_MODE', 'local')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BENCH_DIR, '..', 'api'))
+sys.path.append(os.path.join(BENCH_DIR, '..', 'evaluation'))
+from providers import get_embedder
+from retrieval_engine import RetrievalEngine
+from evaluation import load_labels, normalize_url, recall_at_k
+
+DATASET = os.path.join(BENCH_DIR, '..', 'evaluation', 'Gen_AI Dataset.csv')
+
+def make_embedder(spec):
+    """'local:onnx-int8' -> LocalEmbedder(runtime='onnx-int8'); anything else by backend name"""
+    name, _, runtime = spec.partition(':')
+    if name == 'local':
+        from local_embedder import LocalEmbedder
+        return LocalEmbedder(runtime=runtime or 'torch')
+    return get_embedder(name)
+
+def latency_summary(values_ms):
+    return {
+        'p50_ms': round(float(np.percentile(values_ms, 50)), 2),
+        'p95_ms': round(float(np.percentile(values_ms, 95)), 2),
+        'mean_ms': round(float(np.mean(values_ms)), 2)
+    }
+
+def time_embed(embedder, queries, concurrency):
+    """Uncached embed() latencies, one query per call, `concurrency` calls in flight"""
+    def one(query):
+        start = time.perf_counter()
+        embedder.embed(query)
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        latencies = [one(q) for q in queries]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(one, queries))
+    result = latency_summary(latencies)
+    result['qps'] = round(len(queries) / (time.perf_counter() - start), 1)
+    return result
+
+def mean_recall(engine, labels, k):
+    recalls = []
+    for query, relevant in labels.items():
+        recommendations, _ = engine.retrieve_timed(query, top_k=k)
+        predicted = [normalize_url(r['assessment_url']) for r in recommendations]
+        recalls.append(recall_at_k(predicted, relevant, k))
+    return round(float(np.mean(recalls)), 4)
+
+def bench_backend(spec, labels, repeats, concurrency, k):
+    embedder = make_embedder(spec)
+    if hasattr(embedder, 'connect'):
+        embedder.connect()
+    engine = RetrievalEngine(embedder=embedder)
+    queries = list(labels) * repeats
+
+    result = {
+        'backend': spec,
+        'model': embedder.model,
+        'index': os.path.relpath(engine.vector_store_dir, os.path.join(BENCH_DIR, '..')),
+        'index_model': engine.index_info.get('model'),
+        'embed_sequential': time_embed(embedder, queries, 1),
+        'embed_concurrent': time_embed(embedder, queries, concurrency)
+    }
+    for mode in ('dense', 'hybrid'):
+        engine.RETRIEVAL_MODE = mode
+        result[f'recall@{k}_{mode}'] = mean_recall(engine, labels, k)
+    return result
+
+def run(specs, dataset, repeats, concurrency, k):
+    labels = load_labels(dataset)
+    print(f"{len(labels)} labelled queries from {os.path.basename(dataset)}")
+
+    report = {'dataset': dataset, 'concurrency': concurrency, 'backends': []}
+    for spec in specs:
+        try:
+            result = bench_backend(spec, labels, repeats, concurrency, k)
+        except Exception as e:
+            # Missing package, model file, API key or index variant
+            print(f"  ⚠ {spec}: skipped ({type(e).__name__}: {e})")
+            continue
+        report['backends'].append(result)
+        seq, conc = result['embed_sequential'], result['embed_concurrent']
+        print(f"  {spec:<18} embed p50 {seq['p50_ms']:>7.2f}  p95 {seq['p95_ms']:>7.2f} ms  "
+              f"x{concurrency}: p95 {conc['p95_ms']:>7.2f} ms {conc['qps']:>7.1f} q/s  "
+              f"recall@{k} dense {result[f'recall@{k}_dense']:.4f}  hybrid {result[f'recall@{k}_hybrid']:.4f}  "
+              f"[{result['index']}]")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare hosted and local query embedding backends")
+    parser.add_argument('--backends', default='gemini,local', help="comma-separated: gemini, fake, "
+                                                                    "local, local:onnx, local:onnx-int8")
+    parser.add_argument('--dataset', default=DATASET)
+    parser.add_argument('--repeats', type=int, default=3, help="passes over the queries for latency")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--output', help="write the JSON report here")
+    args = parser.parse_args()
+
+    report = run(args.backends.split(','), args.dataset, args.repeats, args.concurrency, args.k)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report saved to {args.output}")
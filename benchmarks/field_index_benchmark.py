@@ -0,0 +1,164 @@
+# benchmarks/field_index_benchmark.py
+#
+# Single-vector FAISS index vs the per-field index (name / description /
+# job levels, late-interaction scored) on the labelled Gen_AI Dataset.csv:
+# memory of each index, dense search latency per query and for the whole
+# query set as one batch, then Mean Recall@10 for dense-only and hybrid
+# candidates, for each field-weight setting. Both indexes are built into
+# a temporary directory from the live catalog, so the real store is never
+# touched; only the field texts are embedded (through the embedding cache).
+# --embedder fake re-embeds the catalog too and runs offline.
+#   python field_index_benchmark.py --weights "name=0.35,description=0.5,job_levels=0.15;name=1,description=1,job_levels=0"
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import contextlib
+import numpy as np
+import faiss
+
+# Read at import by the api modules
+os.environ.setdefault('QUERY_ANALYZER', 'fake')
+os.environ.setdefault('ANALYZER_MODE', 'local')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('SEMANTIC_CACHE', '0')
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BENCH_DIR, '..', 'api'))
+sys.path.append(os.path.join(BENCH_DIR, '..', 'api', 'vector_store'))
+sys.path.append(os.path.join(BENCH_DIR, '..', 'evaluation'))
+from columnar_store import ColumnarStore, STRING_COLUMNS, write_store
+from providers import get_embedder
+from field_index import parse_field_weights
+from vector_snapshot import variant_dir
+from faiss_index import build_faiss_index
+from evaluation import load_labels, normalize_url, recall_at_k
+
+DATASET = os.path.join(BENCH_DIR, '..', 'evaluation', 'Gen_AI Dataset.csv')
+VECTOR_STORE_DIR = os.path.join(BENCH_DIR, '..', 'api', 'vector_store')
+
+def build_store(embedder, out_dir, reembed):
+    """Catalog (copied, or re-embedded with `embedder`), FAISS index and field index in out_dir"""
+    source = ColumnarStore(os.path.join(variant_dir(VECTOR_STORE_DIR, getattr(embedder, 'index_variant', None)),
+                                        'catalog'))
+    records = [{c: source.columns[c][i] if c in source.columns else '' for c in STRING_COLUMNS}
+               for i in range(len(source))]
+    if reembed:
+        vectors = np.vstack(embedder.embed_many([r['embedding_text'] for r in records]))
+        model = embedder.model
+    else:
+        vectors, model = np.asarray(source.vectors), source.model
+
+    with contextlib.redirect_stdout(sys.stderr):
+        write_store(os.path.join(out_dir, 'catalog'), vectors, records, model)
+        build_faiss_index(catalog_dir=os.path.join(out_dir, 'catalog'), out_dir=out_dir, field_embedder=embedder)
+
+def latency_summary(values_ms):
+    return {
+        'p50_ms': round(float(np.percentile(values_ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(values_ms, 95)), 3),
+        'mean_ms': round(float(np.mean(values_ms)), 3)
+    }
+
+def time_search(engine, snapshot, queries, embeddings, repeats):
+    """Dense candidate search only: one query per call, then every query in one batched call"""
+    top_k = engine.DENSE_CANDIDATES
+    latencies = []
+    for _ in range(repeats):
+        for query, embedding in zip(queries, embeddings):
+            start = time.perf_counter()
+            engine._dense_candidates([query], [embedding], top_k, None, snapshot)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    batch = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        engine._dense_candidates(queries, embeddings, top_k, None, snapshot)
+        batch.append((time.perf_counter() - start) * 1000)
+
+    result = latency_summary(latencies)
+    result['batch_ms_per_query'] = round(float(np.median(batch)) / len(queries), 3)
+    return result
+
+def mean_recall(engine, labels, k):
+    recalls = []
+    for query, relevant in labels.items():
+        recommendations, _ = engine.retrieve_timed(query, top_k=k)
+        predicted = [normalize_url(r['assessment_url']) for r in recommendations]
+        recalls.append(recall_at_k(predicted, relevant, k))
+    return round(float(np.mean(recalls)), 4)
+
+def bench_setting(engine, snapshot, labels, queries, embeddings, repeats, k, name):
+    result = {'index': name, 'search': time_search(engine, snapshot, queries, embeddings, repeats)}
+    for mode in ('dense', 'hybrid'):
+        engine.RETRIEVAL_MODE = mode
+        result[f'recall@{k}_{mode}'] = mean_recall(engine, labels, k)
+    return result
+
+def run(embedder_name, weight_specs, dataset, repeats, k):
+    labels = load_labels(dataset)
+    print(f"{len(labels)} labelled queries from {os.path.basename(dataset)}")
+
+    embedder = get_embedder(embedder_name)
+    out_dir = tempfile.mkdtemp(prefix='field-index-bench-')
+    build_store(embedder, out_dir, reembed=embedder.model.startswith('fake/'))
+
+    os.environ.update(VECTOR_STORE_DIR=out_dir, VECTOR_STORE_RELOAD_INTERVAL='0')
+    from retrieval_engine import RetrievalEngine
+    engine = RetrievalEngine(embedder=embedder)
+    snapshot = engine.snapshot
+    queries = list(labels)
+    embeddings = [engine.embed_search_query(q) for q in queries]
+
+    report = {
+        'dataset': dataset,
+        'embedder': embedder.model,
+        'assessments': len(snapshot),
+        'memory': {
+            'single_bytes': int(len(faiss.serialize_index(snapshot.index))),
+            'fields_bytes': snapshot.field_index.memory_bytes(),
+            'field_vectors': int(len(snapshot.field_index.owners))
+        },
+        'settings': []
+    }
+    memory = report['memory']
+    print(f"  memory: single {memory['single_bytes'] / 1e6:.2f} MB, fields {memory['fields_bytes'] / 1e6:.2f} MB "
+          f"({memory['field_vectors']} vectors for {len(snapshot)} assessments)")
+
+    settings = [('single', None)] + [(spec, parse_field_weights(spec)) for spec in weight_specs]
+    for name, weights in settings:
+        engine.DENSE_INDEX = 'single' if weights is None else 'fields'
+        if weights is not None:
+            engine.FIELD_WEIGHTS = weights
+        result = bench_setting(engine, snapshot, labels, queries, embeddings, repeats, k, name)
+        report['settings'].append(result)
+        search = result['search']
+        print(f"  {name:<48} search p50 {search['p50_ms']:>7.3f}  p95 {search['p95_ms']:>7.3f} ms  "
+              f"batched {search['batch_ms_per_query']:>6.3f} ms/q  "
+              f"recall@{k} dense {result[f'recall@{k}_dense']:.4f}  hybrid {result[f'recall@{k}_hybrid']:.4f}")
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the single-vector and per-field dense indexes")
+    parser.add_argument('--embedder', default=os.environ.get('EMBEDDER', 'gemini'),
+                        help="gemini, or fake to run offline")
+    parser.add_argument('--weights', default="name=0.35,description=0.5,job_levels=0.15",
+                        help="';'-separated FIELD_WEIGHTS settings to compare")
+    parser.add_argument('--dataset', default=DATASET)
+    parser.add_argument('--repeats', type=int, default=5, help="passes over the queries for latency")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--output', help="write the JSON report here")
+    args = parser.parse_args()
+
+    report = run(args.embedder, [s for s in args.weights.split(';') if s.strip()], args.dataset, args.repeats, args.k)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report saved to {args.output}")
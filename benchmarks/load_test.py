@@ -0,0 +1,292 @@
+# benchmarks/load_test.py
+#
+# Load generator and performance regression check for POST /recommend.
+# Replays the queries of evaluation/Gen_AI Dataset.csv (and any --queries
+# .csv / .jsonl files) against the FastAPI app, either in-process through
+# httpx's ASGI transport (no sockets, middleware included) or against a
+# running server (--url). Each step is closed-loop at one --concurrency
+# level, or open-loop at one --rate of Poisson arrivals, with latency
+# measured from the scheduled arrival so queueing counts. Per step: RPS,
+# p50/p95/p99 latency and error rate; together the steps form the
+# saturation curve. In-process runs use the fake backends with simulated
+# upstream latency and the result caches off, so they are reproducible
+# offline.
+#   python load_test.py --concurrency 1,2,4,8,16,32 --save-baseline load_baseline.json
+#   python load_test.py --baseline load_baseline.json --tolerance 0.2     # exits 1 on a regression
+#   python load_test.py --url http://127.0.0.1:8000 --rate 5,10,20,40 --duration 20
+
+import os
+import sys
+import csv
+import json
+import time
+import random
+import asyncio
+import argparse
+import numpy as np
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(BENCH_DIR, '..', 'api')
+DATASET = os.path.join(BENCH_DIR, '..', 'evaluation', 'Gen_AI Dataset.csv')
+
+# Differences beyond --tolerance (relative) in these fail a baseline comparison
+HIGHER_IS_WORSE = ['p50_ms', 'p95_ms', 'p99_ms']
+LOWER_IS_WORSE = ['rps']
+
+def load_queries(paths):
+    """/recommend bodies from .csv files (Query column) and .jsonl files ({"query": ..., "filters": ...})"""
+    bodies = []
+    for path in paths:
+        if path.endswith('.jsonl'):
+            skipped = 0
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line) if line.strip() else {}
+                    if not isinstance(record.get('query'), str):
+                        skipped += 1
+                        continue
+                    bodies.append({k: record[k] for k in ('query', 'filters') if record.get(k) is not None})
+            if skipped:
+                print(f"  ⚠ {os.path.basename(path)}: skipped {skipped} lines without a \"query\"")
+        else:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                queries = dict.fromkeys(row['Query'] for row in csv.DictReader(f))
+            bodies.extend({'query': q} for q in queries)
+    if not bodies:
+        raise ValueError(f"No queries in {paths}")
+    return bodies
+
+def configure_in_process(args):
+    """Backends and caches for the in-process app; read at import by the api modules"""
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ['STARTUP_MODE'] = 'eager'
+    if not args.real_backends:
+        os.environ.update(
+            QUERY_ANALYZER='fake', EMBEDDER='fake', ANALYZER_MODE='llm',
+            FAKE_LLM_LATENCY_MS=str(args.llm_latency_ms), FAKE_LLM_JITTER_MS=str(args.llm_jitter_ms),
+            FAKE_EMBED_LATENCY_MS=str(args.embed_latency_ms), FAKE_EMBED_JITTER_MS=str(args.embed_jitter_ms)
+        )
+    if not args.cache:
+        # Replayed queries would otherwise be answered from the result caches
+        os.environ.update(QUERY_CACHE_SIZE='0', QUERY_CACHE_DB='', SEMANTIC_CACHE='0')
+
+def make_client(args):
+    if args.url:
+        limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+        return httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout)
+
+    configure_in_process(args)
+    sys.path.append(API_DIR)
+    import app as app_module
+    app_module.warm_up()
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app_module.app), base_url="http://load-test",
+                             timeout=args.timeout)
+
+async def wait_ready(client, deadline=120):
+    start = time.perf_counter()
+    while time.perf_counter() - start < deadline:
+        try:
+            if (await client.get('/ready')).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise TimeoutError(f"/ready not answering 200 after {deadline}s")
+
+async def send(client, body, results, scheduled):
+    """One /recommend; records (latency ms since `scheduled`, outcome)"""
+    try:
+        response = await client.post('/recommend', json=body)
+        outcome = response.status_code
+        if outcome == 200 and response.headers.get('X-Degraded'):
+            outcome = 'degraded'
+    except httpx.TimeoutException:
+        outcome = 'timeout'
+    except httpx.TransportError:
+        outcome = 'connection'
+    results.append(((time.perf_counter() - scheduled) * 1000, outcome))
+
+async def closed_loop(client, bodies, concurrency, duration, rng):
+    """`concurrency` users, each sending its next query as soon as the previous one returns"""
+    results = []
+    deadline = time.perf_counter() + duration
+
+    async def user():
+        while time.perf_counter() < deadline:
+            await send(client, rng.choice(bodies), results, time.perf_counter())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return results, time.perf_counter() - start
+
+async def open_loop(client, bodies, rate, duration, rng, max_in_flight):
+    """Poisson arrivals at `rate` per second regardless of how fast responses come back"""
+    results = []
+    tasks = set()
+    start = time.perf_counter()
+    scheduled = start
+    while True:
+        scheduled += rng.expovariate(rate)
+        if scheduled - start >= duration:
+            break
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        if len(tasks) >= max_in_flight:
+            results.append((0.0, 'dropped'))
+            continue
+        task = asyncio.create_task(send(client, rng.choice(bodies), results, scheduled))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+    return results, time.perf_counter() - start
+
+def summarize(kind, level, results, elapsed):
+    ok = [ms for ms, outcome in results if outcome in (200, 'degraded')]
+    outcomes = {}
+    for _, outcome in results:
+        outcomes[str(outcome)] = outcomes.get(str(outcome), 0) + 1
+    errors = len(results) - len(ok)
+    percentile = lambda p: round(float(np.percentile(ok, p)), 1) if ok else None
+    return {
+        'kind': kind,
+        'level': level,
+        'requests': len(results),
+        'rps': round(len(ok) / elapsed, 2),
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'max_ms': round(max(ok), 1) if ok else None,
+        'error_rate': round(errors / len(results), 4) if results else 0.0,
+        'degraded': outcomes.get('degraded', 0),
+        'outcomes': outcomes
+    }
+
+def saturation(steps):
+    """Peak throughput, and the lowest level already reaching 90% of it (the knee of the curve)"""
+    if not steps:
+        return {}
+    peak = max(steps, key=lambda s: s['rps'])
+    knee = next(s for s in steps if s['rps'] >= 0.9 * peak['rps'])
+    return {'peak_rps': peak['rps'], 'peak_level': peak['level'], 'knee_level': knee['level'],
+            'knee_p95_ms': knee['p95_ms']}
+
+def print_step(step):
+    unit = 'users' if step['kind'] == 'concurrency' else 'req/s'
+    print(f"  {step['level']:>6} {unit}  {step['requests']:>6} req  {step['rps']:>8.2f} rps  "
+          f"p50 {step['p50_ms'] or 0:>8.1f}  p95 {step['p95_ms'] or 0:>8.1f}  p99 {step['p99_ms'] or 0:>8.1f} ms  "
+          f"errors {step['error_rate']:.2%}  degraded {step['degraded']}")
+
+async def run(args):
+    bodies = load_queries([DATASET] + args.queries)
+    rng = random.Random(args.seed)
+    client = make_client(args)
+    if args.url:
+        await wait_ready(client)
+
+    kind = 'rate' if args.rate else 'concurrency'
+    levels = [float(r) for r in args.rate.split(',')] if args.rate else \
+        [int(c) for c in args.concurrency.split(',')]
+    target = args.url or 'in-process'
+    print(f"{len(bodies)} queries, {kind} steps {levels} against {target}, {args.duration}s per step")
+
+    report = {
+        'target': target,
+        'kind': kind,
+        'queries': len(bodies),
+        'duration_s': args.duration,
+        'seed': args.seed,
+        'simulated_upstream': None if args.url or args.real_backends else {
+            'llm_latency_ms': args.llm_latency_ms, 'llm_jitter_ms': args.llm_jitter_ms,
+            'embed_latency_ms': args.embed_latency_ms, 'embed_jitter_ms': args.embed_jitter_ms
+        },
+        'cache': args.cache,
+        'steps': []
+    }
+    async with client:
+        for level in levels:
+            # Connections, thread pool and upstream clients warm before the measured window
+            if args.warmup > 0:
+                await closed_loop(client, bodies, max(1, int(level)) if kind == 'concurrency' else 1,
+                                  args.warmup, rng)
+            if kind == 'concurrency':
+                results, elapsed = await closed_loop(client, bodies, level, args.duration, rng)
+            else:
+                results, elapsed = await open_loop(client, bodies, level, args.duration, rng, args.max_in_flight)
+            step = summarize(kind, level, results, elapsed)
+            report['steps'].append(step)
+            print_step(step)
+
+    report['saturation'] = saturation(report['steps'])
+    sat = report['saturation']
+    print(f"\n📊 Peak {sat['peak_rps']} rps at {sat['peak_level']}; 90% of peak from {sat['knee_level']} "
+          f"(p95 {sat['knee_p95_ms']} ms)")
+    return report
+
+def compare(report, baseline, tolerance, error_tolerance):
+    """Regressions of `report` against `baseline`, step by step (matched by kind and level)"""
+    if report['simulated_upstream'] != baseline.get('simulated_upstream'):
+        print("  ⚠ Simulated upstream latency differs from the baseline; the comparison is not like for like")
+    base_steps = {(s['kind'], s['level']): s for s in baseline['steps']}
+    regressions = []
+    for step in report['steps']:
+        base = base_steps.get((step['kind'], step['level']))
+        if base is None:
+            continue
+        for metric in HIGHER_IS_WORSE + LOWER_IS_WORSE:
+            old, new = base.get(metric), step.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > tolerance if metric in HIGHER_IS_WORSE else change < -tolerance
+            if worse:
+                regressions.append(f"{step['kind']}={step['level']}: {metric} {old} -> {new} ({change:+.1%})")
+        if step['error_rate'] - base['error_rate'] > error_tolerance:
+            regressions.append(f"{step['kind']}={step['level']}: error_rate "
+                               f"{base['error_rate']:.2%} -> {step['error_rate']:.2%}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test and regression check for POST /recommend")
+    parser.add_argument('--url', help="running server to test (default: the app in-process)")
+    parser.add_argument('--queries', nargs='*', default=[], help="extra .csv (Query column) or .jsonl "
+                                                                 "(/recommend bodies) files to replay")
+    parser.add_argument('--concurrency', default='1,2,4,8,16,32', help="closed-loop steps: concurrent users")
+    parser.add_argument('--rate', help="open-loop steps instead: arrivals per second, e.g. 5,10,20,40")
+    parser.add_argument('--duration', type=float, default=10, help="measured seconds per step")
+    parser.add_argument('--warmup', type=float, default=1, help="unmeasured seconds before each step")
+    parser.add_argument('--max-in-flight', type=int, default=512, help="open loop: arrivals beyond this "
+                                                                       "are dropped and count as errors")
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--real-backends', action='store_true', help="in-process with the configured "
+                                                                     "QUERY_ANALYZER / EMBEDDER")
+    parser.add_argument('--llm-latency-ms', type=float, default=300)
+    parser.add_argument('--llm-jitter-ms', type=float, default=100)
+    parser.add_argument('--embed-latency-ms', type=float, default=60)
+    parser.add_argument('--embed-jitter-ms', type=float, default=20)
+    parser.add_argument('--cache', action='store_true', help="leave the result caches on")
+    parser.add_argument('--baseline', help="fail if this earlier report is beaten by more than --tolerance")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative change in RPS and "
+                                                                     "p50/p95/p99 latency")
+    parser.add_argument('--error-tolerance', type=float, default=0.01, help="allowed absolute error rate increase")
+    parser.add_argument('--save-baseline', metavar='PATH', help="store this run as the baseline")
+    parser.add_argument('--output', help="write the JSON report here")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report saved to {path}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance, args.error_tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) against {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\n✅ Within {args.tolerance:.0%} of {args.baseline}")
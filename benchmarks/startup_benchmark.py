@@ -0,0 +1,163 @@
+# benchmarks/startup_benchmark.py
+#
+# Cold-start cost of the API per STARTUP_MODE: time to `import app`,
+# then for a real server process the time until /health and /ready
+# answer and the latency of the first and second /recommend. With
+# --gunicorn N it also compares the memory (PSS) of N workers with and
+# without PRELOAD_INDEX. Uses the fake backends unless --real-backends.
+#   python startup_benchmark.py --runs 5 --gunicorn 4 --output startup.json
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+import urllib.error
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+MODES = ['eager', 'lazy']
+QUERY = "Java developer who can collaborate with business teams"
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def bench_env(mode, real_backends, **extra):
+    env = dict(os.environ, STARTUP_MODE=mode, LOG_LEVEL="WARNING", **extra)
+    if not real_backends:
+        env.update(QUERY_ANALYZER="fake", EMBEDDER="fake")
+    return env
+
+def time_import(mode, real_backends):
+    code = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, '-c', code], cwd=API_DIR, env=bench_env(mode, real_backends),
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def request(url, body=None, timeout=30):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return response.status
+
+def wait_for(url, start, deadline=120):
+    """Seconds from `start` until GET url returns 200"""
+    while time.perf_counter() - start < deadline:
+        try:
+            if request(url, timeout=1) == 200:
+                return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} not ready after {deadline}s")
+
+def time_server(mode, real_backends):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=API_DIR, env=bench_env(mode, real_backends),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        result = {'health_s': wait_for(f"{base}/health", start)}
+        result['ready_s'] = wait_for(f"{base}/ready", start)
+        for name, query in (('first_request_ms', QUERY), ('second_request_ms', QUERY + " and SQL")):
+            t0 = time.perf_counter()
+            request(f"{base}/recommend", {'query': query})
+            result[name] = (time.perf_counter() - t0) * 1000
+        return result
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def process_pss_mb(pid):
+    # Proportional set size: shared pages are split between the processes mapping them
+    with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+        for line in f:
+            if line.startswith('Pss:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def child_pids(pid):
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children", 'r') as f:
+            children += [int(p) for p in f.read().split()]
+    return children
+
+def gunicorn_memory(workers, preload, real_backends):
+    port = free_port()
+    env = bench_env('eager' if preload else 'lazy', real_backends, PORT=str(port),
+                    WEB_CONCURRENCY=str(workers), PRELOAD_INDEX='1' if preload else '0')
+    start = time.perf_counter()
+    proc = subprocess.Popen(['gunicorn', '-c', 'gunicorn.conf.py', 'app:app'], cwd=API_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for(f"http://127.0.0.1:{port}/ready", start)
+        # /ready answers from whichever worker got the request; give the rest time to warm
+        while len(child_pids(proc.pid)) < workers:
+            time.sleep(0.05)
+        time.sleep(2)
+        pids = [proc.pid] + child_pids(proc.pid)
+        return {
+            'workers': workers,
+            'preload': preload,
+            'pss_total_mb': round(sum(process_pss_mb(p) for p in pids), 1),
+            'ready_s': round(time.perf_counter() - start, 3)
+        }
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def summarize(values):
+    return {'median': round(statistics.median(values), 3), 'min': round(min(values), 3), 'max': round(max(values), 3)}
+
+def run(runs, modes, real_backends, gunicorn_workers=0):
+    report = {'modes': {}, 'gunicorn': []}
+    for mode in modes:
+        imports = [time_import(mode, real_backends) for _ in range(runs)]
+        servers = [time_server(mode, real_backends) for _ in range(runs)]
+        stats = {'import_s': summarize(imports)}
+        for key in servers[0]:
+            stats[key] = summarize([s[key] for s in servers])
+        report['modes'][mode] = stats
+
+        print(f"\n{mode}")
+        for key, summary in stats.items():
+            print(f"  {key:<18} median {summary['median']:>9.3f}  (min {summary['min']:.3f}, max {summary['max']:.3f})")
+
+    if gunicorn_workers:
+        if not os.path.exists('/proc/self/smaps_rollup'):
+            print("\n⚠ /proc/<pid>/smaps_rollup not available, skipping the gunicorn memory comparison")
+        else:
+            print(f"\ngunicorn, {gunicorn_workers} workers")
+            for preload in (False, True):
+                result = gunicorn_memory(gunicorn_workers, preload, real_backends)
+                report['gunicorn'].append(result)
+                print(f"  preload={str(preload):<5}  PSS {result['pss_total_mb']:>8.1f} MB  ready {result['ready_s']:.2f}s")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark API import, readiness and first-request time")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--gunicorn', type=int, default=0, metavar='WORKERS',
+                        help="also compare worker memory with and without PRELOAD_INDEX")
+    parser.add_argument('--real-backends', action='store_true',
+                        help="use the configured Groq/Gemini backends instead of the fakes")
+    parser.add_argument('--output', help="write the JSON report here")
+    args = parser.parse_args()
+
+    report = run(args.runs, args.modes.split(','), args.real_backends, args.gunicorn)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report saved to {args.output}")
@@ -0,0 +1,212 @@
+# benchmarks/upstream_benchmark.py
+#
+# End-to-end retrieve() latency against stub Groq / Gemini servers
+# (upstream_stub.py) that add a slow tail and injected errors, with the
+# upstream client's retries, hedging and degraded fallback switched on
+# one at a time, then a full outage to exercise the circuit breaker.
+#   python upstream_benchmark.py --requests 400 --concurrency 8 --tail-rate 0.05 --error-rate 0.05
+# --check instead asserts the client's retry and circuit breaker contract
+# against the stub and exits non-zero if it is broken.
+
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# Read at import by the api modules: every query goes to the (stub) LLM
+os.environ.update(QUERY_ANALYZER='groq', EMBEDDER='gemini', ANALYZER_MODE='llm', LOG_LEVEL='ERROR')
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+from upstream_stub import start_stub
+
+QUERIES = [
+    "Java developer who can collaborate with business teams",
+    "Entry level sales role, strong communication",
+    "Python and SQL data analyst with numerical reasoning",
+    "Customer service manager with leadership skills",
+    "Senior .NET engineer, 40 minute assessment",
+]
+
+# name -> (UpstreamClient settings, engine fallback on)
+SCENARIOS = [
+    ('plain', {'retries': 0, 'hedge_percentile': 0}, False),
+    ('retries', {'retries': 2, 'hedge_percentile': 0}, False),
+    ('retries+hedge', {'retries': 2, 'hedge_percentile': 95}, False),
+    ('retries+hedge+fallback', {'retries': 2, 'hedge_percentile': 95}, True),
+]
+EVENTS = ['retry', 'hedge', 'hedge_won', 'short_circuit']
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+def configure(engine, settings, fallback):
+    from upstream import LatencyWindow
+    engine.UPSTREAM_FALLBACK = fallback
+    for backend in (engine.analyzer.llm, engine.embedder):
+        client = backend.http
+        for key, value in settings.items():
+            setattr(client, key, value)
+        client.latencies = LatencyWindow()
+        client.breaker.record_success()
+
+def run_scenario(engine, name, n_requests, concurrency, warmup):
+    from upstream import UPSTREAM_EVENTS
+
+    def one(i):
+        query = f"{QUERIES[i % len(QUERIES)]} #{name}-{i}"
+        start = time.perf_counter()
+        try:
+            results = engine.retrieve(query, top_k=10)
+            outcome = 'degraded' if getattr(results, 'degraded', None) else 'ok'
+        except Exception:
+            outcome = 'error'
+        return (time.perf_counter() - start) * 1000, outcome
+
+    # Fill the latency window the hedging threshold is computed from
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(-warmup, 0)))
+
+    before = {(b, e): UPSTREAM_EVENTS.value(b, e) for b in ('groq', 'gemini') for e in EVENTS}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(n_requests)))
+    wall = time.perf_counter() - start
+
+    latencies = [ms for ms, _ in results]
+    outcomes = [o for _, o in results]
+    return {
+        'scenario': name,
+        'requests': n_requests,
+        'rps': round(n_requests / wall, 1),
+        'p50_ms': round(percentile(latencies, 50), 1),
+        'p95_ms': round(percentile(latencies, 95), 1),
+        'p99_ms': round(percentile(latencies, 99), 1),
+        'max_ms': round(max(latencies), 1),
+        'ok': outcomes.count('ok'),
+        'degraded': outcomes.count('degraded'),
+        'errors': outcomes.count('error'),
+        'events': {e: sum(UPSTREAM_EVENTS.value(b, e) - before[(b, e)] for b in ('groq', 'gemini'))
+                   for e in EVENTS}
+    }
+
+def print_row(r):
+    print(f"  {r['scenario']:<24} p50 {r['p50_ms']:>7.1f}  p95 {r['p95_ms']:>7.1f}  p99 {r['p99_ms']:>7.1f}  "
+          f"max {r['max_ms']:>7.1f} ms  ok {r['ok']:>4}  degraded {r['degraded']:>4}  errors {r['errors']:>4}  "
+          f"{r['events']}")
+
+def run(n_requests, concurrency, warmup, stub_settings):
+    server, base_url, state = start_stub(**stub_settings)
+    os.environ.update(
+        GROQ_BASE_URL=base_url, GEMINI_BASE_URL=base_url, GROQ_API_KEY='stub', GEMINI_API_KEY='stub',
+        # Stub vectors must not land in the real embedding cache
+        EMBEDDING_CACHE_DIR=tempfile.mkdtemp(prefix='upstream-bench-')
+    )
+    from retrieval_engine import RetrievalEngine
+    engine = RetrievalEngine()
+
+    print(f"Stub at {base_url}: {stub_settings}")
+    report = {'stub': stub_settings, 'scenarios': []}
+    for name, settings, fallback in SCENARIOS:
+        configure(engine, settings, fallback)
+        result = run_scenario(engine, name, n_requests, concurrency, warmup)
+        report['scenarios'].append(result)
+        print_row(result)
+
+    # Both providers down: the breaker opens and requests are served degraded without waiting
+    configure(engine, SCENARIOS[-1][1], True)
+    state.update(error_rate=1.0)
+    result = run_scenario(engine, 'outage', n_requests, concurrency, warmup=0)
+    result['circuit'] = {b.name: b.breaker.state for b in (engine.analyzer.llm.http, engine.embedder.http)}
+    report['scenarios'].append(result)
+    print_row(result)
+    print(f"  circuit after outage: {result['circuit']}")
+
+    server.shutdown()
+    return report
+
+def check():
+    """Retries stop at the limit, an outage opens the breaker, and no probe leaves it half-open"""
+    from upstream import UpstreamClient, UpstreamError, CircuitOpenError, CircuitBreaker
+
+    server, base_url, state = start_stub(latency_ms=1, jitter_ms=0, error_rate=1.0)
+    path = '/openai/v1/chat/completions'
+    payload = {'messages': [{'role': 'user', 'content': 'Query: java\n'}]}
+
+    def client(name, retries, failures=3, reset=0.2):
+        c = UpstreamClient(name, base_url, timeout=5.0, retries=retries, backoff=0.001, hedge_percentile=0)
+        c.breaker = CircuitBreaker(failure_threshold=failures, reset_timeout=reset)
+        return c
+
+    def sent(call):
+        before = state.requests
+        try:
+            call()
+        except UpstreamError as e:
+            return state.requests - before, e
+        return state.requests - before, None
+
+    # Retries: one request plus `retries` retries, then the error surfaces
+    for retries in (0, 2):
+        c = client(f'check-retries-{retries}', retries, failures=100)
+        count, error = sent(lambda: c.post_json(path, payload))
+        assert error is not None and error.retryable, error
+        assert count == retries + 1, f"retries={retries}: {count} requests sent"
+        print(f"✅ retries={retries}: {count} requests, then {type(error).__name__}")
+
+    # Outage: the breaker opens after `failures` calls and then short-circuits without a request
+    c = client('check-outage', retries=1)
+    for _ in range(3):
+        sent(lambda: c.post_json(path, payload))
+    assert c.breaker.state == CircuitBreaker.OPEN, c.breaker.state
+    count, error = sent(lambda: c.post_json(path, payload))
+    assert isinstance(error, CircuitOpenError) and count == 0, (error, count)
+    print("✅ outage: breaker open after 3 failed calls, next call short-circuited")
+
+    # Half-open probe that fails outside UpstreamError re-opens the breaker
+    time.sleep(c.breaker.reset_timeout)
+    try:
+        c.request('POST', path, not_an_httpx_argument=True)
+    except TypeError:
+        pass
+    assert c.breaker.state == CircuitBreaker.OPEN, c.breaker.state
+    print("✅ half-open probe raising TypeError re-opened the breaker")
+
+    # Recovery: the next probe succeeds and closes it
+    state.update(error_rate=0.0)
+    time.sleep(c.breaker.reset_timeout)
+    c.post_json(path, payload)
+    assert c.breaker.state == CircuitBreaker.CLOSED, c.breaker.state
+    print("✅ recovery: successful probe closed the breaker")
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upstream client resilience benchmark against stub servers")
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=40)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--tail-rate', type=float, default=0.05)
+    parser.add_argument('--tail-ms', type=float, default=800)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--output', help="write the JSON report here")
+    parser.add_argument('--check', action='store_true', help="assert retry / circuit breaker behaviour and exit")
+    args = parser.parse_args()
+
+    if args.check:
+        check()
+        sys.exit(0)
+
+    report = run(args.requests, args.concurrency, args.warmup, {
+        'latency_ms': args.latency_ms, 'tail_rate': args.tail_rate,
+        'tail_ms': args.tail_ms, 'error_rate': args.error_rate
+    })
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report saved to {args.output}")
@@ -0,0 +1,124 @@
+# benchmarks/upstream_stub.py
+#
+# Local stand-in for the Groq chat-completions and Gemini
+# batchEmbedContents endpoints, with injectable latency, slow tails and
+# errors. Answers come from the offline FakeAnalyzer / FakeEmbedder.
+#   python upstream_stub.py --latency-ms 40 --tail-rate 0.05 --tail-ms 800 --error-rate 0.05
+#   GROQ_BASE_URL=http://127.0.0.1:8766 GEMINI_BASE_URL=http://127.0.0.1:8766 \
+#   GROQ_API_KEY=stub GEMINI_API_KEY=stub uvicorn app:app
+# POST /_control with any of the settings below changes them while running.
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+from providers import FakeAnalyzer, FakeEmbedder
+
+SETTINGS = ['latency_ms', 'jitter_ms', 'tail_rate', 'tail_ms', 'error_rate', 'error_status']
+
+
+class StubState:
+    def __init__(self, latency_ms=20, jitter_ms=5, tail_rate=0.0, tail_ms=1000, error_rate=0.0,
+                 error_status=503, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tail_rate = tail_rate
+        self.tail_ms = tail_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.analyzer = FakeAnalyzer()
+        self.embedder = FakeEmbedder()
+
+    def update(self, **settings):
+        for key, value in settings.items():
+            if key in SETTINGS:
+                setattr(self, key, type(getattr(self, key))(value))
+
+    def draw(self):
+        """(delay seconds, error?) for one request"""
+        with self.lock:
+            self.requests += 1
+            delay = self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+            if self.rng.random() < self.tail_rate:
+                delay = self.tail_ms
+            return max(0.0, delay) / 1000, self.rng.random() < self.error_rate
+
+
+def make_handler(state):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real endpoints
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if self.path == '/_control':
+                state.update(**payload)
+                self._send(200, {s: getattr(state, s) for s in SETTINGS})
+                return
+
+            delay, error = state.draw()
+            time.sleep(delay)
+            if error:
+                self._send(state.error_status, {'error': {'message': 'injected failure'}})
+            elif self.path == '/openai/v1/chat/completions':
+                prompt = payload['messages'][0]['content']
+                query = prompt.split('Query: ', 1)[-1].split('\n', 1)[0]
+                content = json.dumps(state.analyzer.analyze(query))
+                self._send(200, {'choices': [{'message': {'role': 'assistant', 'content': content}}]})
+            elif self.path.endswith(':batchEmbedContents'):
+                texts = [r['content']['parts'][0]['text'] for r in payload['requests']]
+                self._send(200, {'embeddings': [{'values': state.embedder._vector(t).tolist()} for t in texts]})
+            else:
+                self._send(404, {'error': {'message': f"unknown path {self.path}"}})
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub(host='127.0.0.1', port=0, **settings):
+    """Starts the stub on a background thread; returns (server, base_url, state)"""
+    state = StubState(**settings)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}", state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Groq / Gemini endpoints with injected latency and errors")
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--jitter-ms', type=float, default=5)
+    parser.add_argument('--tail-rate', type=float, default=0.0, help="fraction of requests taking --tail-ms")
+    parser.add_argument('--tail-ms', type=float, default=1000)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    args = parser.parse_args()
+
+    server, base_url, _ = start_stub(
+        port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, tail_rate=args.tail_rate,
+        tail_ms=args.tail_ms, error_rate=args.error_rate, error_status=args.error_status
+    )
+    print(f"Stub Groq/Gemini endpoints at {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
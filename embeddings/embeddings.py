@@ -2,67 +2,231 @@
 
 import json
 import os
-from google import genai
-from google.genai import types
+import sys
+import time
+import random
+import argparse
+import threading
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
-import pickle
 
-# Initialize Gemini client
-client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+from embedding_store import EmbeddingStore
+from columnar_store import CatalogWriter
+from vector_snapshot import variant_dir, build_catalog_dir
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from preprocessing import iter_processed
 
-def generate_embeddings(assessments):
+# Gemini client, created on first use so local-model builds need no key
+client = None
+
+EMBEDDING_MODEL = 'models/text-embedding-004'
+VECTOR_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api', 'vector_store')
+
+# Batch pipeline settings (Gemini accepts up to 100 texts per request)
+BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 50))
+MAX_WORKERS = int(os.environ.get("EMBED_WORKERS", 4))
+REQUESTS_PER_MINUTE = float(os.environ.get("EMBED_RPM", 100))
+MAX_RETRIES = 5
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def get_client():
+    global client
+    if client is None:
+        from google import genai
+        client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+    return client
+
+def embed_batch(texts, bucket):
+    """One multi-text embed_content call, retried with exponential backoff + jitter"""
+    for attempt in range(MAX_RETRIES):
+        bucket.acquire()
+        try:
+            response = get_client().models.embed_content(
+                model=EMBEDDING_MODEL,
+                contents=texts
+            )
+            vectors = [e.values for e in response.embeddings]
+            if len(vectors) != len(texts):
+                raise ValueError(f"Expected {len(texts)} embeddings, got {len(vectors)}")
+            return vectors
+        except Exception as e:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            delay = min(60, 2 ** attempt) * (0.5 + random.random())
+            print(f"  ⚠ Batch of {len(texts)} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def iter_batches(items, size):
+    """Consecutive lists of up to `size` items, pulled lazily from any iterable"""
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+def generate_embeddings(assessments, writer, batch_size=BATCH_SIZE, workers=MAX_WORKERS,
+                        requests_per_minute=REQUESTS_PER_MINUTE):
+    """
+    Embeds the assessments' embedding_text as they arrive (a list or the
+    iter_processed generator), `workers` batches at a time over a bounded
+    worker pool, and appends each window to the CatalogWriter. Every
+    finished batch is written to the EmbeddingStore, which doubles as the
+    checkpoint: an interrupted run picks up where it stopped because
+    already-stored texts are never sent again.
+    """
     print("="*60)
     print("PHASE 3: Generate Embeddings")
     print("="*60)
     
-    embeddings_data = []
+    # Only text whose sha256 is not in the store goes to the API
+    store = EmbeddingStore()
+    bucket = TokenBucket(rate=requests_per_minute / 60.0, capacity=workers)
+    failed = 0
+    embedded = 0
+    start = time.perf_counter()
     
-    for idx, assessment in enumerate(assessments):
-        try:
-            # FIXED: Changed 'content' to 'contents'
-            response = client.models.embed_content(
-                model='models/text-embedding-004',
-                contents=assessment['embedding_text']
-            )
-            
-            embedding_vector = response.embeddings[0].values
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for window in iter_batches(assessments, batch_size * workers):
+            texts = [a['embedding_text'] for a in window]
+            vectors = store.get_many(EMBEDDING_MODEL, texts)
+            missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+            batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
             
-            embeddings_data.append({
-                'id': idx,
-                'name': assessment['name'],
-                'url': assessment['url'],
-                'test_type': assessment['test_type'],
-                'test_type_full': assessment['test_type_full'],
-                'embedding': embedding_vector,
-                'embedding_text': assessment['embedding_text']
-            })
+            fresh = {}
+            futures = {pool.submit(embed_batch, batch, bucket): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    batch_vectors = future.result()
+                    store.put_many(EMBEDDING_MODEL, batch, batch_vectors)
+                    fresh.update(zip(batch, batch_vectors))
+                    embedded += len(batch)
+                except Exception as e:
+                    print(f"  ⚠ Batch failed after {MAX_RETRIES} attempts: {e}")
+                    failed += len(batch)
             
-            if (idx + 1) % 10 == 0:
-                print(f"  Generated {idx + 1}/{len(assessments)} embeddings...")
-                
-        except Exception as e:
-            print(f"  ⚠ Error on assessment {idx}: {e}")
-            continue
+            # After a failure the catalog is abandoned, but the checkpoint keeps filling
+            if not failed:
+                vectors = [fresh[t] if v is None else v for t, v in zip(texts, vectors)]
+                writer.append(np.vstack(vectors), embedding_records(window, writer.count))
+            print(f"  Generated {writer.count} embeddings ({embedded} via API)...")
+    
+    elapsed = time.perf_counter() - start
+    if embedded:
+        print(f"  Throughput: {embedded / elapsed:.1f} texts/sec ({embedded} texts in {elapsed:.1f}s)")
+    
+    if failed:
+        raise RuntimeError(
+            f"{failed} texts could not be embedded; re-run to resume from the checkpoint"
+        )
     
-    print(f"\n✅ Generated {len(embeddings_data)} embeddings")
-    return embeddings_data
+    print(f"\n✅ Generated {writer.count} embeddings ({embedded} via API, {writer.count - embedded} from cache)")
+    return writer.count
 
-def save_embeddings(embeddings_data):
-    os.makedirs('../vector_store', exist_ok=True)
+def generate_local_embeddings(assessments, embedder, writer, batch_size=BATCH_SIZE):
+    """Same catalog as generate_embeddings, from the in-process model (api/local_embedder.py)"""
+    print("="*60)
+    print(f"PHASE 3: Generate Embeddings ({embedder.model})")
+    print("="*60)
+    
+    start = time.perf_counter()
+    for batch in iter_batches(assessments, batch_size):
+        vectors = embedder.embed_many([a['embedding_text'] for a in batch])
+        writer.append(np.vstack(vectors), embedding_records(batch, writer.count))
+        print(f"  Generated {writer.count} embeddings...")
     
-    with open('../vector_store/embeddings.pkl', 'wb') as f:
-        pickle.dump(embeddings_data, f)
+    elapsed = time.perf_counter() - start
+    print(f"  Throughput: {writer.count / elapsed:.1f} texts/sec ({writer.count} texts in {elapsed:.1f}s)")
+    print(f"\n✅ Generated {writer.count} embeddings locally")
+    return writer.count
+
+def embedding_records(assessments, first_id=0):
+    """Catalog columns per assessment; the vectors stay a separate float32 matrix"""
+    records = []
+    for idx, assessment in enumerate(assessments, first_id):
+        records.append({
+            'id': idx,
+            'name': assessment['name'],
+            'url': assessment['url'],
+            'test_type': assessment['test_type'],
+            'test_type_full': assessment['test_type_full'],
+            'embedding_text': assessment['embedding_text'],
+            'assessment_length': assessment.get('assessment_length', ''),
+            'job_levels': assessment.get('job_levels', ''),
+            'languages': assessment.get('languages', ''),
+            'remote_testing': assessment.get('remote_testing', '')
+        })
+    return records
+
+def build_catalog(generate, vector_store_dir, model):
+    """
+    Runs `generate(writer)` into a CatalogWriter for vector_store_dir's
+    build catalog. The writer stages everything and only replaces the build
+    catalog once close() succeeds; the live snapshot is never touched
+    until faiss_index.py publishes the build.
+    """
+    catalog_dir = build_catalog_dir(vector_store_dir)
+    writer = CatalogWriter(catalog_dir, model)
+    try:
+        generate(writer)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
     
-    print(f"✅ Saved embeddings to vector_store/embeddings.pkl")
+    print(f"✅ Saved embeddings to {os.path.relpath(catalog_dir, os.path.join(VECTOR_STORE_DIR, '..'))}")
 
 def main():
-    with open('../data/processed_assessments.json', 'r', encoding='utf-8') as f:
-        assessments = json.load(f)
+    parser = argparse.ArgumentParser(description="Embed the processed catalog into vector_store/build/catalog")
+    parser.add_argument('--raw', help="preprocess this raw .json/.jsonl catalog in-stream instead of "
+                                      "reading processed_assessments.json")
+    parser.add_argument('--workers', type=int, default=1, help="preprocessing processes (with --raw)")
+    parser.add_argument('--embedder', default='gemini', choices=['gemini', 'local'],
+                        help="local: in-process model (LOCAL_EMBED_* env), written to its own index variant")
+    args = parser.parse_args()
     
-    print(f"Loaded {len(assessments)} assessments")
+    if args.raw:
+        # Consumed lazily: each batch is embedded and written as preprocessing yields it
+        assessments = iter_processed(args.raw, args.workers)
+    else:
+        with open('../data/processed_assessments.json', 'r', encoding='utf-8') as f:
+            assessments = json.load(f)
+        print(f"Loaded {len(assessments)} assessments")
     
-    embeddings_data = generate_embeddings(assessments)
-    save_embeddings(embeddings_data)
+    if args.embedder == 'local':
+        from local_embedder import LocalEmbedder
+        embedder = LocalEmbedder()
+        variant = variant_dir(VECTOR_STORE_DIR, embedder.index_variant)
+        build_catalog(lambda writer: generate_local_embeddings(assessments, embedder, writer),
+                      variant, embedder.model)
+        print(f"  Next: cd api/vector_store && python faiss_index.py --variant {embedder.index_variant}")
+    else:
+        build_catalog(lambda writer: generate_embeddings(assessments, writer), VECTOR_STORE_DIR, EMBEDDING_MODEL)
+        print("  Next: cd api/vector_store && python faiss_index.py")
     
     print("\n✅ Phase 3 Complete!")
 
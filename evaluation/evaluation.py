@@ -2,54 +2,198 @@ import sys
 sys.path.append('../api')
 
 from retrieval_engine import RetrievalEngine
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import json
+import math
+import time
+import numpy as np
 import pandas as pd
 
+STAGES = ['llm', 'embed', 'search', 'balance', 'total']
+
 def normalize_url(url):
     """
     Normalize URLs by removing /solutions/ path difference
     """
     return url.replace('/solutions/products/', '/products/')
 
-def generate_shl_submission(input_csv='Gen_AI Dataset.csv', output_csv='SHL_submission.csv'):
+def recall_at_k(predicted, relevant, k):
+    if not relevant:
+        return 0.0
+    return len(set(predicted[:k]) & relevant) / len(relevant)
+
+def average_precision_at_k(predicted, relevant, k):
+    """AP@K with binary relevance, normalized by min(K, |relevant|)"""
+    if not relevant:
+        return 0.0
+    hits = 0
+    score = 0.0
+    for rank, url in enumerate(predicted[:k], 1):
+        if url in relevant:
+            hits += 1
+            score += hits / rank
+    return score / min(k, len(relevant))
+
+def ndcg_at_k(predicted, relevant, k):
+    dcg = sum(1 / math.log2(rank + 1) for rank, url in enumerate(predicted[:k], 1) if url in relevant)
+    ideal = sum(1 / math.log2(rank + 1) for rank in range(1, min(k, len(relevant)) + 1))
+    return dcg / ideal if ideal else 0.0
+
+def load_labels(input_csv):
+    """Query -> set of normalized relevant URLs"""
+    df = pd.read_csv(input_csv)
+    labels = {}
+    for query, url in zip(df['Query'], df['Assessment_url']):
+        labels.setdefault(query, set()).add(normalize_url(url))
+    return labels
+
+def _run_one(engine, query, k):
+    try:
+        recommendations, timings = engine.retrieve_timed(query, top_k=k)
+        return {'query': query, 'recommendations': recommendations, 'timings': timings, 'error': None}
+    except Exception as e:
+        return {'query': query, 'recommendations': [], 'timings': {}, 'error': str(e)}
+
+def run_queries(engine, queries, k=10, workers=4, mode='thread'):
     """
-    Generates a submission CSV in SHL's required format:
-    Each query repeated per recommended URL.
+    Fans the queries out over a thread pool, or an asyncio loop bounded by a
+    semaphore (each retrieval still runs in a worker thread). Results come
+    back in input order.
     """
-    # Load your dataset
-    df = pd.read_csv(input_csv)
-    
-    # Get unique queries
-    queries = df['Query'].unique()
+    if mode == 'thread':
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(lambda q: _run_one(engine, q, k), queries))
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(workers)
+
+        async def run(query):
+            async with semaphore:
+                return await asyncio.to_thread(_run_one, engine, query, k)
+
+        return await asyncio.gather(*(run(q) for q in queries))
+
+    return asyncio.run(run_all())
+
+def _latency_summary(values):
+    if not values:
+        return {}
+    return {
+        'mean_ms': round(float(np.mean(values)), 2),
+        'p50_ms': round(float(np.percentile(values, 50)), 2),
+        'p95_ms': round(float(np.percentile(values, 95)), 2),
+        'max_ms': round(float(np.max(values)), 2)
+    }
+
+def run_evaluation(input_csv='Gen_AI Dataset.csv', report_json='evaluation_report.json',
+                   k=10, workers=4, mode='thread', engine=None):
+    """
+    Scores the engine against the labelled dataset and writes a JSON report
+    with Mean Recall@K, MAP@K, nDCG@K, per-stage latency and per-query detail.
+    """
+    labels = load_labels(input_csv)
+    queries = list(labels)
     print(f"Loaded {len(queries)} unique queries from {input_csv}")
-    
-    engine = RetrievalEngine()
-    
-    submission_rows = []
 
-    for idx, query in enumerate(queries, 1):
-        print(f"\nQuery {idx}/{len(queries)}: {query[:80]}...")
-        
-        try:
-            recommendations = engine.retrieve(query, top_k=10)
-        except Exception as e:
-            print(f"   ⚠ Failed to retrieve recommendations: {e}")
-            recommendations = []
-
-        if not recommendations:
-            print("   ❌ No recommendations found for this query")
-            continue
+    engine = engine or RetrievalEngine()
+    # Loads local models (e.g. the cross-encoder) before the timed queries
+    engine.warm_up()
+
+    start = time.perf_counter()
+    results = run_queries(engine, queries, k=k, workers=workers, mode=mode)
+    wall_seconds = time.perf_counter() - start
 
-        for rec in recommendations:
+    per_query = []
+    for result in results:
+        relevant = labels[result['query']]
+        predicted = [normalize_url(rec['assessment_url']) for rec in result['recommendations']]
+        per_query.append({
+            'query': result['query'],
+            f'recall@{k}': recall_at_k(predicted, relevant, k),
+            f'ap@{k}': average_precision_at_k(predicted, relevant, k),
+            f'ndcg@{k}': ndcg_at_k(predicted, relevant, k),
+            'predicted': predicted,
+            'relevant': sorted(relevant),
+            'timings_ms': {stage: round(v, 2) for stage, v in result['timings'].items()},
+            'error': result['error']
+        })
+
+    report = {
+        'dataset': input_csv,
+        'k': k,
+        'mode': mode,
+        'workers': workers,
+        'queries': len(queries),
+        'errors': sum(1 for q in per_query if q['error']),
+        'wall_seconds': round(wall_seconds, 2),
+        'metrics': {
+            f'mean_recall@{k}': round(float(np.mean([q[f'recall@{k}'] for q in per_query])), 4),
+            f'map@{k}': round(float(np.mean([q[f'ap@{k}'] for q in per_query])), 4),
+            f'ndcg@{k}': round(float(np.mean([q[f'ndcg@{k}'] for q in per_query])), 4)
+        },
+        'latency': {
+            stage: _latency_summary([r['timings'][stage] for r in results if stage in r['timings']])
+            for stage in STAGES
+        },
+        'per_query': per_query
+    }
+
+    with open(report_json, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n📈 {report['metrics']}")
+    print(f"⏱️  total p50 {report['latency']['total'].get('p50_ms')} ms, wall {report['wall_seconds']} s")
+    print(f"✅ Evaluation report saved as {report_json}")
+    return report, results
+
+def write_submission(results, output_csv='SHL_submission.csv'):
+    """
+    Writes a submission CSV in SHL's required format:
+    Each query repeated per recommended URL.
+    """
+    submission_rows = []
+    for result in results:
+        if not result['recommendations']:
+            print(f"   ❌ No recommendations for: {result['query'][:80]}...")
+            continue
+        for rec in result['recommendations']:
             url = normalize_url(rec['assessment_url'])
-            submission_rows.append({'Query': query, 'Assessment_url': url})
-        
-        print(f"   ✅ Added {len(recommendations)} recommendations")
-    
-    # Save CSV in SHL format
+            submission_rows.append({'Query': result['query'], 'Assessment_url': url})
+
     submission_df = pd.DataFrame(submission_rows)
     submission_df.to_csv(output_csv, index=False)
     print(f"\n✅ Submission CSV saved as {output_csv}")
+
+def generate_shl_submission(input_csv='Gen_AI Dataset.csv', output_csv='SHL_submission.csv', workers=4):
+    """
+    Generates a submission CSV in SHL's required format:
+    Each query repeated per recommended URL.
+    """
+    # Load your dataset
+    df = pd.read_csv(input_csv)
+
+    # Get unique queries
+    queries = list(df['Query'].unique())
+    print(f"Loaded {len(queries)} unique queries from {input_csv}")
+
+    engine = RetrievalEngine()
+    results = run_queries(engine, queries, k=10, workers=workers)
+    write_submission(results, output_csv)
     print("SHL submission generation complete!")
 
 if __name__ == "__main__":
-    generate_shl_submission()
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality and speed")
+    parser.add_argument('--input', default='Gen_AI Dataset.csv')
+    parser.add_argument('--report', default='evaluation_report.json')
+    parser.add_argument('--submission', default='SHL_submission.csv')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--mode', default='thread', choices=['thread', 'async'])
+    parser.add_argument('--skip-submission', action='store_true')
+    args = parser.parse_args()
+
+    report, results = run_evaluation(args.input, args.report, k=args.k, workers=args.workers, mode=args.mode)
+    if not args.skip_submission:
+        write_submission(results, args.submission)
@@ -0,0 +1,148 @@
+import os
+import re
+import asyncio
+import hashlib
+import urllib.request
+import urllib.error
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+
+# Point at the local fixture server (fixture_server.py) to crawl saved HTML
+BASE_URL = os.environ.get("SHL_BASE_URL", "https://www.shl.com").rstrip('/')
+
+# Brave was used for the original crawl; any Chromium build works (unset = Playwright's bundled one)
+BRAVE_PATH = r"C:\Program Files\BraveSoftware\Brave-Browser\Application\brave.exe"
+BROWSER_PATH = os.environ.get("BROWSER_PATH") or (BRAVE_PATH if os.path.exists(BRAVE_PATH) else None)
+HEADLESS = os.environ.get("HEADLESS", "0") == "1"
+
+# Pages open at once, and how many of them share one browser context (cookie jar)
+CONCURRENCY = int(os.environ.get("SCRAPE_CONCURRENCY", 6))
+PAGES_PER_CONTEXT = int(os.environ.get("SCRAPE_PAGES_PER_CONTEXT", 3))
+NAVIGATION_TIMEOUT_MS = 90000
+CONTENT_TIMEOUT_MS = 30000
+
+BANNER_BUTTONS = [
+    'button:has-text("I understand and wish to continue")',
+    'button:has-text("Continue")'
+]
+
+
+class PagePool:
+    """
+    A bounded set of Playwright pages spread over a few browser contexts.
+    `async with pool.page() as page:` waits until a page is free, so at
+    most `size` navigations are in flight and the browser is started once
+    per crawl rather than once per URL.
+    """
+
+    def __init__(self, size=CONCURRENCY, pages_per_context=PAGES_PER_CONTEXT,
+                 headless=HEADLESS, executable_path=BROWSER_PATH):
+        self.size = size
+        self.pages_per_context = pages_per_context
+        self.headless = headless
+        self.executable_path = executable_path
+        self._free = asyncio.Queue()
+
+    async def __aenter__(self):
+        self._playwright = await async_playwright().start()
+        self.browser = await self._playwright.chromium.launch(
+            executable_path=self.executable_path, headless=self.headless
+        )
+        self.contexts = []
+        for i in range(self.size):
+            if i % self.pages_per_context == 0:
+                context = await self.browser.new_context(viewport={'width': 1920, 'height': 1080})
+                context.set_default_navigation_timeout(NAVIGATION_TIMEOUT_MS)
+                self.contexts.append(context)
+            self._free.put_nowait(await self.contexts[-1].new_page())
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.browser.close()
+        await self._playwright.stop()
+
+    @asynccontextmanager
+    async def page(self):
+        page = await self._free.get()
+        try:
+            yield page
+        finally:
+            self._free.put_nowait(page)
+
+
+async def dismiss_banners(page):
+    """Clicks the consent / region banners if they are showing; no fixed sleeps"""
+    for selector in BANNER_BUTTONS:
+        button = page.locator(selector).first
+        try:
+            if await button.is_visible():
+                await button.click()
+                await button.wait_for(state='hidden', timeout=5000)
+        except Exception:
+            pass
+
+
+async def open_page(page, url, ready_selector):
+    """
+    Navigates and waits for the element the extraction needs (instead of
+    networkidle + sleep), dismissing banners that could cover it.
+    """
+    await page.goto(url, wait_until='domcontentloaded')
+    await dismiss_banners(page)
+    await page.wait_for_selector(ready_selector, timeout=CONTENT_TIMEOUT_MS)
+
+
+async def with_retries(coro_fn, attempts=3, base_delay=2.0):
+    for attempt in range(attempts):
+        try:
+            return await coro_fn()
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            await asyncio.sleep(base_delay * 2 ** attempt)
+
+
+# ---------- change detection ----------
+
+_VOLATILE = re.compile(r'<script\b.*?</script>|<style\b.*?</style>|<!--.*?-->|\snonce="[^"]*"',
+                       re.DOTALL | re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def content_hash(html):
+    """sha256 of the page markup without scripts, styles, comments and nonces, which change per request"""
+    stable = _WHITESPACE.sub(' ', _VOLATILE.sub('', html)).strip()
+    return hashlib.sha256(stable.encode('utf-8')).hexdigest()
+
+
+def _fetch_fingerprint(url, etag=None, last_modified=None, timeout=30):
+    request = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+    if etag:
+        request.add_header('If-None-Match', etag)
+    if last_modified:
+        request.add_header('If-Modified-Since', last_modified)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            html = response.read().decode('utf-8', errors='replace')
+            return {
+                'status': response.status,
+                'content_hash': content_hash(html),
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')
+            }
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return {'status': 304, 'content_hash': None, 'etag': etag, 'last_modified': last_modified}
+        raise
+
+
+async def fetch_fingerprint(url, previous=None):
+    """
+    Cheap conditional GET (no browser) of a page's raw HTML. Returns
+    {'status', 'content_hash', 'etag', 'last_modified'}; status 304 means
+    the server confirmed nothing changed since `previous`.
+    """
+    previous = previous or {}
+    return await asyncio.to_thread(
+        _fetch_fingerprint, url, previous.get('etag'), previous.get('last_modified')
+    )
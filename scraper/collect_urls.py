@@ -1,73 +1,71 @@
-from playwright.sync_api import sync_playwright
 import json
-import time
 import os
+import time
+import asyncio
+import argparse
+from browser_pool import PagePool, BASE_URL, CONCURRENCY, open_page, with_retries
 
 URLS_FILE = '../data/urls.json'
 
-def setup_browser(playwright):
-    brave_path = r"C:\Program Files\BraveSoftware\Brave-Browser\Application\brave.exe"
-    browser = playwright.chromium.launch(executable_path=brave_path, headless=False)
-    context = browser.new_context(viewport={'width': 1920, 'height': 1080})
-    return browser, context
-
-def handle_banners(page):
-    try:
-        if page.locator('button:has-text("I understand and wish to continue")').is_visible(timeout=10000):
-            page.locator('button:has-text("I understand and wish to continue")').click()
-            time.sleep(3)
-    except:
-        pass
-    try:
-        if page.locator('button:has-text("Continue")').is_visible(timeout=5000):
-            page.locator('button:has-text("Continue")').click()
-            time.sleep(2)
-    except:
-        pass
-
-def main():
-    with sync_playwright() as p:
-        browser, context = setup_browser(p)
-        page = context.new_page()
+PAGE_SIZE = 12
+CATALOG_SIZE = 384  # 32 pages × 12
+PRODUCT_LINKS = 'a[href*="/products/product-catalog/view/"]'
 
-        all_items = []
-        start = 0
-        while start < 384:  # 32 pages × 12
-            url = f"https://www.shl.com/products/product-catalog/?type=1&start={start}"
-            print(f"Collecting URLs from: {url}")
-            page.goto(url, timeout=90000)
-            page.wait_for_load_state('networkidle')
-            time.sleep(5)
-            handle_banners(page)
+async def collect_page(pool, start):
+    url = f"{BASE_URL}/products/product-catalog/?type=1&start={start}"
 
-            links = page.locator('a[href*="/products/product-catalog/view/"]').all()
-            print(f"  Found {len(links)} links")
+    async def load():
+        async with pool.page() as page:
+            await open_page(page, url, PRODUCT_LINKS)
+            links = await page.locator(PRODUCT_LINKS).all()
 
+            items = []
             for link in links:
-                name = link.inner_text().strip()
-                href = link.get_attribute('href')
-                full_url = f"https://www.shl.com{href}"
+                name = (await link.inner_text()).strip()
+                href = await link.get_attribute('href')
+                full_url = href if href.startswith('http') else f"{BASE_URL}{href}"
 
                 # Get test type letters from last column
                 try:
-                    test_type = link.locator('xpath=ancestor::tr/td[last()]').inner_text().strip()
-                except:
+                    test_type = (await link.locator('xpath=ancestor::tr/td[last()]').inner_text()).strip()
+                except Exception:
                     test_type = "K"
 
-                all_items.append({
+                items.append({
                     "name": name,
                     "url": full_url,
                     "test_type": test_type
                 })
+            return items
+
+    items = await with_retries(load)
+    print(f"Collected {len(items)} links from: {url}")
+    return items
+
+async def collect_all(concurrency=CONCURRENCY, catalog_size=CATALOG_SIZE):
+    start = time.perf_counter()
+    async with PagePool(size=concurrency) as pool:
+        pages = await asyncio.gather(*(
+            collect_page(pool, offset) for offset in range(0, catalog_size, PAGE_SIZE)
+        ))
+    # Listing order is kept regardless of which page finished first
+    all_items = [item for page_items in pages for item in page_items]
+    print(f"Listing pages done in {time.perf_counter() - start:.1f}s")
+    return all_items
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect product URLs from the SHL catalog listing")
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help="browser pages open at once")
+    parser.add_argument('--catalog-size', type=int, default=CATALOG_SIZE, help="listing entries to page through")
+    args = parser.parse_args()
 
-            start += 12
+    all_items = asyncio.run(collect_all(concurrency=args.concurrency, catalog_size=args.catalog_size))
 
-        os.makedirs('../data', exist_ok=True)
-        with open(URLS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(all_items, f, indent=2, ensure_ascii=False)
+    os.makedirs('../data', exist_ok=True)
+    with open(URLS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(all_items, f, indent=2, ensure_ascii=False)
 
-        print(f"\nURL collection complete! Saved {len(all_items)} items to {URLS_FILE}")
-        browser.close()
+    print(f"\nURL collection complete! Saved {len(all_items)} items to {URLS_FILE}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
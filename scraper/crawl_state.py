@@ -0,0 +1,79 @@
+import os
+import json
+import time
+
+
+class JsonlStore:
+    """
+    Append-only JSONL log of scraped items, one record per line, flushed
+    and fsynced as each item finishes so a crash loses at most the pages
+    in flight. On load the last record per URL wins; a torn final line
+    from an interrupted write is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.records[record['url']] = record
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def get(self, url):
+        return self.records.get(url)
+
+    def append(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.records[record['url']] = record
+
+    def compact(self, urls=None):
+        """Rewrites the log with only the latest record per URL (optionally only `urls`, in that order)"""
+        self._file.close()
+        keep = [self.records[u] for u in urls if u in self.records] if urls is not None else list(self.records.values())
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in keep:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+        self.records = {r['url']: r for r in keep}
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        self._file.close()
+
+
+class CrawlState:
+    """
+    Small JSON file naming the current crawl. A crawl that did not finish
+    is resumed: items it already recorded are not fetched again. Once it
+    completes, the next run starts a new crawl that re-checks every page.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        state = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        if state.get('crawl_id') and not state.get('complete'):
+            self.crawl_id, self.resumed = state['crawl_id'], True
+        else:
+            self.crawl_id, self.resumed = time.strftime('%Y%m%dT%H%M%S'), False
+        self._write(complete=False)
+
+    def _write(self, complete):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'crawl_id': self.crawl_id, 'complete': complete}, f)
+        os.replace(tmp_path, self.path)
+
+    def mark_complete(self):
+        self._write(complete=True)
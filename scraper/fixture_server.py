@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import html
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Saved catalog HTML, laid out as catalog/start-<n>.html and view/<slug>.html
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+LISTING_PATH = '/products/product-catalog/'
+VIEW_PREFIX = '/products/product-catalog/view/'
+
+BANNER = ('<div class="consent"><button onclick="this.parentNode.remove()">'
+          'I understand and wish to continue</button></div>')
+
+def fixture_path(fixture_dir, path, query):
+    if path.rstrip('/') == LISTING_PATH.rstrip('/'):
+        start = int(parse_qs(query).get('start', ['0'])[0])
+        return os.path.join(fixture_dir, 'catalog', f"start-{start}.html")
+    if path.startswith(VIEW_PREFIX):
+        slug = path[len(VIEW_PREFIX):].strip('/')
+        if slug and '/' not in slug and '..' not in slug:
+            return os.path.join(fixture_dir, 'view', f"{slug}.html")
+    return None
+
+def make_handler(fixture_dir, delay_ms=0, etags=True):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        """Serves saved pages like the live site: ETag / 304 support and a per-request script tag"""
+
+        def do_GET(self):
+            if delay_ms:
+                time.sleep(delay_ms / 1000)
+            url = urlparse(self.path)
+            path = fixture_path(fixture_dir, url.path, url.query)
+            if path is None or not os.path.exists(path):
+                self.send_error(404)
+                return
+
+            with open(path, 'rb') as f:
+                body = f.read()
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            if etags and self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+
+            # Changes on every request, like analytics snippets on the real pages
+            body = body.replace(b'</body>', f'<script>window.__served = {time.time()};</script></body>'.encode())
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            if etags:
+                self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+def start_server(fixture_dir=FIXTURE_DIR, host='127.0.0.1', port=0, delay_ms=0, etags=True):
+    """Starts the server on a background thread; returns (server, base_url)"""
+    server = ThreadingHTTPServer((host, port), make_handler(fixture_dir, delay_ms, etags))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def _page(title, body):
+    return (f"<!DOCTYPE html><html><head><title>{html.escape(title)}</title></head>"
+            f"<body>{BANNER}<main>{body}</main></body></html>")
+
+def generate_fixtures(fixture_dir=FIXTURE_DIR, urls_file='../data/urls.json',
+                      details_file='../data/assessments_final.json', page_size=12):
+    """Writes listing and product pages with the markup the scrapers select on, from the saved catalog"""
+    with open(urls_file, 'r', encoding='utf-8') as f:
+        items = json.load(f)
+    with open(details_file, 'r', encoding='utf-8') as f:
+        details = {a['url']: a for a in json.load(f)}
+
+    os.makedirs(os.path.join(fixture_dir, 'catalog'), exist_ok=True)
+    os.makedirs(os.path.join(fixture_dir, 'view'), exist_ok=True)
+
+    for start in range(0, len(items), page_size):
+        rows = ''
+        for item in items[start:start + page_size]:
+            href = urlparse(item['url']).path
+            letters = ''.join(f"<span>{l}</span>" for l in item['test_type'].split())
+            rows += (f'<tr><td><a href="{href}">{html.escape(item["name"])}</a></td>'
+                     f'<td>●</td><td>{letters}</td></tr>')
+        with open(os.path.join(fixture_dir, 'catalog', f"start-{start}.html"), 'w', encoding='utf-8') as f:
+            f.write(_page("Product Catalog", f"<table>{rows}</table>"))
+
+    for item in items:
+        slug = urlparse(item['url']).path[len(VIEW_PREFIX):].strip('/')
+        a = details.get(item['url'], {})
+        sections = [('Description', a.get('description', item['name']))]
+        for heading, key in (('Job levels', 'job_levels'), ('Languages', 'languages'),
+                             ('Assessment length', 'assessment_length')):
+            if a.get(key) and a[key] != 'Unknown':
+                value = a[key]
+                if key == 'assessment_length':
+                    value = f"Approximate Completion Time in minutes = {value.split()[0]}"
+                sections.append((heading, value))
+        body = f"<h1>{html.escape(item['name'])}</h1>" + ''.join(
+            f"<div><h4>{h}</h4><p>{html.escape(v)}</p></div>" for h, v in sections
+        )
+        with open(os.path.join(fixture_dir, 'view', f"{slug}.html"), 'w', encoding='utf-8') as f:
+            f.write(_page(item['name'], body))
+
+    print(f"Wrote {len(items)} product pages and {-(-len(items) // page_size)} listing pages to {fixture_dir}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve saved SHL catalog HTML for offline scraper runs")
+    parser.add_argument('--generate', action='store_true', help="write the fixture pages from data/ first")
+    parser.add_argument('--dir', default=FIXTURE_DIR)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay-ms', type=float, default=0, help="added latency per response")
+    parser.add_argument('--no-etag', action='store_true', help="disable ETag / 304 responses")
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_fixtures(args.dir)
+
+    server, base_url = start_server(args.dir, port=args.port, delay_ms=args.delay_ms, etags=not args.no_etag)
+    print(f"Serving {args.dir} at {base_url}  (SHL_BASE_URL={base_url} python collect_urls.py)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
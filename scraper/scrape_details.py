@@ -1,11 +1,17 @@
-from playwright.sync_api import sync_playwright
 import json
 import time
 import os
 import re
+import asyncio
+import argparse
+from browser_pool import PagePool, CONCURRENCY, open_page, with_retries, fetch_fingerprint
+from crawl_state import JsonlStore, CrawlState
 
 URLS_FILE = '../data/urls.json'
 OUTPUT_TXT = '../data/assessments.txt'
+# One record per product page, appended as each page finishes (resume + change detection)
+OUTPUT_JSONL = '../data/assessments.jsonl'
+CRAWL_STATE_FILE = '../data/crawl_state.json'
 
 TEST_TYPE_MAPPING = {
     'A': 'Ability & Aptitude',
@@ -18,51 +24,23 @@ TEST_TYPE_MAPPING = {
     'S': 'Simulations'
 }
 
-def setup_browser(playwright):
-    brave_path = r"C:\Program Files\BraveSoftware\Brave-Browser\Application\brave.exe"
-    browser = playwright.chromium.launch(executable_path=brave_path, headless=False)
-    context = browser.new_context(viewport={'width': 1920, 'height': 1080})
-    return browser, context
-
-def handle_banners(page):
-    try:
-        if page.locator('button:has-text("I understand and wish to continue")').is_visible(timeout=10000):
-            page.locator('button:has-text("I understand and wish to continue")').click()
-            time.sleep(3)
-    except:
-        pass
-    try:
-        if page.locator('button:has-text("Continue")').is_visible(timeout=5000):
-            page.locator('button:has-text("Continue")').click()
-            time.sleep(2)
-    except:
-        pass
+DETAIL_HEADINGS = {
+    'description': 'Description',
+    'job_levels': 'Job levels',
+    'languages': 'Languages',
+    'length': 'Assessment length'
+}
+# Any of the detail sections being rendered means the page is ready to read
+DETAIL_READY = ', '.join(f'h4:has-text("{h}")' for h in ('Description', 'Job levels'))
 
-def extract_from_detail(page):
+async def extract_from_detail(page):
     data = {}
+    for key, heading in DETAIL_HEADINGS.items():
+        paragraph = page.locator(f'h4:has-text("{heading}") + p').first
+        data[key] = (await paragraph.inner_text()).strip() if await paragraph.count() else "Not found"
 
-    try:
-        data['description'] = page.locator('h4:has-text("Description") + p').inner_text(timeout=60000).strip()
-    except:
-        data['description'] = "Not found"
-
-    try:
-        data['job_levels'] = page.locator('h4:has-text("Job levels") + p').inner_text(timeout=40000).strip()
-    except:
-        data['job_levels'] = "Not found"
-
-    try:
-        data['languages'] = page.locator('h4:has-text("Languages") + p').inner_text(timeout=40000).strip()
-    except:
-        data['languages'] = "Not found"
-
-    try:
-        length = page.locator('h4:has-text("Assessment length") + p').inner_text(timeout=40000).strip()
-        mins = re.search(r'\d+', length)
-        data['duration'] = f"{mins.group(0)} minutes" if mins else "Unknown"
-    except:
-        data['duration'] = "Unknown"
-
+    mins = re.search(r'\d+', data.pop('length'))
+    data['duration'] = f"{mins.group(0)} minutes" if mins else "Unknown"
     return data
 
 def format_entry(name, test_type_letters, desc, levels, langs, duration):
@@ -79,57 +57,119 @@ def format_entry(name, test_type_letters, desc, levels, langs, duration):
     entry += f"Remote Testing Available.\n\n"
     return entry
 
-def main():
-    if not os.path.exists(URLS_FILE):
-        print("urls.json not found. Run collect_urls.py first.")
-        return
+def is_unchanged(previous, fingerprint):
+    if not previous or previous.get('status') != 'ok' or not fingerprint:
+        return False
+    return fingerprint['status'] == 304 or fingerprint['content_hash'] == previous.get('content_hash')
 
-    with open(URLS_FILE, 'r', encoding='utf-8') as f:
-        items = json.load(f)
+async def scrape_item(pool, store, state, item, stats, force=False):
+    name = item['name']
+    url = item['url']
+    previous = store.get(url)
 
-    print(f"Loaded {len(items)} URLs. Starting content extraction...")
+    # Resuming an interrupted crawl: this page is already done
+    if previous and previous.get('status') == 'ok' and previous.get('crawl_id') == state.crawl_id:
+        stats['resumed'] += 1
+        return
 
-    with sync_playwright() as p:
-        browser, context = setup_browser(p)
-        page = context.new_page()
+    fingerprint = None
+    try:
+        fingerprint = await fetch_fingerprint(url, previous if previous and previous.get('status') == 'ok' else None)
+    except Exception as e:
+        print(f"  ⚠ Conditional fetch failed for {name}: {e}")
 
-        output = ""
+    if not force and is_unchanged(previous, fingerprint):
+        store.append({**previous, 'crawl_id': state.crawl_id, 'checked_at': time.time()})
+        stats['unchanged'] += 1
+        return
 
-        for item in items:
-            name = item['name']
-            url = item['url']
-            test_type_letters = item.get('test_type', 'K')
+    async def render():
+        async with pool.page() as page:
+            await open_page(page, url, DETAIL_READY)
+            return await extract_from_detail(page)
 
-            print(f"Extracting: {name}")
+    print(f"Extracting: {name}")
+    try:
+        details = await with_retries(render)
+        status = 'ok'
+        stats['scraped'] += 1
+    except Exception as e:
+        print(f"Failed {name}: {e}")
+        details = {'description': "Failed to load", 'job_levels': "Failed", 'languages': "Failed", 'duration': "Failed"}
+        status = 'failed'
+        stats['failed'] += 1
+
+    fingerprint = fingerprint or {}
+    store.append({
+        'url': url,
+        'name': name,
+        'test_type': item.get('test_type', 'K'),
+        'status': status,
+        **details,
+        'content_hash': fingerprint.get('content_hash') or (previous or {}).get('content_hash'),
+        'etag': fingerprint.get('etag'),
+        'last_modified': fingerprint.get('last_modified'),
+        'crawl_id': state.crawl_id,
+        'scraped_at': time.time()
+    })
+
+def write_text_output(items, store):
+    """assessments.txt in the original format and URL order, from the JSONL records"""
+    output = ""
+    for item in items:
+        record = store.get(item['url'])
+        if record is None:
+            continue
+        output += format_entry(
+            name=record['name'],
+            test_type_letters=record['test_type'],
+            desc=record['description'],
+            levels=record['job_levels'],
+            langs=record['languages'],
+            duration=record['duration']
+        )
+    with open(OUTPUT_TXT, 'w', encoding='utf-8') as f:
+        f.write(output)
+
+async def scrape_all(items, concurrency=CONCURRENCY, force=False):
+    state = CrawlState(CRAWL_STATE_FILE)
+    store = JsonlStore(OUTPUT_JSONL)
+    print(f"{'Resuming' if state.resumed else 'Starting'} crawl {state.crawl_id} "
+          f"({len(store.records)} pages on record)")
+
+    stats = {'scraped': 0, 'unchanged': 0, 'resumed': 0, 'failed': 0}
+    start = time.perf_counter()
+    async with PagePool(size=concurrency) as pool:
+        await asyncio.gather(*(scrape_item(pool, store, state, item, stats, force) for item in items))
+    elapsed = time.perf_counter() - start
+
+    store.compact([item['url'] for item in items])
+    write_text_output(items, store)
+    store.close()
+    state.mark_complete()
+
+    print(f"\nScraped {stats['scraped']}, unchanged {stats['unchanged']}, resumed {stats['resumed']}, "
+          f"failed {stats['failed']} in {elapsed:.1f}s ({len(items) / elapsed:.1f} pages/sec)")
+    return stats
 
-            try:
-                page.goto(url, timeout=90000)
-                page.wait_for_load_state('networkidle', timeout=90000)
-                time.sleep(6)
-                handle_banners(page)
+def main():
+    parser = argparse.ArgumentParser(description="Scrape SHL product pages concurrently")
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help="browser pages open at once")
+    parser.add_argument('--force', action='store_true', help="re-render pages even if their content hash is unchanged")
+    args = parser.parse_args()
 
-                details = extract_from_detail(page)
+    if not os.path.exists(URLS_FILE):
+        print("urls.json not found. Run collect_urls.py first.")
+        return
 
-                formatted = format_entry(
-                    name=name,
-                    test_type_letters=test_type_letters,
-                    desc=details['description'],
-                    levels=details['job_levels'],
-                    langs=details['languages'],
-                    duration=details['duration']
-                )
-                output += formatted
+    with open(URLS_FILE, 'r', encoding='utf-8') as f:
+        items = json.load(f)
 
-            except Exception as e:
-                print(f"Failed {name}: {e}")
-                output += format_entry(name, test_type_letters, "Failed to load", "Failed", "Failed", "Failed")
+    print(f"Loaded {len(items)} URLs. Starting content extraction...")
 
-        with open(OUTPUT_TXT, 'w', encoding='utf-8') as f:
-            f.write(output)
+    asyncio.run(scrape_all(items, concurrency=args.concurrency, force=args.force))
 
-        print(f"\nAll done! Content saved to {OUTPUT_TXT}")
-        time.sleep(10)
-        browser.close()
+    print(f"\nAll done! Content saved to {OUTPUT_TXT}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()